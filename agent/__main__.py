@@ -0,0 +1,93 @@
+"""
+Entry point for `python -m agent`.
+
+    python -m agent                                start the interactive prompt
+    python -m agent --startup-profile              import-time report of agent.main
+    python -m agent --startup-profile agent.server --budget-ms 1500
+
+The profile runs the import in a fresh interpreter with -X importtime and
+lists the slowest modules by self and cumulative time, grouped by top-level
+package. With --budget-ms the exit code is 1 when the total import time is
+over budget, so it can gate CI.
+"""
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def profile_imports(module: str) -> List[ImportTiming]:
+    """import module in a fresh interpreter and parse the -X importtime report"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    timings = []
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        timings.append(ImportTiming(parts[2].strip(), int(parts[0]), int(parts[1])))
+    return timings
+
+
+def print_report(module: str, timings: List[ImportTiming], top: int = 15) -> int:
+    """print the report and return the total import time in ms"""
+    # the last line is the requested module itself, its cumulative time is the total
+    total_ms = timings[-1].cumulative_us / 1000 if timings else 0.0
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for timing in timings:
+        by_package[timing.module.split(".")[0]] += timing.self_us
+
+    print(f"import {module}: {total_ms:.1f} ms, {len(timings)} modules\n")
+    print("by package (self time):")
+    for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {us / 1000:9.1f} ms  {package}")
+    print("\nslowest modules (self time):")
+    for timing in sorted(timings, key=lambda t: -t.self_us)[:top]:
+        print(f"  {timing.self_us / 1000:9.1f} ms  {timing.module}")
+    print("\nslowest modules (cumulative):")
+    for timing in sorted(timings, key=lambda t: -t.cumulative_us)[:top]:
+        print(f"  {timing.cumulative_us / 1000:9.1f} ms  {timing.module}")
+    return total_ms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m agent", description="Start the interactive prompt.")
+    parser.add_argument("--startup-profile", nargs="?", const="agent.main", default=None, metavar="MODULE",
+                        help="report import times of MODULE (default: agent.main) instead of starting")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="with --startup-profile, exit with 1 when the import takes longer")
+    parser.add_argument("--top", type=int, default=15, help="rows per section of the profile")
+    parser.add_argument("--thread", default=None, metavar="ID",
+                        help="resume the conversation thread ID (default: a new thread)")
+    args = parser.parse_args(argv)
+
+    if args.startup_profile:
+        total_ms = print_report(args.startup_profile, profile_imports(args.startup_profile), args.top)
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            print(f"\nimport time {total_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+            return 1
+        return 0
+
+    from .main import main as repl_main
+    repl_main(thread_id=args.thread)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Headless batch runner.
+
+Streams a JSONL file through the compiled graph with bounded concurrency
+and writes one JSON result per input line:
+
+    python -m agent.batch requests.jsonl -o outputs/batch_results.jsonl -c 8
+
+Progress is checkpointed next to the output file, rerunning the same
+command resumes after the last contiguous finished line. A request with
+"bypass_cache": true skips the near duplicate question cache.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .config import Config
+from .helper import GraphManager
+from .utils.state import create_initial_state
+from .utils import output_manager
+
+MESSAGE_FIELDS = ("message", "input", "prompt", "body")
+ID_FIELDS = ("id", "request_id")
+
+
+def read_requests(path: str, start_offset: int = 0, start_line: int = 0) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """yield (line number, byte offset after the line, record) starting at a byte offset"""
+    with open(path, "rb") as f:
+        f.seek(start_offset)
+        line_no = start_line
+        for raw in iter(f.readline, b""):
+            end_offset = f.tell()
+            if raw.strip():
+                try:
+                    record = json.loads(raw)
+                except json.JSONDecodeError as e:
+                    record = {"_error": f"Invalid JSON: {str(e)}"}
+                yield line_no, end_offset, record
+            else:
+                yield line_no, end_offset, None
+            line_no += 1
+
+
+def get_message(record: Any, field: Optional[str] = None) -> Optional[str]:
+    """message text of a request line, plain strings are used as is"""
+    if isinstance(record, str):
+        return record
+    if not isinstance(record, dict):
+        return None
+    if field:
+        return record.get(field)
+    for name in MESSAGE_FIELDS:
+        if record.get(name):
+            return record[name]
+    return None
+
+
+def get_request_id(record: Any, line_no: int) -> Any:
+    if isinstance(record, dict):
+        for name in ID_FIELDS:
+            if name in record:
+                return record[name]
+    return line_no
+
+
+class Checkpoint:
+    """
+    tracks the highest contiguous finished line so a crashed run can resume,
+    results finished out of order above the watermark are remembered too
+    """
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.line = 0
+        self.offset = 0
+        self._pending: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> "Checkpoint":
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            # a checkpoint of another input file is ignored
+            if data.get("input") == self.input_path:
+                self.line = data.get("line", 0)
+                self.offset = data.get("offset", 0)
+        return self
+
+    def mark_done(self, line_no: int, end_offset: int):
+        with self._lock:
+            self._pending[line_no] = end_offset
+            advanced = False
+            while self.line in self._pending:
+                self.offset = self._pending.pop(self.line)
+                self.line += 1
+                advanced = True
+            if advanced:
+                self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"input": self.input_path, "line": self.line, "offset": self.offset}, f)
+        os.replace(tmp_path, self.path)
+
+
+def load_finished_lines(output_path: str, from_line: int) -> set:
+    """lines already in the output above the checkpoint, they are not run again"""
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path) as f:
+        for raw in f:
+            try:
+                line_no = json.loads(raw).get("line")
+            except (json.JSONDecodeError, AttributeError):
+                continue
+            if isinstance(line_no, int) and line_no >= from_line:
+                finished.add(line_no)
+    return finished
+
+
+def run_request(graph, line_no: int, record: Any, field: Optional[str]) -> Dict[str, Any]:
+    """run one request through the graph, never raises"""
+    result = {"line": line_no, "id": get_request_id(record, line_no)}
+    start = time.perf_counter()
+    try:
+        if isinstance(record, dict) and "_error" in record:
+            raise ValueError(record["_error"])
+        message = get_message(record, field)
+        if not message:
+            raise ValueError("No message found in request")
+        bypass_cache = isinstance(record, dict) and bool(record.get("bypass_cache"))
+        state = graph.invoke(create_initial_state(message, bypass_cache))
+        result.update({
+            "intent": state.get("intent"),
+            "language": state.get("language"),
+            "output_file": state.get("output_file"),
+            "response": state.get("response"),
+            "error": None,
+        })
+    except Exception as e:
+        logging.error(f"Request on line {line_no} failed: {str(e)}")
+        result.update({"intent": None, "language": None, "output_file": None,
+                       "response": None, "error": str(e)})
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+
+def summarize(latencies: list, errors: int, wall_time: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    total = len(latencies)
+
+    def pct(p: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(total - 1, int(total * p))]
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_rps": round(total / wall_time, 3) if wall_time else 0.0,
+        "latency_ms": {
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+    }
+
+
+def run_batch(input_path: str, output_path: str, concurrency: int = 4,
+              field: Optional[str] = None, resume: bool = True) -> Dict[str, Any]:
+    """run every line of input_path through the graph and return the summary"""
+    checkpoint = Checkpoint(output_path + ".checkpoint", input_path)
+    if resume:
+        checkpoint.load()
+    finished = load_finished_lines(output_path, checkpoint.line) if resume else set()
+    if checkpoint.line:
+        logging.info(f"Resuming {input_path} from line {checkpoint.line}")
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    latencies, errors = [], 0
+    write_lock = threading.Lock()
+    # bounds the number of submitted but unfinished requests
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    with GraphManager(Config()) as app, \
+            open(output_path, "a" if resume else "w") as out, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        def _run(line_no, end_offset, record):
+            nonlocal errors
+            try:
+                result = run_request(app.graph, line_no, record, field)
+                with write_lock:
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out.flush()
+                    latencies.append(result["latency_ms"])
+                    if result["error"]:
+                        errors += 1
+                checkpoint.mark_done(line_no, end_offset)
+            finally:
+                slots.release()
+
+        start = time.perf_counter()
+        for line_no, end_offset, record in read_requests(input_path, checkpoint.offset, checkpoint.line):
+            if record is None or line_no in finished:
+                checkpoint.mark_done(line_no, end_offset)
+                continue
+            slots.acquire()
+            pool.submit(_run, line_no, end_offset, record)
+        pool.shutdown(wait=True)
+        wall_time = time.perf_counter() - start
+
+    return summarize(latencies, errors, wall_time)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m agent.batch", description="Run a JSONL file of requests through the graph.")
+    parser.add_argument("input", help="JSONL file, one request per line")
+    parser.add_argument("-o", "--output", default=None, help="results JSONL (default: outputs/batch_results.jsonl)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="requests in flight")
+    parser.add_argument("--field", default=None, help=f"field holding the message (default: first of {', '.join(MESSAGE_FIELDS)})")
+    parser.add_argument("--no-resume", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--verbose", action="store_true", help="render every response to the terminal")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logging.getLogger("openai._client").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if not Config.check_api_key():
+        return 1
+
+    # the response panels are for the REPL, keep batch output clean
+    output_manager.console.quiet = not args.verbose
+
+    output = args.output or os.path.join(Config.SAVING_FOLDER, "batch_results.jsonl")
+    summary = run_batch(args.input, output, concurrency=max(1, args.concurrency),
+                        field=args.field, resume=not args.no_resume)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
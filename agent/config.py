@@ -1,25 +1,90 @@
 import os
+import time
 import logging
-import yaml
-class Config:
-    configs = yaml.safe_load(open("configs.yaml"))
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple
+
+CONFIG_PATH = "configs.yaml"
+
+class ConfigError(ValueError):
+    """configs.yaml is missing, is not valid YAML or has invalid values"""
+
+class ConfigSnapshot(NamedTuple):
+    """immutable view of configs.yaml at one point in time, shared by every caller"""
+    configs: Mapping[str, Any]  # the whole parsed file, read-only
+    path: str
+    file_id: Tuple[int, int, int]  # (inode, mtime ns, size) the snapshot was loaded from
+
     # llm configs
-    DEFAULT_MODEL = configs["DEFAULT_MODEL"] 
-    TEMPERATURE = configs["TEMPERATURE"] 
-    
+    DEFAULT_MODEL: str
+    TEMPERATURE: float
+
+    # model, temperature, max_tokens, stop and timeout per node
+    MODEL_PROFILES: Mapping[str, Any]
+
+    # llm client pool configs
+    LLM_BASE_URL: Optional[str]
+    LLM_POOL_SIZE: int
+    LLM_KEEPALIVE_EXPIRY: float
+    LLM_WARMUP: bool
+
+    # classification JSON is streamed and the call stops once the routing fields are complete
+    LLM_STREAM_JSON: bool
+
+    # llm response cache configs
+    LLM_CACHE: Mapping[str, Any]
+
+    # near duplicate question cache in front of handle_question
+    QUESTION_CACHE: Mapping[str, Any]
+
+    # timeouts, retries, hedging and the circuit breaker around every llm call
+    RESILIENCE: Mapping[str, Any]
+
+    # client side request and token rate limits per model, with priorities per node
+    LLM_RATE_LIMITS: Mapping[str, Any]
+
+    # how edit_code and edit_text change files, "patch" or "full"
+    EDIT_MODE: str
+
+    # chunk selection for editing large files
+    CHUNKING: Mapping[str, Any]
+
+    # prompt token budgets per node
+    TOKEN_BUDGETS: Mapping[str, Any]
+
+    # graph routing mode, "two_stage", "combined" or "speculative"
+    ROUTING_MODE: str
+
+    # live token rendering in the terminal
+    STREAM_OUTPUT: bool
+
+    # http service configs
+    SERVER: Mapping[str, Any]
+
+    # background output writer configs
+    FILE_WRITER: Mapping[str, Any]
+
+    # background reads of the edit target while routing runs
+    PREFETCH: Mapping[str, Any]
+
+    # conversation memory (threads, summary window, retention) configs
+    MEMORY: Mapping[str, Any]
+
+    # latency histograms and their dump file
+    METRICS: Mapping[str, Any]
+
+    # seconds between mtime checks of configs.yaml, 0 disables hot reload
+    CONFIG_RELOAD_INTERVAL: float
+
     # File Extensions by Language
-    FILE_EXTENSIONS = configs["FILE_EXTENSIONS"]
-    
-    SAVING_FOLDER = configs["SAVING_FOLDER"]
-    SAVING_FOLDER_CODE = configs["SAVING_FOLDER_CODE"]
-    SAVING_FOLDER_TEXT = configs["SAVING_FOLDER_TEXT"]
-    SAVING_FOLDER_ANSWERS = configs["SAVING_FOLDER_ANSWERS"]
-    if not os.path.exists(SAVING_FOLDER_CODE):
-        os.makedirs(SAVING_FOLDER_CODE)
-    if not os.path.exists(SAVING_FOLDER_TEXT):
-        os.makedirs(SAVING_FOLDER_TEXT)
-    if not os.path.exists(SAVING_FOLDER_ANSWERS):
-        os.makedirs(SAVING_FOLDER_ANSWERS)
+    FILE_EXTENSIONS: Mapping[str, str]
+
+    SAVING_FOLDER: str
+    SAVING_FOLDER_CODE: str
+    SAVING_FOLDER_TEXT: str
+    SAVING_FOLDER_ANSWERS: str
+
     @staticmethod
     def check_api_key():
         """Check if the OpenAI API key is set."""
@@ -28,4 +93,172 @@ class Config:
             logging.warning("Please see README.md for instructions")
             return False
         logging.debug("OPENAI_API_KEY environment variable is set")
-        return True
\ No newline at end of file
+        return True
+
+_REQUIRED = object()
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_mapping(value) -> bool:
+    return isinstance(value, Mapping)
+
+def _is_text(value) -> bool:
+    return isinstance(value, str) and bool(value.strip())
+
+# name -> (default or _REQUIRED, check, what the check expects)
+_FIELDS = {
+    "DEFAULT_MODEL": (_REQUIRED, _is_text, "a model name"),
+    "TEMPERATURE": (_REQUIRED, lambda v: _is_number(v) and 0 <= v <= 2, "a number between 0 and 2"),
+    "MODEL_PROFILES": ({}, _is_mapping, "a mapping"),
+    "LLM_BASE_URL": (None, lambda v: v is None or _is_text(v), "a URL or null"),
+    "LLM_POOL_SIZE": (100, lambda v: isinstance(v, int) and not isinstance(v, bool) and v > 0, "a positive integer"),
+    "LLM_KEEPALIVE_EXPIRY": (30, lambda v: _is_number(v) and v >= 0, "a number of seconds"),
+    "LLM_WARMUP": (True, lambda v: isinstance(v, bool), "true or false"),
+    "LLM_STREAM_JSON": (True, lambda v: isinstance(v, bool), "true or false"),
+    "LLM_CACHE": ({}, _is_mapping, "a mapping"),
+    "QUESTION_CACHE": ({}, _is_mapping, "a mapping"),
+    "RESILIENCE": ({}, _is_mapping, "a mapping"),
+    "LLM_RATE_LIMITS": ({}, _is_mapping, "a mapping"),
+    "EDIT_MODE": ("patch", lambda v: v in ("patch", "full"), '"patch" or "full"'),
+    "CHUNKING": ({}, _is_mapping, "a mapping"),
+    "TOKEN_BUDGETS": ({}, _is_mapping, "a mapping"),
+    "ROUTING_MODE": ("two_stage", lambda v: v in ("two_stage", "combined", "speculative"),
+                     '"two_stage", "combined" or "speculative"'),
+    "STREAM_OUTPUT": (True, lambda v: isinstance(v, bool), "true or false"),
+    "SERVER": ({}, _is_mapping, "a mapping"),
+    "FILE_WRITER": ({}, _is_mapping, "a mapping"),
+    "PREFETCH": ({}, _is_mapping, "a mapping"),
+    "MEMORY": ({}, _is_mapping, "a mapping"),
+    "METRICS": ({}, _is_mapping, "a mapping"),
+    "CONFIG_RELOAD_INTERVAL": (1, lambda v: _is_number(v) and v >= 0, "a number of seconds"),
+    "FILE_EXTENSIONS": (_REQUIRED, lambda v: _is_mapping(v) and all(isinstance(e, str) for e in v.values()),
+                        "a mapping of language to extension"),
+    "SAVING_FOLDER": (_REQUIRED, _is_text, "a folder path"),
+    "SAVING_FOLDER_CODE": (_REQUIRED, _is_text, "a folder path"),
+    "SAVING_FOLDER_TEXT": (_REQUIRED, _is_text, "a folder path"),
+    "SAVING_FOLDER_ANSWERS": (_REQUIRED, _is_text, "a folder path"),
+}
+
+def _freeze(value):
+    """read-only copy of nested mappings and lists so a snapshot cannot be changed in place"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def _file_id(path: str) -> Tuple[int, int, int]:
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def load_snapshot(path: str = CONFIG_PATH) -> ConfigSnapshot:
+    """parse and validate path, raises ConfigError with every problem found"""
+    import yaml
+
+    try:
+        file_id = _file_id(path)
+        with open(path) as f:
+            configs = yaml.safe_load(f)
+    except OSError as e:
+        raise ConfigError(f"Cannot read {path}: {e.strerror}") from e
+    except yaml.YAMLError as e:
+        raise ConfigError(f"{path} is not valid YAML: {e}") from e
+    if not isinstance(configs, dict):
+        raise ConfigError(f"{path} must be a mapping of settings, got {type(configs).__name__}")
+
+    values: Dict[str, Any] = {}
+    problems = []
+    for name, (default, check, expected) in _FIELDS.items():
+        value = configs.get(name)
+        if value is None:
+            if default is _REQUIRED:
+                problems.append(f"{name} is missing")
+                continue
+            value = default
+        if not check(value):
+            problems.append(f"{name} should be {expected}, got {value!r}")
+            continue
+        values[name] = _freeze(value)
+    if problems:
+        raise ConfigError(f"Invalid {path}:\n  " + "\n  ".join(problems))
+
+    return ConfigSnapshot(configs=_freeze(configs), path=path, file_id=file_id, **values)
+
+class _ConfigMeta(type):
+    def __getattr__(cls, name):
+        # Config.NAME reads from the current snapshot
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(cls.current(), name)
+
+    def __setattr__(cls, name, value):
+        if not name.startswith("_"):
+            raise AttributeError(f"Config is read-only, change {CONFIG_PATH} instead")
+        super().__setattr__(name, value)
+
+class Config(metaclass=_ConfigMeta):
+    """
+    Config() and Config.NAME give the current ConfigSnapshot.
+    configs.yaml is parsed on first use, afterwards its inode/mtime/size is
+    checked at most every CONFIG_RELOAD_INTERVAL seconds and a changed file
+    swaps in a new snapshot. A broken edit keeps the previous snapshot.
+    Take one snapshot per operation (config = Config()) so its values stay consistent.
+    """
+    _snapshot: Optional[ConfigSnapshot] = None
+    _next_check = 0.0
+    _failed_id: Optional[Tuple[int, int, int]] = None
+    _lock = threading.Lock()
+
+    def __new__(cls) -> ConfigSnapshot:
+        return cls.current()
+
+    @classmethod
+    def current(cls) -> ConfigSnapshot:
+        snapshot = cls._snapshot
+        if snapshot is not None and (snapshot.CONFIG_RELOAD_INTERVAL <= 0 or time.monotonic() < cls._next_check):
+            return snapshot
+        return cls._refresh()
+
+    @classmethod
+    def reload(cls) -> ConfigSnapshot:
+        """load configs.yaml now even if it looks unchanged"""
+        with cls._lock:
+            cls._swap(load_snapshot(CONFIG_PATH))
+            return cls._snapshot
+
+    @classmethod
+    def _refresh(cls) -> ConfigSnapshot:
+        with cls._lock:
+            snapshot = cls._snapshot
+            if snapshot is None:
+                cls._swap(load_snapshot(CONFIG_PATH))
+                return cls._snapshot
+            if time.monotonic() < cls._next_check:
+                # another thread checked while we waited for the lock
+                return snapshot
+
+            try:
+                file_id = _file_id(snapshot.path)
+            except OSError as e:
+                file_id = None
+                logging.error(f"Cannot stat {snapshot.path}, keeping the current config: {e.strerror}")
+            if file_id is not None and file_id != snapshot.file_id and file_id != cls._failed_id:
+                try:
+                    cls._swap(load_snapshot(snapshot.path))
+                    logging.info(f"Reloaded {snapshot.path}")
+                except ConfigError as e:
+                    # logged once per broken version of the file
+                    cls._failed_id = file_id
+                    logging.error(f"{e}\nKeeping the previous config")
+            cls._next_check = time.monotonic() + cls._snapshot.CONFIG_RELOAD_INTERVAL
+            return cls._snapshot
+
+    @classmethod
+    def _swap(cls, snapshot: ConfigSnapshot):
+        for folder in (snapshot.SAVING_FOLDER_CODE, snapshot.SAVING_FOLDER_TEXT, snapshot.SAVING_FOLDER_ANSWERS):
+            os.makedirs(folder, exist_ok=True)
+        cls._failed_id = None
+        cls._next_check = time.monotonic() + snapshot.CONFIG_RELOAD_INTERVAL
+        # a single reference assignment, readers see the old or the new snapshot
+        cls._snapshot = snapshot
@@ -1,25 +1,52 @@
 import logging
 import traceback
-from langgraph.graph import StateGraph, END
-from typing import Dict, Any, Optional
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple
 
 # Import state and utilities
 from .utils.state import MessageState
-from .utils.router import primary_router, intent_router
+from .utils.router import primary_router, intent_router, combined_router
+from .utils.llm import warmup_clients, close_clients
+from .utils.resilience import close_resilience
+from .utils.scheduler import close_scheduler
+from .utils.cache import close_response_cache
+from .utils.question_cache import close_question_cache
+from .utils.file_writer import close_file_writer
+from .utils.prefetch import close_prefetcher
+from .utils.metrics import dump_metrics, timed_node, enabled as metrics_enabled
 
 # Import nodes 
-from .nodes.analyzer import analyze_message
-from .nodes.question_handler import handle_question
-from .nodes.intent_classifier import classify_intent
-from .nodes.code_processor import generate_code, edit_code
-from .nodes.text_processor import generate_text, edit_text
-from .nodes.response_generator import generate_response
+from .nodes.analyzer import analyze_message, aanalyze_message
+from .nodes.question_handler import handle_question, ahandle_question
+from .nodes.intent_classifier import classify_intent, aclassify_intent
+from .nodes.combined_router import route_message, aroute_message
+from .nodes.speculative_router import speculative_route, aspeculative_route, close_speculative_pool
+from .nodes.code_processor import generate_code, edit_code, agenerate_code, aedit_code
+from .nodes.text_processor import generate_text, edit_text, agenerate_text, aedit_text
+from .nodes.response_generator import generate_response, agenerate_response
+from .nodes.memory_updater import update_memory, aupdate_memory
+
+if TYPE_CHECKING:
+    # langgraph is imported when the graph is built, it costs about a second at startup
+    from langgraph.graph import StateGraph
+    from langchain_core.runnables import RunnableLambda
+
+def _node(func, afunc) -> "RunnableLambda":
+    """
+    node with a sync and an async implementation, graph.invoke uses func and graph.ainvoke uses afunc.
+    With METRICS enabled both record their wall time and errors
+    """
+    from langchain_core.runnables import RunnableLambda
+    name = func.__name__
+    if metrics_enabled():
+        func, afunc = timed_node(name, func, afunc)
+    return RunnableLambda(func, afunc=afunc, name=name)
 
 class GraphManager:
     def __init__(self, config):
         self.config = config
-        self.graph: Optional[StateGraph] = None
-        self.history: list = []
+        self.graph: Optional["StateGraph"] = None
+        # same graph with the sqlite checkpointer, None when MEMORY is disabled
+        self.session_graph = None
 
         logging.basicConfig(
             level=logging.INFO,
@@ -30,7 +57,13 @@ class GraphManager:
 
     def __enter__(self):
         try:
-            self.graph = self.build_graph()
+            workflow = self.build_workflow()
+            self.graph = workflow.compile()
+            if self.config.MEMORY.get("ENABLED", True):
+                from .utils.checkpointer import get_session_store
+                # one checkpoint per turn, written when the run exits
+                self.session_graph = workflow.compile(checkpointer=get_session_store().saver).bind(durability="exit")
+            warmup_clients()
             # self.logger.info("Graph successfully built and inited")
             return self
         except Exception as e:
@@ -42,27 +75,86 @@ class GraphManager:
         try:
             logging.info("Cleaning up graph resources")
             self.graph = None
-            self.history = []
+            had_sessions, self.session_graph = self.session_graph is not None, None
+            close_speculative_pool()
+            close_clients()
+            close_resilience()
+            close_scheduler()
+            close_response_cache()
+            close_question_cache()
+            # flush barrier, every queued output file is on disk after this
+            close_file_writer()
+            close_prefetcher()
+            dump_metrics()
+            if had_sessions:
+                from .utils.checkpointer import close_session_store
+                close_session_store()
         except Exception as e:
             logging.error(f"Error during graph cleanup: {str(e)}")
 
         return False    
-        
     
-    def build_graph(self) -> StateGraph:
-        """LangGraph state machine."""
+    def for_thread(self, thread_id: Optional[str]) -> Tuple[Any, Dict[str, Any]]:
+        """
+        (graph, run config) for a conversation thread. Without a thread_id, or
+        with MEMORY disabled, every call is a stateless one-turn conversation.
+        """
+        if thread_id is None or self.session_graph is None:
+            return self.graph, {}
+        return self.session_graph, {"configurable": {"thread_id": str(thread_id)}}
+    
+    def build_workflow(self) -> "StateGraph":
+        """
+        LangGraph state machine, compiled with or without a checkpointer.
+        The compiled graph supports both graph.invoke and graph.ainvoke.
+        """
+        from langgraph.graph import StateGraph, END
+
         # init of graph
         workflow = StateGraph(MessageState)
         
         # adding nodes
-        workflow.add_node("analyze_message", analyze_message)
-        workflow.add_node("handle_question", handle_question)
-        workflow.add_node("classify_intent", classify_intent)
-        workflow.add_node("generate_code", generate_code)
-        workflow.add_node("edit_code", edit_code)
-        workflow.add_node("generate_text", generate_text)
-        workflow.add_node("edit_text", edit_text)
-        workflow.add_node("generate_response", generate_response)
+        workflow.add_node("handle_question", _node(handle_question, ahandle_question))
+        workflow.add_node("generate_code", _node(generate_code, agenerate_code))
+        workflow.add_node("edit_code", _node(edit_code, aedit_code))
+        workflow.add_node("generate_text", _node(generate_text, agenerate_text))
+        workflow.add_node("edit_text", _node(edit_text, aedit_text))
+        workflow.add_node("generate_response", _node(generate_response, agenerate_response))
+        
+        # routing part of the graph, selected by ROUTING_MODE in configs.yaml
+        routing_mode = getattr(self.config, "ROUTING_MODE", "two_stage")
+        if routing_mode == "combined":
+            self._add_combined_routing(workflow)
+        elif routing_mode == "two_stage":
+            self._add_two_stage_routing(workflow)
+        elif routing_mode == "speculative":
+            self._add_speculative_routing(workflow)
+        else:
+            raise ValueError(f"Unknown ROUTING_MODE: {routing_mode}")
+        
+        # Add edge from question handler to response generator
+        workflow.add_edge("handle_question", "generate_response")
+        
+        # edges from processors to response generator
+        workflow.add_edge("generate_code", "generate_response")
+        workflow.add_edge("edit_code", "generate_response")
+        workflow.add_edge("generate_text", "generate_response")
+        workflow.add_edge("edit_text", "generate_response")
+        
+        # Add edge from response generator to end, through the memory of the thread
+        if self.config.MEMORY.get("ENABLED", True):
+            workflow.add_node("update_memory", _node(update_memory, aupdate_memory))
+            workflow.add_edge("generate_response", "update_memory")
+            workflow.add_edge("update_memory", END)
+        else:
+            workflow.add_edge("generate_response", END)
+        
+        return workflow
+    
+    def _add_two_stage_routing(self, workflow: "StateGraph"):
+        """analyze_message -> classify_intent, two LLM calls before processing"""
+        workflow.add_node("analyze_message", _node(analyze_message, aanalyze_message))
+        workflow.add_node("classify_intent", _node(classify_intent, aclassify_intent))
         
         # adding edges for praph
         workflow.set_entry_point("analyze_message")
@@ -78,9 +170,6 @@ class GraphManager:
             }
         )
         
-        # Add edge from question handler to response generator
-        workflow.add_edge("handle_question", "generate_response")
-        
         # Add conditional edges for the intent router
         workflow.add_conditional_edges(
             "classify_intent",
@@ -93,15 +182,29 @@ class GraphManager:
                 "generate_response": "generate_response"
             }
         )
-        
-        # edges from processors to response generator
-        workflow.add_edge("generate_code", "generate_response")
-        workflow.add_edge("edit_code", "generate_response")
-        workflow.add_edge("generate_text", "generate_response")
-        workflow.add_edge("edit_text", "generate_response")
-        
-        # Add edge from response generator to end
-        workflow.add_edge("generate_response", END)
-        
-        return workflow.compile()
     
+    def _add_combined_routing(self, workflow: "StateGraph"):
+        """route_message returns the final intent, one LLM call before processing"""
+        workflow.add_node("route_message", _node(route_message, aroute_message))
+        workflow.set_entry_point("route_message")
+        self._add_final_intent_edges(workflow, "route_message")
+    
+    def _add_speculative_routing(self, workflow: "StateGraph"):
+        """two stage prompts sent at the same time, one LLM round trip before processing"""
+        workflow.add_node("speculative_route", _node(speculative_route, aspeculative_route))
+        workflow.set_entry_point("speculative_route")
+        self._add_final_intent_edges(workflow, "speculative_route")
+    
+    def _add_final_intent_edges(self, workflow: "StateGraph", source: str):
+        workflow.add_conditional_edges(
+            source,
+            combined_router,
+            {
+                "handle_question": "handle_question",
+                "generate_code": "generate_code",
+                "edit_code": "edit_code",
+                "generate_text": "generate_text",
+                "edit_text": "edit_text",
+                "generate_response": "generate_response"
+            }
+        )
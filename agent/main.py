@@ -1,5 +1,7 @@
 import sys
+import uuid
 import logging
+from typing import Optional
 from prompt_toolkit.shortcuts import prompt
 from prompt_toolkit.key_binding import KeyBindings
 from rich.logging import RichHandler
@@ -9,6 +11,8 @@ from rich.console import Console
 from .config import Config
 from .utils.state import create_initial_state
 from .utils.output_manager import OutputManager
+from .utils.metrics import metrics
+from .utils.resilience import LLMTimeoutError, LLMUnavailableError
 from .helper import GraphManager
 
 # Set up rich console
@@ -35,8 +39,8 @@ def _(event):
 def _(event):
     event.app.current_buffer.insert_text('\n')
 
-def main():
-    """Main entry point for the application."""
+def main(thread_id: Optional[str] = None):
+    """Main entry point for the application, thread_id resumes an earlier conversation."""
     # Display welcome message
     OutputManager.display_welcome()
     
@@ -50,11 +54,15 @@ def main():
         # context manager for graph
         with GraphManager(config) as app:
             console.print("[green]Graph successfully built and initialized[/green]")
+            thread_id = thread_id or uuid.uuid4().hex[:12]
+            graph, run_config = app.for_thread(thread_id)
+            if run_config:
+                console.print(f"[dim]Conversation thread {thread_id}, resume it with --thread {thread_id}[/dim]")
             
             while True:
                 try:
                     #input with prompt_toolkit
-                    console.print("[bold cyan]Enter your message[/bold cyan] (press Alt+Enter for new lines, Ctrl+D to submit):")
+                    console.print("[bold cyan]Enter your message[/bold cyan] (press Alt+Enter for new lines, Ctrl+D to submit, /stats for latencies, /nocache before a question to skip the cache):")
                     user_input = prompt(
                         "User message: ",
                         multiline=True,
@@ -66,12 +74,26 @@ def main():
                         console.print("[yellow]Empty input, please try again.[/yellow]")
                         continue
                     
-                    initial_state = create_initial_state(user_input)
+                    if user_input.strip() == "/stats":
+                        OutputManager.display_stats(metrics.node_summary())
+                        continue
+                    
+                    # /nocache asks the LLM even when a near duplicate question was answered before
+                    bypass_cache = user_input.lstrip().startswith("/nocache")
+                    if bypass_cache:
+                        user_input = user_input.lstrip()[len("/nocache"):].strip()
+                        if not user_input:
+                            console.print("[yellow]Empty input, please try again.[/yellow]")
+                            continue
+                    initial_state = create_initial_state(user_input, bypass_cache)
                     
                     try:
-                        app.graph.invoke(initial_state)
-                        
+                        graph.invoke(initial_state, run_config)
                         
+                    except (LLMUnavailableError, LLMTimeoutError) as e:
+                        # retries are already spent, the session stays usable
+                        console.print(f"[bold yellow]LLM unavailable:[/bold yellow] {str(e)}")
+                        logging.warning(f"LLM unavailable: {str(e)}")
                     except Exception as e:
                         console.print(f"[bold red]Error processing input:[/bold red] {str(e)}")
                         logging.error(f"Graph processing error: {str(e)}")
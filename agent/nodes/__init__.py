@@ -2,22 +2,44 @@
 Nodes for the LangGraph state machine.
 
 This package contains all the processing nodes used in the LangGraph workflow.
+Every node has an async twin (prefixed with "a") used by graph.ainvoke.
 """
+from importlib import import_module
 
-from .analyzer import analyze_message
-from .question_handler import handle_question
-from .intent_classifier import classify_intent
-from .code_processor import generate_code, edit_code
-from .text_processor import generate_text, edit_text
-from .response_generator import generate_response
+# node modules are imported on first access, see agent.utils for the same pattern
+_EXPORTS = {
+    'analyze_message': '.analyzer',
+    'handle_question': '.question_handler',
+    'classify_intent': '.intent_classifier',
+    'route_message': '.combined_router',
+    'speculative_route': '.speculative_router',
+    'generate_code': '.code_processor',
+    'edit_code': '.code_processor',
+    'generate_text': '.text_processor',
+    'edit_text': '.text_processor',
+    'generate_response': '.response_generator',
+    'update_memory': '.memory_updater',
+    'aanalyze_message': '.analyzer',
+    'ahandle_question': '.question_handler',
+    'aclassify_intent': '.intent_classifier',
+    'aroute_message': '.combined_router',
+    'aspeculative_route': '.speculative_router',
+    'agenerate_code': '.code_processor',
+    'aedit_code': '.code_processor',
+    'agenerate_text': '.text_processor',
+    'aedit_text': '.text_processor',
+    'agenerate_response': '.response_generator',
+    'aupdate_memory': '.memory_updater',
+}
 
-__all__ = [
-    'analyze_message',
-    'handle_question',
-    'classify_intent',
-    'generate_code',
-    'edit_code',
-    'generate_text',
-    'edit_text',
-    'generate_response'
-]
\ No newline at end of file
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
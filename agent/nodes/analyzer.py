@@ -1,12 +1,11 @@
 from typing import Dict, Any
 from ..utils.state import MessageState
-from ..utils.llm import query_llm
+from ..utils.llm import query_llm_fields, aquery_llm_fields
+from ..utils.token_budget import FittedPrompt, budget_update, fit_prompt, request_section
+from ..utils.memory import history_section, with_history
 
-def analyze_message(state: MessageState) -> Dict[str, Any]:
-    """analyze the user message to determine its intent. """
-    user_message = state["messages"][-1].content
-    
-    prompt = f"""
+def _render_prompt(user_message: str) -> str:
+    return f"""
     Analyze the following user message and determine if it's:
     1. A direct question that should be answered
     2. A request to generate or edit code or text
@@ -19,12 +18,27 @@ def analyze_message(state: MessageState) -> Dict[str, Any]:
         "details": "brief explanation of why you classified it this way"
     }}
     """
-    
-    result = query_llm(prompt, parse_json=True)
-    
+
+def _build_prompt(state: MessageState) -> FittedPrompt:
+    return fit_prompt("analyze_message", with_history(_render_prompt),
+                      user_message=request_section(state["messages"][-1].content), history=history_section(state))
+
+def _parse_result(result: Any) -> Dict[str, Any]:
     if isinstance(result, dict) and "intent" in result:
         intent = result["intent"]
     else:
         intent = "generation"
     
-    return {"intent": intent}
\ No newline at end of file
+    return {"intent": intent}
+
+def analyze_message(state: MessageState) -> Dict[str, Any]:
+    """analyze the user message to determine its intent. """
+    prompt = _build_prompt(state)
+    result = query_llm_fields(prompt.text, ("intent",), node="analyze_message")
+    return {**_parse_result(result), **budget_update(state, "analyze_message", prompt.report)}
+
+async def aanalyze_message(state: MessageState) -> Dict[str, Any]:
+    """async version of analyze_message"""
+    prompt = _build_prompt(state)
+    result = await aquery_llm_fields(prompt.text, ("intent",), node="analyze_message")
+    return {**_parse_result(result), **budget_update(state, "analyze_message", prompt.report)}
@@ -1,20 +1,32 @@
+import asyncio
+import logging
 from typing import TypedDict
 from ..utils.state import MessageState
-from ..utils.llm import query_llm, extract_code_from_markdown
+from ..utils.llm import query_llm, aquery_llm, stream_llm, extract_code_from_markdown
 from ..utils.file_utils import FileUtils
+from ..utils.output_manager import OutputManager
+from ..utils.patching import PATCH_INSTRUCTIONS
+from ..utils.chunking import select_for_edit, render_chunks, parse_chunk_reply, splice_chunks
+from ..utils.token_budget import Section, budget_for, budget_update, count_tokens, fit_prompt, request_section
+from ..utils.memory import history_section, with_history
+from ..config import Config
+from .patch_editor import PatchEditMixin
 
 class CodeProcessor:
+    node_name = None
+
     def __init__(self, state: dict):
         self.state = state
         self.user_message = state['messages'][-1].content
         self.language = state.get('language') or 'python'
+        self.streamed = False
+        self.token_report = None
     
     def process(self) -> dict:
         prompt = self._build_prompt()
         
         # LLM and extract code
-        code_with_markdown = self._query_llm(prompt)
-        processed_code = self._extract_code(code_with_markdown)
+        processed_code = self._generate(prompt)
         
         #for saving
         output_file = self._get_output_file()
@@ -28,13 +40,60 @@ class CodeProcessor:
             **self.state,
             "source_code": processed_code,
             "output_file": output_file,
-            "response": response
+            "response": response,
+            "streamed": self.streamed,
+            **self._budget_update()
+        }
+    
+    async def aprocess(self) -> dict:
+        """async version of process, the file write runs in a worker thread"""
+        prompt = self._build_prompt()
+        
+        processed_code = await self._agenerate(prompt)
+        
+        output_file = self._get_output_file()
+        success = await asyncio.to_thread(self._save_to_file, output_file, processed_code)
+        
+        response = self._build_response(success, output_file)
+        
+        return {
+            **self.state,
+            "source_code": processed_code,
+            "output_file": output_file,
+            "response": response,
+            "streamed": self.streamed,
+            **self._budget_update()
         }
     
-    def _query_llm(self, prompt: str) -> str:
-        return query_llm(prompt)
+    def _fit(self, render, **sections: Section) -> str:
+        """fit the prompt into the node budget, the conversation so far goes first, the report goes into the state"""
+        fitted = fit_prompt(self.node_name, with_history(render), history=history_section(self.state), **sections)
+        self.token_report = fitted.report
+        return fitted.text
+    
+    def _budget_update(self) -> dict:
+        if self.token_report is None:
+            return {}
+        return budget_update(self.state, self.node_name, self.token_report)
+    
+    def _generate(self, prompt: str) -> str:
+        return self._extract_content(self._query_llm(prompt))
     
-    def _extract_code(self, code_with_markdown: str) -> str:
+    async def _agenerate(self, prompt: str) -> str:
+        return self._extract_content(await self._aquery_llm(prompt))
+    
+    def _query_llm(self, prompt: str, usage: dict = None, stream: bool = True) -> str:
+        if stream and OutputManager.stream_enabled():
+            # rendered live, the file is written once the stream ends
+            self.streamed = True
+            return OutputManager.display_stream(stream_llm(prompt, node=self.node_name, usage=usage),
+                                                title=f"Generating {self.language.capitalize()} Code", border_style="green")
+        return query_llm(prompt, node=self.node_name, usage=usage)
+    
+    async def _aquery_llm(self, prompt: str, usage: dict = None) -> str:
+        return await aquery_llm(prompt, node=self.node_name, usage=usage)
+    
+    def _extract_content(self, code_with_markdown: str) -> str:
         return extract_code_from_markdown(code_with_markdown, self.language)
     
     def _save_to_file(self, file_path: str, code: str) -> bool:
@@ -55,11 +114,15 @@ class CodeProcessor:
     
 class CodeGenerator(CodeProcessor):
     """Class for generating code."""
+    node_name = "generate_code"
 
     def _build_prompt(self) -> str:
+        return self._fit(self._render_prompt, user_message=request_section(self.user_message))
+    
+    def _render_prompt(self, user_message: str) -> str:
         return f"""
         Generate code based on the following request:
-        {self.user_message}
+        {user_message}
         
         Programming language: {self.language}
         
@@ -75,28 +138,85 @@ class CodeGenerator(CodeProcessor):
         else:
             return f"Error saving {self.language} code to {output_file}"
     
-class CodeEditor(CodeProcessor):
+class CodeEditor(PatchEditMixin, CodeProcessor):
     """Class for editing existing code."""
+    node_name = "edit_code"
     
     def __init__(self, state: dict):
         super().__init__(state)
         self.file_to_edit = FileUtils.get_existing_file_for_language(self.language)
         self.existing_code = FileUtils.read_file_if_exists(self.file_to_edit)
+        # large files, and files over the prompt budget, are sent as the chunks most relevant to the request
+        self.chunks = None
+        if FileUtils.file_exists(self.file_to_edit):
+            budget = budget_for(self.node_name)
+            room = budget - count_tokens(self._render_patch_prompt(self.user_message, "")) if budget else None
+            self.chunks = select_for_edit(self.existing_code, self.language, self.user_message, Config().CHUNKING,
+                                          max_tokens=room, count_tokens=count_tokens)
     
     def _build_prompt(self) -> str:
+        # the file is never cut here, the model would return the cut file
+        if self.chunks:
+            return self._fit(self._render_chunk_prompt, user_message=request_section(self.user_message, 1),
+                             chunks=Section(render_chunks(self.chunks), truncatable=False))
+        return self._fit(self._render_prompt, user_message=request_section(self.user_message, 1),
+                         existing_code=Section(self.existing_code, truncatable=False))
+    
+    def _render_prompt(self, user_message: str, existing_code: str) -> str:
         return f"""
         Edit the following code based on the user's request:
         
-        User request: {self.user_message}
+        User request: {user_message}
         
         Existing code:
         ```{self.language}
-        {self.existing_code}
+        {existing_code}
         ```
         
         Provide the complete edited code with no additional explanations.
         """
     
+    def _render_chunk_prompt(self, user_message: str, chunks: str) -> str:
+        return (
+            f"Edit the following parts of {self.file_to_edit} based on the user's request.\n\n"
+            f"User request: {user_message}\n\n"
+            f"{chunks}\n\n"
+            f"Reply with the complete edited version of every chunk you change, each under its own "
+            f"\"### CHUNK <number>\" header line exactly as above. Leave out chunks that do not change. "
+            f"No additional explanations.\n"
+        )
+    
+    def _existing_content(self) -> str:
+        return self.existing_code
+    
+    def _build_patch_prompt(self) -> str:
+        code = render_chunks(self.chunks) if self.chunks else self.existing_code
+        return self._fit(self._render_patch_prompt, user_message=request_section(self.user_message, 1), code=Section(code))
+    
+    def _render_patch_prompt(self, user_message: str, code: str) -> str:
+        # the file goes in unindented so SEARCH lines can be copied verbatim
+        if self.chunks:
+            code = f"Relevant parts of the existing code ({self.file_to_edit}):\n{code}"
+        else:
+            code = f"Existing code ({self.file_to_edit}):\n```{self.language}\n{code}\n```"
+        return (
+            f"Edit the following {self.language} code based on the user's request.\n\n"
+            f"User request: {user_message}\n\n"
+            f"{code}\n\n"
+            f"{PATCH_INSTRUCTIONS}\n"
+        )
+    
+    def _extract_content(self, code_with_markdown: str) -> str:
+        if not self.chunks:
+            return super()._extract_content(code_with_markdown)
+        edited = parse_chunk_reply(code_with_markdown)
+        if not edited and len(self.chunks) == 1:
+            # a single chunk sent back without its header
+            edited = {self.chunks[0].index: super()._extract_content(code_with_markdown)}
+        if not edited:
+            logging.warning(f"{self.node_name}: no chunk headers in the reply, file left unchanged")
+        return splice_chunks(self.existing_code, self.chunks, edited)
+    
     def _get_output_file(self) -> str:
         return self.file_to_edit
     
@@ -115,4 +235,14 @@ def generate_code(state: dict) -> dict:
 def edit_code(state: dict) -> dict:
     """Edit existing code based on user request."""
     editor = CodeEditor(state)
-    return editor.process()
\ No newline at end of file
+    return editor.process()
+
+async def agenerate_code(state: dict) -> dict:
+    """async version of generate_code"""
+    generator = CodeGenerator(state)
+    return await generator.aprocess()
+
+async def aedit_code(state: dict) -> dict:
+    """async version of edit_code, the existing file is read in a worker thread"""
+    editor = await asyncio.to_thread(CodeEditor, state)
+    return await editor.aprocess()
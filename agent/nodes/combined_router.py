@@ -0,0 +1,61 @@
+from typing import Any, Dict
+from ..utils.state import MessageState
+from ..utils.llm import query_llm, aquery_llm
+from ..utils.token_budget import FittedPrompt, budget_update, fit_prompt, request_section
+from ..utils.memory import history_section, with_history
+
+INTENTS = ("question", "generate_code", "edit_code", "generate_text", "edit_text")
+
+def _render_prompt(user_message: str) -> str:
+    return f"""
+    Analyze the following user message and determine its intent from these categories:
+    1. question: A direct question that should be answered
+    2. generate_code: User wants to generate new code
+    3. edit_code: User wants to edit existing code
+    4. generate_text: User wants to generate free text
+    5. edit_text: User wants to edit existing text
+    
+    If code-related, also determine the programming language.
+    
+    User message: {user_message}
+    
+    Return a JSON with the following structure:
+    {{
+        "intent": "question" | "generate_code" | "edit_code" | "generate_text" | "edit_text",
+        "language": "python" | "java" | "cpp" | "javascript" | etc. or null
+    }}
+    """
+
+def _build_prompt(state: MessageState) -> FittedPrompt:
+    return fit_prompt("route_message", with_history(_render_prompt),
+                      user_message=request_section(state["messages"][-1].content), history=history_section(state))
+
+def _parse_result(result: Any) -> Dict[str, Any]:
+    updates = {}
+    
+    if isinstance(result, dict):
+        intent = result.get("intent") or result.get("specific_intent")
+        # same fallback as the two stage path, ends in generate_response
+        updates["intent"] = intent if intent in INTENTS else "generation"
+        
+        if result.get("language"):
+            updates["language"] = result["language"]
+    else:
+        updates["intent"] = "generation"
+    
+    return updates
+
+def route_message(state: MessageState) -> Dict[str, Any]:
+    """
+    Classify the user message into its final intent and language in one LLM call.
+    Replaces analyze_message + classify_intent when ROUTING_MODE is "combined".
+    """
+    prompt = _build_prompt(state)
+    result = query_llm(prompt.text, parse_json=True, node="route_message")
+    return {**_parse_result(result), **budget_update(state, "route_message", prompt.report)}
+
+async def aroute_message(state: MessageState) -> Dict[str, Any]:
+    """async version of route_message"""
+    prompt = _build_prompt(state)
+    result = await aquery_llm(prompt.text, parse_json=True, node="route_message")
+    return {**_parse_result(result), **budget_update(state, "route_message", prompt.report)}
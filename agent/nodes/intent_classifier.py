@@ -1,19 +1,11 @@
 from typing import Any
 from ..utils.state import MessageState
-from ..utils.llm import query_llm
+from ..utils.llm import query_llm_fields, aquery_llm_fields
+from ..utils.token_budget import FittedPrompt, budget_update, fit_prompt, request_section
+from ..utils.memory import history_section, with_history
 
-def classify_intent(state: MessageState) -> dict[str, Any]:
-    """
-    Classify what type of generation or editing is requested.
-    This node determines the specific intent from:
-    1. generate_code: User wants to generate new code
-    2. edit_code: User wants to edit existing code
-    3. generate_text: User wants to generate free text
-    4. edit_text: User wants to edit existing text
-    """
-    user_message = state["messages"][-1].content
-    
-    prompt = f"""
+def _render_prompt(user_message: str) -> str:
+    return f"""
     Analyze the following user request for generation or editing:
     {user_message}
     
@@ -32,9 +24,12 @@ def classify_intent(state: MessageState) -> dict[str, Any]:
         "details": "brief explanation of why you classified it this way"
     }}
     """
-    
-    result = query_llm(prompt, parse_json=True)
-    
+
+def _build_prompt(state: MessageState) -> FittedPrompt:
+    return fit_prompt("classify_intent", with_history(_render_prompt),
+                      user_message=request_section(state["messages"][-1].content), history=history_section(state))
+
+def _parse_result(result: Any) -> dict[str, Any]:
     updates = {}
     
     if isinstance(result, dict):
@@ -46,4 +41,23 @@ def classify_intent(state: MessageState) -> dict[str, Any]:
         if "language" in result and result["language"]:
             updates["language"] = result["language"]
     
-    return updates
\ No newline at end of file
+    return updates
+
+def classify_intent(state: MessageState) -> dict[str, Any]:
+    """
+    Classify what type of generation or editing is requested.
+    This node determines the specific intent from:
+    1. generate_code: User wants to generate new code
+    2. edit_code: User wants to edit existing code
+    3. generate_text: User wants to generate free text
+    4. edit_text: User wants to edit existing text
+    """
+    prompt = _build_prompt(state)
+    result = query_llm_fields(prompt.text, ("specific_intent", "language"), node="classify_intent")
+    return {**_parse_result(result), **budget_update(state, "classify_intent", prompt.report)}
+
+async def aclassify_intent(state: MessageState) -> dict[str, Any]:
+    """async version of classify_intent"""
+    prompt = _build_prompt(state)
+    result = await aquery_llm_fields(prompt.text, ("specific_intent", "language"), node="classify_intent")
+    return {**_parse_result(result), **budget_update(state, "classify_intent", prompt.report)}
@@ -0,0 +1,47 @@
+import logging
+from typing import Any, Dict
+
+from ..config import Config
+from ..utils.state import MessageState
+from ..utils.llm import query_llm, aquery_llm
+from ..utils.memory import build_summary_prompt, fallback_summary, finish_summary, new_turn, split_window
+from ..utils.token_budget import budget_update
+
+def _prepare(state: MessageState):
+    settings = Config().MEMORY
+    history = list(state.get("history") or []) + [new_turn(state, settings.get("MAX_TURN_CHARS", 2000))]
+    folded, kept = split_window(history, settings)
+    return settings, folded, kept
+
+def update_memory(state: MessageState) -> Dict[str, Any]:
+    """
+    add the finished turn to the conversation window, turns falling out of the
+    window are folded into the rolling summary with one LLM call
+    """
+    settings, folded, kept = _prepare(state)
+    summary = state.get("summary") or ""
+    if not folded:
+        return {"history": kept}
+
+    prompt = build_summary_prompt(summary, folded, settings)
+    try:
+        summary = finish_summary(query_llm(prompt.text, node="summarize_memory"), settings)
+    except Exception as e:
+        logging.warning(f"Summarizing the conversation failed, keeping a plain summary: {str(e)}")
+        summary = fallback_summary(summary, folded, settings)
+    return {"history": kept, "summary": summary, **budget_update(state, "summarize_memory", prompt.report)}
+
+async def aupdate_memory(state: MessageState) -> Dict[str, Any]:
+    """async version of update_memory"""
+    settings, folded, kept = _prepare(state)
+    summary = state.get("summary") or ""
+    if not folded:
+        return {"history": kept}
+
+    prompt = build_summary_prompt(summary, folded, settings)
+    try:
+        summary = finish_summary(await aquery_llm(prompt.text, node="summarize_memory"), settings)
+    except Exception as e:
+        logging.warning(f"Summarizing the conversation failed, keeping a plain summary: {str(e)}")
+        summary = fallback_summary(summary, folded, settings)
+    return {"history": kept, "summary": summary, **budget_update(state, "summarize_memory", prompt.report)}
@@ -0,0 +1,97 @@
+import time
+import logging
+from typing import List, Optional
+
+from ..config import Config
+from ..utils.file_utils import FileUtils
+from ..utils.patching import PatchError, apply_patch
+
+class PatchEditMixin:
+    """
+    edits through a patch instead of regenerating the whole file.
+    With EDIT_MODE "patch" the model returns SEARCH/REPLACE blocks (unified
+    diffs are accepted too) that are applied to the existing content; when
+    they do not apply the full-file prompt runs as a fallback. Only the
+    fallback is streamed to the terminal.
+    Latency and output tokens of every edit end up in state["edit_stats"].
+    """
+    file_to_edit: str
+    edit_stats: Optional[dict] = None
+
+    def _existing_content(self) -> str:
+        raise NotImplementedError
+
+    def _build_patch_prompt(self) -> str:
+        raise NotImplementedError
+
+    def _use_patch(self) -> bool:
+        # a new file has nothing to patch
+        return Config().EDIT_MODE == "patch" and FileUtils.file_exists(self.file_to_edit)
+
+    def process(self) -> dict:
+        result = super().process()
+        result["edit_stats"] = self.edit_stats
+        return result
+
+    async def aprocess(self) -> dict:
+        result = await super().aprocess()
+        result["edit_stats"] = self.edit_stats
+        return result
+
+    def _generate(self, prompt: str) -> str:
+        start = time.perf_counter()
+        usages: List[dict] = []
+        patch_error = None
+        if self._use_patch():
+            usage = {}
+            # SEARCH/REPLACE blocks are not shown, the patched file is displayed once applied
+            reply = self._query_llm(self._build_patch_prompt(), usage=usage, stream=False)
+            usages.append(usage)
+            try:
+                content = apply_patch(self._existing_content(), reply)
+                self._record_edit("patch", start, usages)
+                return content
+            except PatchError as e:
+                patch_error = str(e)
+                logging.warning(f"{self.node_name}: patch did not apply, regenerating the whole file: {patch_error}")
+
+        usage = {}
+        content = self._extract_content(self._query_llm(prompt, usage=usage))
+        usages.append(usage)
+        self._record_edit("patch_fallback" if patch_error else "full", start, usages, patch_error)
+        return content
+
+    async def _agenerate(self, prompt: str) -> str:
+        start = time.perf_counter()
+        usages: List[dict] = []
+        patch_error = None
+        if self._use_patch():
+            usage = {}
+            reply = await self._aquery_llm(self._build_patch_prompt(), usage=usage)
+            usages.append(usage)
+            try:
+                content = apply_patch(self._existing_content(), reply)
+                self._record_edit("patch", start, usages)
+                return content
+            except PatchError as e:
+                patch_error = str(e)
+                logging.warning(f"{self.node_name}: patch did not apply, regenerating the whole file: {patch_error}")
+
+        usage = {}
+        content = self._extract_content(await self._aquery_llm(prompt, usage=usage))
+        usages.append(usage)
+        self._record_edit("patch_fallback" if patch_error else "full", start, usages, patch_error)
+        return content
+
+    def _record_edit(self, mode: str, start: float, usages: List[dict], patch_error: Optional[str] = None):
+        self.edit_stats = {
+            "mode": mode,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+            "llm_calls": len(usages),
+            "output_tokens": sum(u.get("output_tokens", 0) for u in usages),
+            "input_tokens": sum(u.get("input_tokens", 0) for u in usages),
+            "estimated_tokens": any(u.get("estimated", False) for u in usages),
+            "patch_error": patch_error,
+        }
+        logging.info(f"{self.node_name} {mode}: {self.edit_stats['latency_ms']} ms, "
+                     f"{self.edit_stats['output_tokens']} output tokens")
@@ -1,29 +1,59 @@
+import asyncio
 import logging
 from datetime import datetime
 
 from ..utils.state import MessageState
-from ..utils.llm import query_llm
+from ..utils.llm import query_llm, aquery_llm, stream_llm
 from ..utils.file_utils import FileUtils
+from ..utils.output_manager import OutputManager
+from ..utils.token_budget import FittedPrompt, budget_update, fit_prompt, request_section
+from ..utils.memory import history_section, with_history
+from ..utils.profiles import profile_for
+from ..utils.question_cache import cached_answer, store_answer
 
-def handle_question(state: MessageState) -> MessageState:
-    """direct questions and output answers to the terminal"""
-    
-    user_message = state["messages"][-1].content
-    filename = state.get("output_file", None)
-    prompt = f"""
+def _render_prompt(user_message: str) -> str:
+    return f"""
     The user has asked the following question:
     {user_message}
     
     Please provide a direct and helpful answer.
     """
 
-    
-    answer = query_llm(prompt)
+def _build_prompt(state: MessageState) -> FittedPrompt:
+    return fit_prompt("handle_question", with_history(_render_prompt),
+                      user_message=request_section(state["messages"][-1].content), history=history_section(state))
 
+def _save_answer(filename: str, answer: str, user_message: str) -> bool:
     #save answer to file
     filename = FileUtils.get_answer_filename(filename=filename)
-    FileUtils.write_to_file(filename=filename, content=answer, 
-                            is_question=True, user_message=user_message)
+    return FileUtils.write_to_file(filename=filename, content=answer, 
+                                   is_question=True, user_message=user_message)
+
+def handle_question(state: MessageState) -> MessageState:
+    """direct questions and output answers to the terminal"""
+    
+    user_message = state["messages"][-1].content
+    filename = state.get("output_file", None)
+    streamed = OutputManager.stream_enabled()
+    model = profile_for("handle_question").model
+
+    answer = cached_answer(state, model)
+    if answer is not None:
+        if streamed:
+            OutputManager.display_stream(iter([answer]), title="Answer", border_style="blue")
+        _save_answer(filename, answer, user_message)
+        return {**state, "response": answer, "streamed": streamed}
+
+    prompt = _build_prompt(state)
+    if streamed:
+        # rendered live, the file is written once the stream ends
+        answer = OutputManager.display_stream(stream_llm(prompt.text, node="handle_question"),
+                                              title="Answer", border_style="blue")
+    else:
+        answer = query_llm(prompt.text, node="handle_question")
+
+    store_answer(state, model, answer)
+    _save_answer(filename, answer, user_message)
 
     #summary for logging
     # summary = answer[:100] + "..." if len(answer) > 100 else answer # removed summry as it was not needed
@@ -36,5 +66,30 @@ def handle_question(state: MessageState) -> MessageState:
     # Update state
     return {
         **state,
-        "response": answer
-    }
\ No newline at end of file
+        "response": answer,
+        "streamed": streamed,
+        **budget_update(state, "handle_question", prompt.report)
+    }
+
+async def ahandle_question(state: MessageState) -> MessageState:
+    """async version of handle_question, the question cache and the file write run in worker threads"""
+    user_message = state["messages"][-1].content
+    filename = state.get("output_file", None)
+    model = profile_for("handle_question").model
+
+    answer = await asyncio.to_thread(cached_answer, state, model)
+    if answer is not None:
+        await asyncio.to_thread(_save_answer, filename, answer, user_message)
+        return {**state, "response": answer}
+
+    prompt = _build_prompt(state)
+    answer = await aquery_llm(prompt.text, node="handle_question")
+
+    await asyncio.to_thread(store_answer, state, model, answer)
+    await asyncio.to_thread(_save_answer, filename, answer, user_message)
+
+    return {
+        **state,
+        "response": answer,
+        **budget_update(state, "handle_question", prompt.report)
+    }
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from ..utils.state import MessageState
 from ..utils.output_manager import OutputManager
@@ -21,4 +22,8 @@ def generate_response(state: MessageState) -> MessageState:
     # if "output_file" in state and state["output_file"]:
     #     logging.info(f"Output saved to: {state['output_file']}")
     
-    return state
\ No newline at end of file
+    return state
+
+async def agenerate_response(state: MessageState) -> MessageState:
+    """async version of generate_response, rendering runs in a worker thread"""
+    return await asyncio.to_thread(generate_response, state)
@@ -0,0 +1,100 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..config import Config
+from ..utils.state import MessageState
+from ..utils.metrics import record_speculation
+from .analyzer import analyze_message, aanalyze_message
+from .intent_classifier import classify_intent, aclassify_intent
+
+# classify_intent calls of graph.invoke run here while analyze_message runs on the caller's thread
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=Config().LLM_POOL_SIZE, thread_name_prefix="speculative")
+        return _pool
+
+def close_speculative_pool():
+    """wait for speculative calls still running, the next graph.invoke starts a new pool"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+def _timed(func: Callable, state: MessageState) -> Tuple[Dict[str, Any], float]:
+    start = time.perf_counter()
+    return func(state), time.perf_counter() - start
+
+async def _atimed(afunc: Callable, state: MessageState) -> Tuple[Dict[str, Any], float]:
+    start = time.perf_counter()
+    return await afunc(state), time.perf_counter() - start
+
+def _merge(analyzed: Dict[str, Any], classified: Dict[str, Any], saved: float) -> Dict[str, Any]:
+    # both token_budget updates are copies of the state's one plus their own node
+    record_speculation("used", saved=saved)
+    budget = {**(analyzed.get("token_budget") or {}), **(classified.get("token_budget") or {})}
+    return {**analyzed, **classified, "token_budget": budget}
+
+def speculative_route(state: MessageState) -> Dict[str, Any]:
+    """
+    analyze_message with classify_intent started alongside it on a pool thread.
+    The classification is used when the message is a generation request and
+    thrown away otherwise; a running call cannot be stopped in sync mode so
+    it finishes in the background. Used when ROUTING_MODE is "speculative".
+    """
+    start = time.perf_counter()
+    future: Future = _get_pool().submit(_timed, classify_intent, state)
+    try:
+        analyzed, analyze_seconds = _timed(analyze_message, state)
+    except BaseException:
+        future.cancel()
+        raise
+
+    if analyzed.get("intent") != "generation":
+        def discard(done: Future):
+            if done.cancelled():
+                record_speculation("cancelled")
+            else:
+                record_speculation("discarded", wasted=time.perf_counter() - start)
+        # not started yet when the pool is busy, then it never runs
+        if future.cancel():
+            record_speculation("cancelled")
+        else:
+            future.add_done_callback(discard)
+        return analyzed
+
+    classified, classify_seconds = future.result()
+    # serial routing would have waited for both calls one after the other
+    return _merge(analyzed, classified, saved=min(analyze_seconds, classify_seconds))
+
+async def aspeculative_route(state: MessageState) -> Dict[str, Any]:
+    """async version of speculative_route, the losing classify_intent call is cancelled"""
+    start = time.perf_counter()
+    task = asyncio.create_task(_atimed(aclassify_intent, state))
+    try:
+        analyzed, analyze_seconds = await _atimed(aanalyze_message, state)
+    except BaseException:
+        task.cancel()
+        raise
+
+    if analyzed.get("intent") != "generation":
+        if task.done():
+            # finished first, e.g. from the response cache; retrieve the error so it is not logged
+            if not task.cancelled():
+                task.exception()
+            record_speculation("discarded", wasted=time.perf_counter() - start)
+        else:
+            task.cancel()
+            record_speculation("cancelled", wasted=time.perf_counter() - start)
+        return analyzed
+
+    classified, classify_seconds = await task
+    return _merge(analyzed, classified, saved=min(analyze_seconds, classify_seconds))
@@ -1,14 +1,23 @@
 # Logic of class is same for code processing
+import asyncio
 from ..utils.state import MessageState
-from ..utils.llm import query_llm, extract_code_from_markdown
+from ..utils.llm import query_llm, aquery_llm, stream_llm, extract_code_from_markdown
 from ..utils.file_utils import FileUtils
+from ..utils.output_manager import OutputManager
+from ..utils.patching import PATCH_INSTRUCTIONS
+from ..utils.token_budget import Section, budget_update, fit_prompt, request_section
+from ..utils.memory import history_section, with_history
+from .patch_editor import PatchEditMixin
 
 class TextProcessor:
     """Base class for processing text requests."""
+    node_name = None
     
     def __init__(self, state: dict, edit: bool = False):
         self.state = state
         self.user_message = state["messages"][-1].content
+        self.streamed = False
+        self.token_report = None
         if edit:
             self.filename = state.get("filename") or "fixed_output.txt"
         else:
@@ -18,12 +27,7 @@ class TextProcessor:
         """Process the text request and return updated state."""
         prompt = self._build_prompt()
         
-        generated_text = self._query_llm(prompt)
-        
-        if "```" in generated_text:
-            processed_text = extract_code_from_markdown(generated_text)
-        else:
-            processed_text = generated_text
+        processed_text = self._generate(prompt)
         
         output_file = self._get_output_file()
         success = self._save_to_file(output_file, processed_text)
@@ -34,11 +38,63 @@ class TextProcessor:
             **self.state,
             "source_text": processed_text,
             "output_file": output_file,
-            "response": response
+            "response": response,
+            "streamed": self.streamed,
+            **self._budget_update()
+        }
+    
+    async def aprocess(self) -> dict:
+        """async version of process, the file write runs in a worker thread"""
+        prompt = self._build_prompt()
+        
+        processed_text = await self._agenerate(prompt)
+        
+        output_file = self._get_output_file()
+        success = await asyncio.to_thread(self._save_to_file, output_file, processed_text)
+        
+        response = self._build_response(success, output_file)
+        
+        return {
+            **self.state,
+            "source_text": processed_text,
+            "output_file": output_file,
+            "response": response,
+            "streamed": self.streamed,
+            **self._budget_update()
         }
     
-    def _query_llm(self, prompt: str) -> str:
-        return query_llm(prompt)
+    def _fit(self, render, **sections: Section) -> str:
+        """fit the prompt into the node budget, the conversation so far goes first, the report goes into the state"""
+        fitted = fit_prompt(self.node_name, with_history(render), history=history_section(self.state), **sections)
+        self.token_report = fitted.report
+        return fitted.text
+    
+    def _budget_update(self) -> dict:
+        if self.token_report is None:
+            return {}
+        return budget_update(self.state, self.node_name, self.token_report)
+    
+    def _generate(self, prompt: str) -> str:
+        return self._extract_content(self._query_llm(prompt))
+    
+    async def _agenerate(self, prompt: str) -> str:
+        return self._extract_content(await self._aquery_llm(prompt))
+    
+    def _query_llm(self, prompt: str, usage: dict = None, stream: bool = True) -> str:
+        if stream and OutputManager.stream_enabled():
+            # rendered live, the file is written once the stream ends
+            self.streamed = True
+            return OutputManager.display_stream(stream_llm(prompt, node=self.node_name, usage=usage),
+                                                title="Generating Text", border_style="cyan")
+        return query_llm(prompt, node=self.node_name, usage=usage)
+    
+    async def _aquery_llm(self, prompt: str, usage: dict = None) -> str:
+        return await aquery_llm(prompt, node=self.node_name, usage=usage)
+    
+    def _extract_content(self, generated_text: str) -> str:
+        if "```" in generated_text:
+            return extract_code_from_markdown(generated_text)
+        return generated_text
     
     def _save_to_file(self, file_path: str, content: str) -> bool:
         return FileUtils.write_to_file(
@@ -61,14 +117,18 @@ class TextProcessor:
 
 class TextGenerator(TextProcessor):
     """Class for generating new text."""
+    node_name = "generate_text"
     def __init__(self, state: dict):
         super().__init__(state, edit=False)
         self.filename = state.get("filename") or "output.txt"
     
     def _build_prompt(self) -> str:
+        return self._fit(self._render_prompt, user_message=request_section(self.user_message))
+    
+    def _render_prompt(self, user_message: str) -> str:
         return f"""
         Generate text based on the following request:
-        {self.user_message}
+        {user_message}
         
         Provide the text with no additional explanations or markdown formatting.
         """
@@ -83,8 +143,9 @@ class TextGenerator(TextProcessor):
             return f"Error saving generated text to {output_file}"
             
 
-class TextEditor(TextProcessor):
+class TextEditor(PatchEditMixin, TextProcessor):
     """Class for editing existing text."""
+    node_name = "edit_text"
     
     def __init__(self, state: dict):
         super().__init__(state, edit=True)
@@ -92,17 +153,39 @@ class TextEditor(TextProcessor):
         self.existing_text = FileUtils.read_file_if_exists(self.file_to_edit)
     
     def _build_prompt(self) -> str:
+        # the text is never cut here, the model would return the cut text
+        return self._fit(self._render_prompt, user_message=request_section(self.user_message, 1),
+                         existing_text=Section(self.existing_text, truncatable=False))
+    
+    def _render_prompt(self, user_message: str, existing_text: str) -> str:
         return f"""
         Edit the following text based on the user's request:
         
-        User request: {self.user_message}
+        User request: {user_message}
         
         Existing text:
-        {self.existing_text}
+        {existing_text}
         
         Provide the complete edited text with no additional explanations or markdown formatting.
         """
     
+    def _existing_content(self) -> str:
+        return self.existing_text
+    
+    def _build_patch_prompt(self) -> str:
+        return self._fit(self._render_patch_prompt, user_message=request_section(self.user_message, 1),
+                         existing_text=Section(self.existing_text))
+    
+    def _render_patch_prompt(self, user_message: str, existing_text: str) -> str:
+        # the text goes in unindented so SEARCH lines can be copied verbatim
+        return (
+            f"Edit the following text based on the user's request.\n\n"
+            f"User request: {user_message}\n\n"
+            f"Existing text ({self.file_to_edit}):\n"
+            f"{existing_text}\n\n"
+            f"{PATCH_INSTRUCTIONS}\n"
+        )
+    
     def _get_output_file(self) -> str:
         return self.file_to_edit
     
@@ -121,4 +204,14 @@ def generate_text(state: MessageState) -> MessageState:
 def edit_text(state: MessageState) -> MessageState:
     """Edit existing text based on user request."""
     editor = TextEditor(state)
-    return editor.process()
\ No newline at end of file
+    return editor.process()
+
+async def agenerate_text(state: MessageState) -> MessageState:
+    """async version of generate_text"""
+    generator = TextGenerator(state)
+    return await generator.aprocess()
+
+async def aedit_text(state: MessageState) -> MessageState:
+    """async version of edit_text, the existing file is read in a worker thread"""
+    editor = await asyncio.to_thread(TextEditor, state)
+    return await editor.aprocess()
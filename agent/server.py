@@ -0,0 +1,208 @@
+"""
+HTTP service mode.
+
+Exposes the compiled graph over HTTP on the port docker-compose publishes:
+
+    python -m agent.server --host 0.0.0.0 --port 8000
+
+    POST /invoke   {"message": "..."} -> final MessageState as JSON
+    POST /stream   {"message": "..."} -> Server-Sent Events with node
+                   transitions, LLM tokens and the final state
+
+Both accept an optional "thread_id", requests with the same thread_id share
+the conversation memory (history and summary persisted in MEMORY.PATH), and
+"bypass_cache": true to skip the near duplicate question cache.
+    GET  /health   liveness and in-flight request count
+    GET  /metrics  per node and per LLM call latency histograms, Prometheus text
+
+On SIGTERM uvicorn stops accepting connections and waits up to
+SERVER.SHUTDOWN_TIMEOUT seconds for in-flight requests before the graph
+resources are released.
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from langchain_core.messages import AIMessageChunk
+
+from .config import Config, ConfigSnapshot
+from .helper import GraphManager
+from .utils.state import create_initial_state
+from .utils import output_manager
+from .utils.metrics import metrics
+from .utils.resilience import LLMTimeoutError, LLMUnavailableError
+from .utils.token_budget import PromptTooLargeError
+
+
+class InvokeRequest(BaseModel):
+    message: str
+    thread_id: Optional[str] = None  # conversation to continue, none is a one-turn conversation
+    bypass_cache: bool = False  # answer a question with the LLM even when a near duplicate is cached
+
+
+def serialize_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """MessageState as plain JSON, messages become {type, content}"""
+    result = {}
+    for key, value in state.items():
+        if key == "messages":
+            result[key] = [{"type": m.type, "content": m.content} for m in value]
+        else:
+            result[key] = value
+    return result
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class InFlight:
+    """counts requests being processed, reported by /health"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        self.count += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.count -= 1
+        return False
+
+
+def create_app(config: Optional[ConfigSnapshot] = None) -> FastAPI:
+    config = config or Config()
+    settings = config.SERVER
+    request_timeout = settings.get("REQUEST_TIMEOUT", 120)
+    in_flight = InFlight()
+    manager = GraphManager(config)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # the response panels are for the REPL
+        output_manager.console.quiet = True
+        with manager:
+            logging.info("Graph built, serving requests")
+            yield
+            logging.info(f"Shutting down with {in_flight.count} requests in flight")
+
+    app = FastAPI(title="Agentic System", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "in_flight": in_flight.count}
+
+    @app.get("/metrics")
+    async def prometheus_metrics():
+        return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+    @app.post("/invoke")
+    async def invoke(request: InvokeRequest):
+        with in_flight:
+            start = time.perf_counter()
+            graph, run_config = manager.for_thread(request.thread_id)
+            try:
+                state = await asyncio.wait_for(
+                    graph.ainvoke(create_initial_state(request.message, request.bypass_cache), run_config),
+                    timeout=request_timeout,
+                )
+            except LLMUnavailableError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            except LLMTimeoutError as e:
+                raise HTTPException(status_code=504, detail=str(e))
+            except PromptTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=504, detail=f"Request timed out after {request_timeout}s")
+            except Exception as e:
+                logging.exception("Graph processing error")
+                raise HTTPException(status_code=500, detail=str(e))
+            result = serialize_state(state)
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            return result
+
+    @app.post("/stream")
+    async def stream(request: InvokeRequest):
+        return StreamingResponse(_stream_events(request.message, request.thread_id, request.bypass_cache), media_type="text/event-stream")
+
+    async def _stream_events(message: str, thread_id: Optional[str] = None,
+                             bypass_cache: bool = False) -> AsyncIterator[str]:
+        with in_flight:
+            start = time.perf_counter()
+            deadline = start + request_timeout
+            final_state: Dict[str, Any] = {}
+            graph, run_config = manager.for_thread(thread_id)
+            events = graph.astream(
+                create_initial_state(message, bypass_cache),
+                run_config,
+                stream_mode=["updates", "messages", "values"],
+            )
+            try:
+                while True:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    try:
+                        mode, chunk = await asyncio.wait_for(events.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+
+                    if mode == "updates":
+                        for node in chunk:
+                            yield _sse("node", {"node": node})
+                    elif mode == "messages":
+                        token, metadata = chunk
+                        # state messages are echoed in this mode too, only LLM chunks are tokens
+                        if isinstance(token, AIMessageChunk) and token.content:
+                            yield _sse("token", {"node": metadata.get("langgraph_node"), "content": token.content})
+                    elif mode == "values":
+                        final_state = chunk
+
+                result = serialize_state(final_state)
+                result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                yield _sse("final", result)
+            except asyncio.TimeoutError:
+                yield _sse("error", {"detail": f"Request timed out after {request_timeout}s"})
+            except Exception as e:
+                logging.exception("Graph processing error")
+                yield _sse("error", {"detail": str(e)})
+            finally:
+                await events.aclose()
+
+    return app
+
+
+def main(argv=None):
+    settings = Config.SERVER
+    parser = argparse.ArgumentParser(prog="python -m agent.server", description="Serve the graph over HTTP.")
+    parser.add_argument("--host", default=settings.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=settings.get("PORT", 8000))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logging.getLogger("openai._client").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if not Config.check_api_key():
+        return 1
+
+    uvicorn.run(
+        create_app(),
+        host=args.host,
+        port=args.port,
+        timeout_graceful_shutdown=settings.get("SHUTDOWN_TIMEOUT", 30),
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
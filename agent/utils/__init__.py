@@ -1,15 +1,34 @@
-from .state import MessageState, create_initial_state
-from .llm import query_llm, extract_code_from_markdown
-from .file_utils import FileUtils
-from .router import primary_router, intent_router
-
-
-__all__ = [
-    'MessageState',
-    'create_initial_state',
-    'query_llm',
-    'extract_code_from_markdown',
-    'FileUtils',
-    'primary_router',
-    'intent_router',
-]
\ No newline at end of file
+from importlib import import_module
+
+# names are resolved on first access so importing agent.utils does not pull
+# langchain and the http stack in up front
+_EXPORTS = {
+    'MessageState': '.state',
+    'create_initial_state': '.state',
+    'ParsedMessage': '.message_parser',
+    'parse_message': '.message_parser',
+    'query_llm': '.llm',
+    'aquery_llm': '.llm',
+    'stream_llm': '.llm',
+    'astream_llm': '.llm',
+    'get_llm': '.llm',
+    'get_async_llm': '.llm',
+    'close_clients': '.llm',
+    'extract_code_from_markdown': '.llm',
+    'FileUtils': '.file_utils',
+    'primary_router': '.router',
+    'intent_router': '.router',
+    'combined_router': '.router',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Union
+
+from ..config import Config
+
+class ResponseCache:
+    """
+    two tier cache for llm responses, a bounded in-memory LRU in front of a sqlite store.
+    entries expire by per-node TTL and the sqlite file is trimmed by size.
+    """
+
+    def __init__(self, path: str, memory_max_entries: int = 1024, disk_max_bytes: int = 100 * 1024 * 1024,
+                 default_ttl: float = 0, node_ttls: Optional[Dict[str, float]] = None,
+                 only_deterministic: bool = True):
+        self.path = path
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.default_ttl = default_ttl
+        self.node_ttls = node_ttls or {}
+        self.only_deterministic = only_deterministic
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                node TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+        self._db.execute("DELETE FROM llm_cache WHERE expires <= ?", (time.time(),))
+        self._db.commit()
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str, parse_json: Union[bool, str],
+                 max_tokens: Optional[int] = None, stop: Optional[Sequence[str]] = None) -> str:
+        """hash of everything that changes the response"""
+        parts = [model, temperature, prompt, parse_json]
+        if max_tokens or stop:
+            # uncapped calls keep the keys they had before model profiles
+            parts += [max_tokens, list(stop or ())]
+        raw = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, node: Optional[str]) -> float:
+        return self.node_ttls.get(node, self.default_ttl) if node else self.default_ttl
+
+    def is_cacheable(self, node: Optional[str], temperature: float) -> bool:
+        if self.only_deterministic and temperature != 0:
+            return False
+        return self.ttl_for(node) > 0
+
+    def get(self, key: str) -> Any:
+        """return the cached value or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT value, expires FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self.counters["misses"] += 1
+                return None
+
+            self._db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            self.counters["disk_hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any, node: Optional[str] = None):
+        """store a value with the TTL of the node"""
+        ttl = self.ttl_for(node)
+        if ttl <= 0:
+            return
+        now = time.time()
+        expires = now + ttl
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+
+        with self._lock:
+            self._remember(key, value, expires)
+            old = self._db.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, node, value, size, expires, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, node, payload, size, expires, now),
+            )
+            self._disk_bytes += size - (old[0] if old else 0)
+            self.counters["stores"] += 1
+            self._evict_disk()
+            self._db.commit()
+
+    def _remember(self, key: str, value: Any, expires: float):
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """drop expired rows, then least recently used rows until under the size limit"""
+        if self._disk_bytes <= self.disk_max_bytes:
+            return
+        self._db.execute("DELETE FROM llm_cache WHERE expires <= ?", (time.time(),))
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        while self._disk_bytes > self.disk_max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                self._disk_bytes -= size
+                self.counters["evictions"] += 1
+                if self._disk_bytes <= self.disk_max_bytes:
+                    break
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM llm_cache")
+            self._db.commit()
+            self._disk_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """return the shared cache, or None when disabled in configs.yaml"""
+    global _cache
+    settings = Config().LLM_CACHE
+    if not settings.get("ENABLED", False):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    path=settings.get("PATH", "outputs/cache/llm_cache.sqlite"),
+                    memory_max_entries=settings.get("MEMORY_MAX_ENTRIES", 1024),
+                    disk_max_bytes=settings.get("DISK_MAX_BYTES", 100 * 1024 * 1024),
+                    default_ttl=settings.get("DEFAULT_TTL", 0),
+                    node_ttls=settings.get("NODE_TTLS") or {},
+                    only_deterministic=settings.get("ONLY_DETERMINISTIC", True),
+                )
+    return _cache
+
+def close_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            try:
+                logging.debug(f"LLM cache stats: {_cache.stats()}")
+                _cache.close()
+            except Exception as e:
+                logging.error(f"Error closing LLM cache: {str(e)}")
+            _cache = None
@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, Optional
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from ..config import Config
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver that also serves graph.ainvoke, the async methods run the sync
+    ones in a worker thread (the saver serializes access with its own lock).
+    Every saved checkpoint marks its thread as active and drops the checkpoints
+    of that thread older than the newest keep_checkpoints.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, keep_checkpoints: int = 2):
+        super().__init__(conn)
+        self.keep_checkpoints = max(1, keep_checkpoints)
+
+    def setup(self):
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                thread_id TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated);
+            """
+        )
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        now = time.time()
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO sessions (thread_id, created, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET updated = excluded.updated",
+                (thread_id, now, now),
+            )
+            # the newest checkpoints are enough to resume, older ones only take space
+            cur.execute(
+                """SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                   ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?""",
+                (thread_id, checkpoint_ns, self.keep_checkpoints - 1),
+            )
+            row = cur.fetchone()
+            if row is not None:
+                for table in ("checkpoints", "writes"):
+                    cur.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                        (thread_id, checkpoint_ns, row[0]),
+                    )
+        return saved
+
+    def delete_thread(self, thread_id: str):
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM sessions WHERE thread_id = ?", (str(thread_id),))
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator[Any]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+class SessionStore:
+    """
+    sqlite file (WAL mode) holding the conversation threads. The graph state of
+    every thread is persisted by the langgraph checkpointer, threads idle for
+    longer than retention_days are deleted and the file is vacuumed once
+    enough pages are free.
+    """
+
+    def __init__(self, path: str, keep_checkpoints: int = 2, retention_days: float = 30,
+                 vacuum_min_free_mb: float = 16):
+        self.path = path
+        self.retention_days = retention_days
+        self.vacuum_min_free_mb = vacuum_min_free_mb
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self.saver = ThreadedSqliteSaver(self._db, keep_checkpoints)
+        self.saver.setup()
+
+    @staticmethod
+    def thread_config(thread_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": str(thread_id)}}
+
+    def prune(self) -> int:
+        """delete the threads idle for longer than retention_days, returns how many"""
+        if not self.retention_days:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        with self.saver.cursor() as cur:
+            cur.execute("SELECT thread_id FROM sessions WHERE updated < ?", (cutoff,))
+            expired = [row[0] for row in cur.fetchall()]
+            for table in ("checkpoints", "writes", "sessions"):
+                cur.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in expired])
+        if expired:
+            logging.info(f"Deleted {len(expired)} conversation threads idle for over {self.retention_days} days")
+        return len(expired)
+
+    def vacuum(self, force: bool = False) -> bool:
+        """rebuild the file when at least vacuum_min_free_mb of it is free pages"""
+        with self.saver.lock:
+            free_pages = self._db.execute("PRAGMA freelist_count").fetchone()[0]
+            page_size = self._db.execute("PRAGMA page_size").fetchone()[0]
+            free_mb = free_pages * page_size / (1024 * 1024)
+            if not force and (not self.vacuum_min_free_mb or free_mb < self.vacuum_min_free_mb):
+                return False
+            self._db.execute("VACUUM")
+            # hand the space back from the write-ahead log too
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logging.info(f"Vacuumed {self.path}, {free_mb:.1f} MB were free")
+        return True
+
+    def maintain(self):
+        """retention then vacuum, run when the store is opened and closed"""
+        try:
+            self.prune()
+            self.vacuum()
+        except sqlite3.Error as e:
+            logging.error(f"Memory store maintenance failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.saver.lock:
+            threads = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            checkpoints = self._db.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return {"threads": threads, "checkpoints": checkpoints,
+                "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0}
+
+    def close(self):
+        self.maintain()
+        with self.saver.lock:
+            self._db.close()
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+def get_session_store() -> Optional[SessionStore]:
+    """return the shared store, or None when memory is disabled in configs.yaml"""
+    global _store
+    settings = Config().MEMORY
+    if not settings.get("ENABLED", True):
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore(
+                    path=settings.get("PATH", "outputs/memory/memory.sqlite"),
+                    keep_checkpoints=settings.get("KEEP_CHECKPOINTS", 2),
+                    retention_days=settings.get("RETENTION_DAYS", 30),
+                    vacuum_min_free_mb=settings.get("VACUUM_MIN_FREE_MB", 16),
+                )
+                _store.maintain()
+    return _store
+
+def close_session_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            try:
+                logging.debug(f"Memory store stats: {_store.stats()}")
+                _store.close()
+            except Exception as e:
+                logging.error(f"Error closing memory store: {str(e)}")
+            _store = None
@@ -0,0 +1,289 @@
+import re
+import ast
+import math
+from collections import Counter
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+class Chunk(NamedTuple):
+    index: int  # position in the file, used to splice edits back
+    start: int  # first line, 0-based
+    end: int  # line after the last one
+    name: str  # function / class name or the first line of the chunk
+    text: str
+
+Span = Tuple[int, int, str]
+
+_BRACE_LANGUAGES = {
+    'javascript', 'typescript', 'java', 'cpp', 'c', 'csharp', 'go', 'rust',
+    'php', 'swift', 'kotlin', 'scala', 'css',
+}
+
+def split_chunks(content: str, language: Optional[str], max_lines: int = 80) -> List[Chunk]:
+    """
+    split a file into consecutive chunks that cover every line exactly once.
+    Python is split on functions and classes with ast, brace languages on
+    top-level blocks, anything else on unindented lines after a blank line.
+    Blocks longer than max_lines are split on their inner blocks.
+    """
+    lines = content.split("\n")
+    spans = None
+    if language == "python":
+        spans = _python_spans(content, max_lines)
+    elif language in _BRACE_LANGUAGES:
+        spans = _brace_spans(lines, max_lines)
+    if spans is None:
+        spans = _indent_spans(lines)
+    spans = _cover(spans, lines, max_lines)
+    return [Chunk(i, start, end, name, "\n".join(lines[start:end])) for i, (start, end, name) in enumerate(spans)]
+
+def _python_spans(content: str, max_lines: int) -> Optional[List[Span]]:
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+    return _python_body_spans(tree.body, max_lines, "")
+
+def _python_body_spans(body: list, max_lines: int, prefix: str) -> List[Span]:
+    spans = []
+    for node in body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+        name = prefix + node.name
+        if isinstance(node, ast.ClassDef) and node.end_lineno - start > max_lines:
+            inner = _python_body_spans(node.body, max_lines, name + ".")
+            if inner:
+                # the class line and attributes up to the first method become their own chunk
+                spans.append((start, inner[0][0], f"class {name}"))
+                spans.extend(inner)
+                continue
+        spans.append((start, node.end_lineno, name))
+    return spans
+
+_STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`')
+
+def _line_depths(lines: List[str]) -> List[Tuple[int, int]]:
+    """brace depth before and after every line, strings and comments are ignored"""
+    depths = []
+    depth = 0
+    in_comment = False
+    for line in lines:
+        before = depth
+        code = _STRING_RE.sub("", line)
+        if in_comment:
+            if "*/" not in code:
+                depths.append((before, depth))
+                continue
+            code = code.split("*/", 1)[1]
+            in_comment = False
+        code = re.sub(r'/\*.*?\*/', "", code)
+        if "/*" in code:
+            code = code.split("/*", 1)[0]
+            in_comment = True
+        code = code.split("//", 1)[0]
+        depth = max(0, depth + code.count("{") - code.count("}"))
+        depths.append((before, depth))
+    return depths
+
+def _brace_spans(lines: List[str], max_lines: int) -> List[Span]:
+    return _brace_blocks(lines, _line_depths(lines), 0, len(lines), 0, max_lines)
+
+def _brace_blocks(lines: List[str], depths: List[Tuple[int, int]], lo: int, hi: int, base: int, max_lines: int) -> List[Span]:
+    spans = []
+    i = lo
+    while i < hi:
+        before, after = depths[i]
+        if before != base or after <= base:
+            i += 1
+            continue
+        # a block opens on line i and closes where the depth is back to base
+        j = i
+        while j < hi and depths[j][1] > base:
+            j += 1
+        end = min(j + 1, hi)
+        start = i
+        # comments, annotations and signatures right above the brace belong to the block
+        while (start - 1 >= lo and lines[start - 1].strip() and depths[start - 1] == (base, base)
+               and not lines[start - 1].rstrip().endswith((";", "}"))):
+            start -= 1
+        name = lines[i].strip()[:80]
+        inner = _brace_blocks(lines, depths, i + 1, end - 1, base + 1, max_lines) if end - start > max_lines else []
+        if inner:
+            spans.append((start, inner[0][0], name))
+            spans.extend(inner)
+        else:
+            spans.append((start, end, name))
+        i = end
+    return spans
+
+def _indent_spans(lines: List[str]) -> List[Span]:
+    """paragraph-like units, a new one starts at an unindented line after a blank line"""
+    starts = [i for i, line in enumerate(lines)
+              if line.strip() and not line[0].isspace() and (i == 0 or not lines[i - 1].strip())]
+    return [(start, end, lines[start].strip()[:80])
+            for start, end in zip(starts, starts[1:] + [len(lines)])]
+
+def _cover(spans: List[Span], lines: List[str], max_lines: int) -> List[Span]:
+    """fill the gaps between spans so every line is in exactly one, long gaps are cut at max_lines"""
+    covered = []
+    position = 0
+    for start, end, name in sorted(spans):
+        if start < position:
+            # nested or overlapping, the outer span already has these lines
+            continue
+        covered.extend(_gap_spans(lines, position, start, max_lines, covered))
+        covered.append((start, end, name))
+        position = end
+    covered.extend(_gap_spans(lines, position, len(lines), max_lines, covered))
+    return covered
+
+def _gap_spans(lines: List[str], start: int, end: int, max_lines: int, previous: List[Span]) -> List[Span]:
+    if start >= end:
+        return []
+    if not any(line.strip() for line in lines[start:end]):
+        if previous:
+            # blank lines stick to the chunk above them
+            last_start, _, last_name = previous.pop()
+            previous.append((last_start, end, last_name))
+            return []
+    spans = []
+    for cut in range(start, end, max_lines):
+        stop = min(cut + max_lines, end)
+        first = next((line.strip() for line in lines[cut:stop] if line.strip()), "")
+        spans.append((cut, stop, first[:80]))
+    return spans
+
+# identifiers are indexed whole and by their camelCase / snake_case parts
+_WORD_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+_PART_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+_STOPWORDS = {
+    'a', 'an', 'the', 'to', 'in', 'of', 'and', 'or', 'for', 'on', 'with', 'it', 'is', 'be',
+    'this', 'that', 'please', 'make', 'change', 'code', 'file', 'so', 'can', 'you', 'i',
+}
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        lowered = word.lower()
+        tokens.append(lowered)
+        parts = _PART_RE.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents"""
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(doc)) for doc in documents]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.doc_freq: Counter = Counter()
+        for counts in self.term_counts:
+            self.doc_freq.update(counts.keys())
+
+    def idf(self, term: str) -> float:
+        n = len(self.term_counts)
+        df = self.doc_freq.get(term, 0)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str) -> List[float]:
+        terms = [t for t in tokenize(query) if t not in _STOPWORDS]
+        idfs = {term: self.idf(term) for term in set(terms)}
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = counts.get(term)
+                if tf:
+                    score += idfs[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+def select_chunks(chunks: List[Chunk], query: str, top_k: int = 6, max_lines: int = 400,
+                  max_tokens: Optional[int] = None, count_tokens: Optional[Callable[[str], int]] = None) -> List[Chunk]:
+    """
+    most relevant chunks for query within top_k, max_lines and max_tokens
+    (counted with count_tokens), returned in file order
+    """
+    scores = BM25Index([chunk.name + "\n" + chunk.text for chunk in chunks]).scores(query)
+    ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+    selected = []
+    total_lines = total_tokens = 0
+    for i in ranked:
+        if len(selected) >= top_k:
+            break
+        size = chunks[i].end - chunks[i].start
+        tokens = count_tokens(chunks[i].text) if max_tokens is not None else 0
+        if selected and (total_lines + size > max_lines or scores[i] <= 0
+                         or (max_tokens is not None and total_tokens + tokens > max_tokens)):
+            continue
+        selected.append(chunks[i])
+        total_lines += size
+        total_tokens += tokens
+    return sorted(selected, key=lambda chunk: chunk.index)
+
+def select_for_edit(content: str, language: Optional[str], request: str, settings: Mapping,
+                    max_tokens: Optional[int] = None, count_tokens: Optional[Callable[[str], int]] = None) -> Optional[List[Chunk]]:
+    """
+    chunks to send for an edit, None when the file is small enough to send
+    whole. A file over max_tokens is chunked even with ENABLED false
+    """
+    fits = max_tokens is None or count_tokens(content) <= max_tokens
+    if not settings.get("ENABLED", True) and fits:
+        return None
+    small = content.count("\n") + 1 < settings.get("MIN_FILE_LINES", 300)
+    if small and fits:
+        return None
+    chunks = split_chunks(content, language, settings.get("MAX_CHUNK_LINES", 80))
+    return select_chunks(chunks, request, settings.get("TOP_K", 6), settings.get("MAX_SELECTED_LINES", 400),
+                         max_tokens, count_tokens)
+
+def render_chunks(chunks: List[Chunk]) -> str:
+    """chunks with a numbered header each, the format parse_chunk_reply reads back"""
+    return "\n".join(f"### CHUNK {chunk.index} (lines {chunk.start + 1}-{chunk.end})\n{chunk.text}" for chunk in chunks)
+
+_CHUNK_HEADER_RE = re.compile(r'^### CHUNK (\d+)[^\n]*\n?', re.MULTILINE)
+_OPENING_FENCE_RE = re.compile(r'\A\s*```[^\n]*\n')
+_CLOSING_FENCE_RE = re.compile(r'\n```[ \t]*\s*\Z')
+
+def parse_chunk_reply(reply: str) -> Dict[int, str]:
+    """
+    chunk index -> edited text of a reply in the render_chunks format. Only
+    the fence pair wrapping a chunk (or the whole reply) is removed, fences
+    inside the code are kept
+    """
+    headers = list(_CHUNK_HEADER_RE.finditer(reply))
+    # a reply wrapped in one fence opens it before the first header and closes it after the last chunk
+    wrapped = bool(headers) and reply[:headers[0].start()].count("```") % 2 == 1
+    edited = {}
+    for header, following in zip(headers, headers[1:] + [None]):
+        body = reply[header.end():following.start() if following else len(reply)]
+        opening = _OPENING_FENCE_RE.match(body)
+        closing = _CLOSING_FENCE_RE.search("\n" + body)
+        if wrapped:
+            if following is None and closing:
+                body = body[:max(0, closing.start() - 1)]
+        elif opening and closing and closing.start() >= opening.end():
+            body = body[opening.end():closing.start() - 1]
+        edited[int(header.group(1))] = body.rstrip("\n")
+    return edited
+
+def splice_chunks(content: str, chunks: List[Chunk], edited: Dict[int, str]) -> str:
+    """replace the lines of each edited chunk, chunks not in edited stay as they are"""
+    lines = content.split("\n")
+    for chunk in sorted(chunks, key=lambda c: c.start, reverse=True):
+        if chunk.index in edited:
+            original = lines[chunk.start:chunk.end]
+            # blank lines separating the chunk from the next one are kept
+            blank = 0
+            while blank < len(original) and not original[-1 - blank].strip():
+                blank += 1
+            replacement = edited[chunk.index].split("\n")
+            while replacement and not replacement[-1].strip():
+                replacement.pop()
+            lines[chunk.start:chunk.end] = replacement + original[len(original) - blank:]
+    return "\n".join(lines)
@@ -1,6 +1,8 @@
 import os
 import logging
 from ..config import Config
+from .file_writer import atomic_write, get_file_writer, pending_content
+from .prefetch import prefetched_content
 
 class FileUtils:
     def __init__(self):
@@ -30,8 +32,20 @@ class FileUtils:
         else:
             return os.path.join(config.SAVING_FOLDER_TEXT, "output.txt")
     @staticmethod
+    def file_exists(filename: str) -> bool:
+        """file is on disk or queued in the background writer"""
+        return pending_content(filename) is not None or os.path.exists(filename)
+    @staticmethod
     def read_file_if_exists(filename: str) -> str:
         """read file if it exists"""
+        # a write still queued in the background writer is the current content
+        queued = pending_content(filename)
+        if queued is not None:
+            return queued
+        # read in the background when the message came in, unless the file changed since
+        prefetched = prefetched_content(filename)
+        if prefetched is not None:
+            return prefetched
         if os.path.exists(filename):
             try:
                 # logging.info(f"Reading file: {filename}")
@@ -45,20 +59,26 @@ class FileUtils:
     
     @staticmethod
     def write_to_file(filename: str, content: str, is_question: bool = False, user_message: str = None, is_code: bool = False, is_text: bool = False) -> bool:
-        """write content to a file."""
+        """
+        write content to a file atomically.
+        With FILE_WRITER.WRITE_BEHIND the write is queued for the background
+        writer and True means queued, failures are logged by the writer.
+        """
+        if is_question:
+            text = f"Question: {user_message}\n\nAnswer: {content}\n\n"
+        elif is_code or is_text:
+            text = content
+        else:
+            text = ""
         try:
-            # logging.info(f"Writing to file: {filename}")
-            with open(filename, "w") as f:
-                if is_question:
-                    f.write(f"Question: {user_message}\n\n")
-                    f.write(f"Answer: {content}\n\n")
-                elif is_code:
-                    f.write(content)
-                elif is_text:
-                    f.write(content)
+            writer = get_file_writer()
+            if writer is not None:
+                writer.submit(filename, text)
+            else:
+                atomic_write(filename, text, fsync=Config().FILE_WRITER.get("FSYNC", False))
             return True
         except Exception as e:
-            # logging.error(f"Error writing to {filename}: {str(e)}")
+            logging.error(f"Error writing to {filename}: {str(e)}")
             return False
     
     @staticmethod
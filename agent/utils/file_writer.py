@@ -0,0 +1,212 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from ..config import Config
+from .metrics import record_file_write
+
+# files are created with the permissions open(path, "w") would give them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _fsync_folder(folder: str):
+    # makes the rename itself durable
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write(path: str, content: str, fsync: bool = False):
+    """
+    write content to a temp file next to path and rename it over path,
+    readers see the old or the new file but never a partial one
+    """
+    start = time.perf_counter()
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        record_file_write(time.perf_counter() - start)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+_WRITE, _BARRIER, _STOP = range(3)
+
+class FileWriter:
+    """
+    write-behind file writer, callers queue a write and return immediately.
+    One background thread does the atomic writes so writes to the same path
+    land in submission order; a path queued several times in one round is
+    written once with its latest content. With fsync each round ends with
+    one fsync per touched folder, futures resolve after it.
+    """
+
+    def __init__(self, fsync: bool = False, batch_size: int = 64):
+        self.fsync = fsync
+        self.batch_size = max(1, batch_size)
+        self._queue: "queue.Queue[Tuple[int, int, Optional[str], Optional[str], Future]]" = queue.Queue()
+        # path -> (seq, content) of the latest write not on disk yet
+        self._pending: Dict[str, Tuple[int, str]] = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="file-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, content: str) -> Future:
+        """queue a write, the future resolves with the path once it is on disk"""
+        path = os.path.abspath(path)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("FileWriter is closed")
+            self._seq += 1
+            self._pending[path] = (self._seq, content)
+            self._queue.put((_WRITE, self._seq, path, content, future))
+        return future
+
+    def pending_content(self, path: str) -> Optional[str]:
+        """content queued for path that is not written yet, so reads see their own writes"""
+        entry = self._pending.get(os.path.abspath(path))
+        return entry[1] if entry else None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """wait until every write queued before this call is on disk"""
+        barrier = Future()
+        self._queue.put((_BARRIER, 0, None, None, barrier))
+        try:
+            barrier.result(timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def close(self, timeout: Optional[float] = None):
+        """write everything queued and stop the thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            stop = Future()
+            self._queue.put((_STOP, 0, None, None, stop))
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not self._write_batch(batch):
+                return
+
+    def _write_batch(self, batch: List[Tuple[int, int, Optional[str], Optional[str], Future]]) -> bool:
+        """write one round, returns False when the writer should stop"""
+        latest = {path: seq for kind, seq, path, _, _ in batch if kind == _WRITE}
+        folders = set()
+        done: List[Tuple[Future, Optional[str], Optional[Exception]]] = []
+        running = True
+
+        for kind, seq, path, content, future in batch:
+            if kind != _WRITE:
+                # writes queued before a barrier are resolved before it
+                self._finish(folders, done)
+                future.set_result(None)
+                running = running and kind != _STOP
+                continue
+            if latest[path] != seq:
+                # a later write of the same path in this round replaces it
+                done.append((future, path, None))
+                continue
+            try:
+                atomic_write(path, content, fsync=self.fsync)
+                folders.add(os.path.dirname(path))
+                done.append((future, path, None))
+            except Exception as e:
+                logging.error(f"Error writing to {path}: {str(e)}")
+                done.append((future, None, e))
+            finally:
+                with self._lock:
+                    if self._pending.get(path, (None,))[0] == seq:
+                        del self._pending[path]
+
+        self._finish(folders, done)
+        return running
+
+    def _finish(self, folders: set, done: list):
+        if self.fsync:
+            for folder in folders:
+                try:
+                    _fsync_folder(folder)
+                except OSError as e:
+                    logging.error(f"Error syncing {folder}: {str(e)}")
+        folders.clear()
+        for future, path, error in done:
+            if error is None:
+                future.set_result(path)
+            else:
+                future.set_exception(error)
+        done.clear()
+
+
+_writer: Optional[FileWriter] = None
+_writer_lock = threading.Lock()
+
+def get_file_writer() -> Optional[FileWriter]:
+    """return the shared writer, or None when write-behind is off in configs.yaml"""
+    global _writer
+    if _writer is not None:
+        # a running writer keeps being used so queued writes stay ordered
+        return _writer
+    settings = Config().FILE_WRITER
+    if not settings.get("WRITE_BEHIND", True):
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = FileWriter(
+                fsync=settings.get("FSYNC", False),
+                batch_size=settings.get("BATCH_SIZE", 64),
+            )
+    return _writer
+
+def pending_content(path: str) -> Optional[str]:
+    writer = _writer
+    return writer.pending_content(path) if writer is not None else None
+
+def flush_file_writer(timeout: Optional[float] = None) -> bool:
+    writer = _writer
+    return writer.flush(timeout) if writer is not None else True
+
+def close_file_writer():
+    """flush barrier for shutdown, every queued write is on disk when this returns"""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+
+# queued writes survive a plain exit of the process
+atexit.register(close_file_writer)
@@ -0,0 +1,110 @@
+import json
+from typing import Any, Dict, Iterable
+
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = "0123456789.eE+-"
+_decoder = json.JSONDecoder()
+
+class JsonFieldScanner:
+    """
+    incremental parser of the top level "key": value pairs of a JSON object
+    that arrives in pieces. Text before the first "{" (a ```json fence, a
+    sentence) is skipped; a value is only reported once it is complete.
+    Malformed input just stops the scan, the caller falls back to parsing
+    the whole completion
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.closed = False  # the top level object ended
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+
+    def feed(self, text: str) -> Dict[str, Any]:
+        """add the next piece of the completion, returns the complete fields so far"""
+        self._buffer += text
+        while not self.closed and self._step():
+            pass
+        return self.fields
+
+    def has(self, names: Iterable[str]) -> bool:
+        return all(name in self.fields for name in names)
+
+    def _skip(self, chars: str) -> bool:
+        """move past chars, False when the buffer ran out"""
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in chars:
+            pos += 1
+        self._pos = pos
+        return pos < len(buffer)
+
+    def _decode(self):
+        """(value, end) of the JSON value at the position, None until it is complete"""
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            return None
+        # a number at the end of the buffer ("0." of 0.93) may still grow
+        if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                and (end == len(self._buffer) or self._buffer[end] in _NUMBER_CHARS)):
+            return None
+        return value, end
+
+    def _step(self) -> bool:
+        """one state transition, False when more text is needed"""
+        if self._state == "start":
+            start = self._buffer.find("{", self._pos)
+            if start < 0:
+                self._pos = len(self._buffer)
+                return False
+            self._pos, self._state = start + 1, "key"
+            return True
+
+        if self._state == "next":
+            if not self._skip(_WHITESPACE):
+                return False
+            if self._buffer[self._pos] != ",":
+                # "}" ends the object, anything else is not JSON we can follow
+                self.closed = True
+                return False
+            self._pos += 1
+            self._state = "key"
+            return True
+
+        if self._state == "key":
+            if not self._skip(_WHITESPACE):
+                return False
+            if self._buffer[self._pos] == "}":
+                self.closed = True
+                return False
+            if self._buffer[self._pos] != '"':
+                self.closed = True  # not JSON we can follow
+                return False
+            decoded = self._decode()
+            if decoded is None:
+                return False
+            self._key, self._pos = decoded
+            self._state = "colon"
+            return True
+
+        if self._state == "colon":
+            if not self._skip(_WHITESPACE):
+                return False
+            if self._buffer[self._pos] != ":":
+                self.closed = True
+                return False
+            self._pos += 1
+            self._state = "value"
+            return True
+
+        # value
+        if not self._skip(_WHITESPACE):
+            return False
+        decoded = self._decode()
+        if decoded is None:
+            return False
+        self.fields[self._key], self._pos = decoded
+        self._state = "next"
+        return True
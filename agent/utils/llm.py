@@ -1,43 +1,459 @@
 
 import json
+import time
+import asyncio
 import logging
-from langchain_openai import ChatOpenAI
+import threading
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterator, Optional, Sequence, Tuple, Union
+
 from langchain_core.messages import HumanMessage
 from ..config import Config
+from .cache import get_response_cache
+from .json_stream import JsonFieldScanner
+from .profiles import ModelProfile, profile_for
+from .scheduler import aadmit, admit
+from .resilience import acall_llm, astream_chunks, call_llm, select_llm, stream_chunks, enabled as resilience_enabled
+from .metrics import record_cache_hit, record_early_exit, record_first_token, record_llm, record_llm_error
+
+if TYPE_CHECKING:
+    # imported on first client build, langchain_openai alone takes over a second to import
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+# process wide registry, one client (and one keep-alive pool) per key
+# async pools are bound to the event loop that opened them, so they are kept per loop
+ClientKey = Tuple[str, float, Optional[str]]
+_clients: Dict[ClientKey, "ChatOpenAI"] = {}
+_async_clients: Dict[asyncio.AbstractEventLoop, Dict[ClientKey, "ChatOpenAI"]] = {}
+_clients_lock = threading.Lock()
+
+def _build_client(model: str, temperature: float, base_url: Optional[str], is_async: bool = False) -> "ChatOpenAI":
+    """build a ChatOpenAI with its own keep-alive http pool"""
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    config = Config()
+    limits = httpx.Limits(
+        max_connections=config.LLM_POOL_SIZE,
+        max_keepalive_connections=config.LLM_POOL_SIZE,
+        keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY,
+    )
+    if is_async:
+        pool = {"http_async_client": httpx.AsyncClient(limits=limits)}
+    else:
+        pool = {"http_client": httpx.Client(limits=limits)}
+    # retries are done by the resilience layer around the call, with backoff and a circuit breaker
+    retries = {"max_retries": 0} if resilience_enabled() else {}
+    return ChatOpenAI(model=model, temperature=temperature, base_url=base_url, **pool, **retries)
+
+def _client_key(model: Optional[str], temperature: Optional[float], base_url: Optional[str]) -> ClientKey:
+    config = Config()
+    model = model or config.DEFAULT_MODEL
+    temperature = config.TEMPERATURE if temperature is None else temperature
+    base_url = base_url or config.LLM_BASE_URL
+    return (model, temperature, base_url)
 
-def query_llm(prompt: str, parse_json: bool = False):
+def get_llm(model: str = None, temperature: float = None, base_url: str = None) -> "ChatOpenAI":
     """
-    query the llm with a prompt
+    return the shared client for (model, temperature, base_url), creating it on first use
     """
-    config = Config()
-    llm = ChatOpenAI(model=config.DEFAULT_MODEL, temperature=config.TEMPERATURE) # can be change into claude 3.5 sonnet or other models
-    response = llm.invoke([HumanMessage(content=prompt)])
-    content = response.content
-    
-    if parse_json:
-        try:
-            #make sure the content is json
-            if "```json" in content and "```" in content:
-                #removing json part
-                content = content.split("```json")[1].split("```")[0].strip()
-                logging.info(f"Parsed content as JSON is :{content}")
-            elif "```" in content and content.count("```") >= 2:
-                #content from any code block
-                content = content.split("```")[1].split("```")[0].strip()
-                logging.info(f"Parsed content from code block is :{content}")
-            return json.loads(content)
-        except json.JSONDecodeError:
-            #if JSON parsing fails
+    key = _client_key(model, temperature, base_url)
+
+    llm = _clients.get(key)
+    if llm is None:
+        with _clients_lock:
+            llm = _clients.get(key)
+            if llm is None:
+                llm = _build_client(*key) # can be change into claude 3.5 sonnet or other models
+                _clients[key] = llm
+    return llm
+
+def get_async_llm(model: str = None, temperature: float = None, base_url: str = None) -> "ChatOpenAI":
+    """
+    same as get_llm for ainvoke, the client is shared by everything running on the current event loop
+    """
+    key = _client_key(model, temperature, base_url)
+    loop = asyncio.get_running_loop()
+
+    with _clients_lock:
+        clients = _async_clients.get(loop)
+        if clients is None:
+            # forget loops that were closed, their connections died with them
+            for closed in [l for l in _async_clients if l.is_closed()]:
+                del _async_clients[closed]
+            clients = _async_clients[loop] = {}
+        llm = clients.get(key)
+        if llm is None:
+            llm = clients[key] = _build_client(*key, is_async=True)
+    return llm
+
+def warmup_clients(block: bool = False) -> Optional[threading.Thread]:
+    """
+    open the connections of the default and profile clients in background so
+    the first real call does not pay the TCP/TLS handshake
+    """
+    if not Config().LLM_WARMUP:
+        return None
+
+    def _warmup():
+        # the default client and the clients of the model profiles
+        profiles = [profile_for(node) for node in Config().MODEL_PROFILES.get("NODES") or {}]
+        keys = dict.fromkeys([_client_key(None, None, None)] + [_client_key(p.model, p.temperature, None) for p in profiles])
+        for key in keys:
             try:
-                # finding similar json structure
-                if "{" in content and "}" in content:
-                    json_str = content.split("{", 1)[1].rsplit("}", 1)[0].strip()
-                    json_str = "{" + json_str + "}"
-                    return json.loads(json_str)
-            except (IndexError, json.JSONDecodeError):
-                # return raw content is json parsing fails
-                logging.warning("Warning: Failed to parse JSON from LLM response")
-                return {"error": "Failed to parse JSON", "raw_content": content}
+                # any cheap request over the pool is enough to open the connection
+                get_llm(*key).root_client.models.list()
+                logging.debug(f"LLM client of {key[0]} warmed up")
+            except Exception as e:
+                logging.debug(f"LLM client warmup failed: {str(e)}")
+
+    thread = threading.Thread(target=_warmup, name="llm-warmup", daemon=True)
+    thread.start()
+    if block:
+        thread.join()
+    return thread
+
+def close_clients():
+    """close every pooled client and clear the registry"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        async_clients = [(loop, llm) for loop, by_key in _async_clients.items() for llm in by_key.values()]
+        _clients.clear()
+        _async_clients.clear()
+
+    for llm in clients:
+        try:
+            llm.http_client.close()
+        except Exception as e:
+            logging.error(f"Error closing LLM http client: {str(e)}")
+    for loop, llm in async_clients:
+        try:
+            _close_async_client(llm.http_async_client, loop)
+        except Exception as e:
+            logging.error(f"Error closing LLM async http client: {str(e)}")
+
+def _close_async_client(client: "httpx.AsyncClient", loop: asyncio.AbstractEventLoop):
+    if loop.is_closed():
+        # connections opened on a closed loop are gone with it
+        return
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    else:
+        loop.run_until_complete(client.aclose())
+
+def query_llm(prompt: str, parse_json: bool = False, node: str = None, usage: Optional[dict] = None):
+    """
+    query the llm with a prompt, node is the name of the calling graph node.
+    A usage dict passed in is filled with the token counts of the call
+    """
+    profile = profile_for(node)
+    llm = get_llm(profile.model, profile.temperature)
+    cache, cache_key = _cache_lookup(llm, prompt, parse_json, node, profile)
+    if cache_key and (cached := cache.get(cache_key)) is not None:
+        _record_usage(usage, None, cached=True)
+        record_cache_hit(node)
+        return cached
+
+    client = select_llm(llm, node, get_llm)
+    if client is not llm:
+        # answers of the fallback model are not cached as answers of the default one
+        cache_key = None
+    admit(client.model_name, node, prompt, profile.max_tokens)
+    start = time.perf_counter()
+    try:
+        response = call_llm(client, node, lambda c, timeout: c.invoke([HumanMessage(content=prompt)], **_call_kwargs(profile, timeout)))
+    except Exception:
+        record_llm_error(node)
+        raise
+    record_llm(node, "invoke", time.perf_counter() - start, prompt, response.content, response.usage_metadata)
+    _record_usage(usage, response.usage_metadata, response.content)
+    return _finish_response(response.content, parse_json, node, cache, cache_key)
+
+async def aquery_llm(prompt: str, parse_json: bool = False, node: str = None, usage: Optional[dict] = None):
+    """
+    async version of query_llm, awaits llm.ainvoke so the event loop is not blocked
+    """
+    profile = profile_for(node)
+    llm = get_async_llm(profile.model, profile.temperature)
+    cache, cache_key, cached = await _acache_lookup(llm, prompt, parse_json, node, profile)
+    if cached is not None:
+        _record_usage(usage, None, cached=True)
+        record_cache_hit(node)
+        return cached
+
+    client = select_llm(llm, node, get_async_llm)
+    if client is not llm:
+        cache_key = None
+    await aadmit(client.model_name, node, prompt, profile.max_tokens)
+    start = time.perf_counter()
+    try:
+        response = await acall_llm(client, node,
+                                   lambda c, timeout: c.ainvoke([HumanMessage(content=prompt)], **_call_kwargs(profile, timeout)))
+    except Exception:
+        record_llm_error(node)
+        raise
+    record_llm(node, "invoke", time.perf_counter() - start, prompt, response.content, response.usage_metadata)
+    _record_usage(usage, response.usage_metadata, response.content)
+    return await _finish_off_loop(cache_key, _finish_response, response.content, parse_json, node, cache, cache_key)
+
+def stream_llm(prompt: str, node: str = None, usage: Optional[dict] = None) -> Iterator[str]:
+    """
+    generator version of query_llm, yields text chunks as the llm produces them
+    """
+    profile = profile_for(node)
+    llm = get_llm(profile.model, profile.temperature)
+    cache, cache_key = _cache_lookup(llm, prompt, False, node, profile)
+    if cache_key and (cached := cache.get(cache_key)) is not None:
+        _record_usage(usage, None, cached=True)
+        record_cache_hit(node)
+        yield cached
+        return
+
+    client = select_llm(llm, node, get_llm)
+    if client is not llm:
+        cache_key = None
+    admit(client.model_name, node, prompt, profile.max_tokens)
+    parts, metadata = [], None
+    start = time.perf_counter()
+    try:
+        # token counts come with the last chunk when asked for
+        for chunk in stream_chunks(client, node, lambda c, timeout: c.stream(
+                [HumanMessage(content=prompt)], **_stream_kwargs(usage), **_call_kwargs(profile, timeout))):
+            metadata = chunk.usage_metadata or metadata
+            if chunk.content:
+                if not parts:
+                    record_first_token(node, time.perf_counter() - start)
+                parts.append(chunk.content)
+                yield chunk.content
+    except Exception:
+        record_llm_error(node)
+        raise
+    content = "".join(parts)
+    # includes the time the consumer spent rendering between chunks
+    record_llm(node, "stream", time.perf_counter() - start, prompt, content, metadata)
+    _record_usage(usage, metadata, content)
+    _finish_response(content, False, node, cache, cache_key)
+
+async def astream_llm(prompt: str, node: str = None, usage: Optional[dict] = None) -> AsyncIterator[str]:
+    """
+    async iterator version of stream_llm
+    """
+    profile = profile_for(node)
+    llm = get_async_llm(profile.model, profile.temperature)
+    cache, cache_key, cached = await _acache_lookup(llm, prompt, False, node, profile)
+    if cached is not None:
+        _record_usage(usage, None, cached=True)
+        record_cache_hit(node)
+        yield cached
+        return
+
+    client = select_llm(llm, node, get_async_llm)
+    if client is not llm:
+        cache_key = None
+    await aadmit(client.model_name, node, prompt, profile.max_tokens)
+    parts, metadata = [], None
+    start = time.perf_counter()
+    try:
+        async for chunk in astream_chunks(client, node, lambda c, timeout: c.astream(
+                [HumanMessage(content=prompt)], **_stream_kwargs(usage), **_call_kwargs(profile, timeout))):
+            metadata = chunk.usage_metadata or metadata
+            if chunk.content:
+                if not parts:
+                    record_first_token(node, time.perf_counter() - start)
+                parts.append(chunk.content)
+                yield chunk.content
+    except Exception:
+        record_llm_error(node)
+        raise
+    content = "".join(parts)
+    # includes the time the consumer spent rendering between chunks
+    record_llm(node, "stream", time.perf_counter() - start, prompt, content, metadata)
+    _record_usage(usage, metadata, content)
+    await _finish_off_loop(cache_key, _finish_response, content, False, node, cache, cache_key)
+
+def query_llm_fields(prompt: str, fields: Sequence[str], node: str = None) -> Any:
+    """
+    query_llm(parse_json=True) for prompts whose JSON answer starts with fields.
+    The completion is parsed as it streams in and the generation is dropped
+    once every field is complete, the explanation after them is never waited
+    for. Falls back to the lenient parser of the whole completion otherwise
+    """
+    if not Config().LLM_STREAM_JSON:
+        return query_llm(prompt, parse_json=True, node=node)
+    profile = profile_for(node)
+    llm = get_llm(profile.model, profile.temperature)
+    cache, cache_key = _cache_lookup(llm, prompt, _fields_mode(fields), node, profile)
+    if cache_key and (cached := cache.get(cache_key)) is not None:
+        record_cache_hit(node)
+        return cached
+
+    client = select_llm(llm, node, get_llm)
+    if client is not llm:
+        cache_key = None
+    admit(client.model_name, node, prompt, profile.max_tokens)
+    scanner, parts, metadata = JsonFieldScanner(), [], None
+    start = time.perf_counter()
+    stream = stream_chunks(client, node, lambda c, timeout: c.stream([HumanMessage(content=prompt)], **_call_kwargs(profile, timeout)))
+    try:
+        for chunk in stream:
+            metadata = chunk.usage_metadata or metadata
+            if chunk.content:
+                if not parts:
+                    record_first_token(node, time.perf_counter() - start)
+                parts.append(chunk.content)
+                scanner.feed(chunk.content)
+                if scanner.closed or scanner.has(fields):
+                    break
+    except Exception:
+        record_llm_error(node)
+        raise
+    finally:
+        # closes the http response, the server stops generating
+        stream.close()
+    return _finish_fields(scanner, fields, "".join(parts), metadata, prompt, node, start, cache, cache_key)
+
+async def aquery_llm_fields(prompt: str, fields: Sequence[str], node: str = None) -> Any:
+    """async version of query_llm_fields"""
+    if not Config().LLM_STREAM_JSON:
+        return await aquery_llm(prompt, parse_json=True, node=node)
+    profile = profile_for(node)
+    llm = get_async_llm(profile.model, profile.temperature)
+    cache, cache_key, cached = await _acache_lookup(llm, prompt, _fields_mode(fields), node, profile)
+    if cached is not None:
+        record_cache_hit(node)
+        return cached
+
+    client = select_llm(llm, node, get_async_llm)
+    if client is not llm:
+        cache_key = None
+    await aadmit(client.model_name, node, prompt, profile.max_tokens)
+    scanner, parts, metadata = JsonFieldScanner(), [], None
+    start = time.perf_counter()
+    stream = astream_chunks(client, node, lambda c, timeout: c.astream([HumanMessage(content=prompt)], **_call_kwargs(profile, timeout)))
+    try:
+        async for chunk in stream:
+            metadata = chunk.usage_metadata or metadata
+            if chunk.content:
+                if not parts:
+                    record_first_token(node, time.perf_counter() - start)
+                parts.append(chunk.content)
+                scanner.feed(chunk.content)
+                if scanner.closed or scanner.has(fields):
+                    break
+    except Exception:
+        record_llm_error(node)
+        raise
+    finally:
+        await stream.aclose()
+    return await _finish_off_loop(cache_key, _finish_fields, scanner, fields, "".join(parts), metadata,
+                                  prompt, node, start, cache, cache_key)
+
+def _fields_mode(fields: Sequence[str]) -> str:
+    # a partial answer must not be served to query_llm(parse_json=True) from the cache
+    return "fields:" + ",".join(fields)
+
+def _finish_fields(scanner: JsonFieldScanner, fields: Sequence[str], content: str, metadata: Optional[dict],
+                   prompt: str, node: Optional[str], start: float, cache, cache_key: Optional[str]) -> Any:
+    record_llm(node, "stream_json", time.perf_counter() - start, prompt, content, metadata)
+    if scanner.has(fields):
+        if not scanner.closed:
+            record_early_exit(node)
+        result = dict(scanner.fields)
+        if cache_key:
+            cache.set(cache_key, result, node)
+        return result
+    return _finish_response(content, True, node, cache, cache_key)
+
+def _call_kwargs(profile: ModelProfile, timeout: Optional[float]) -> dict:
+    """per request options of the openai client, left out they keep the client defaults"""
+    kwargs = {}
+    if timeout:
+        kwargs["timeout"] = timeout
+    if profile.max_tokens:
+        kwargs["max_tokens"] = profile.max_tokens
+    if profile.stop:
+        kwargs["stop"] = list(profile.stop)
+    return kwargs
+
+def _stream_kwargs(usage: Optional[dict]) -> dict:
+    return {"stream_usage": True} if usage is not None else {}
+
+def _record_usage(usage: Optional[dict], metadata: Optional[dict], content: str = "", cached: bool = False):
+    """fill usage with the counts reported by the api, estimated from the text when missing"""
+    if usage is None:
+        return
+    if cached:
+        usage.update(input_tokens=0, output_tokens=0, cached=True)
+    elif metadata:
+        usage.update(input_tokens=metadata.get("input_tokens", 0), output_tokens=metadata.get("output_tokens", 0))
+    else:
+        # about 4 characters per token for english text and code
+        usage.update(output_tokens=len(content) // 4, estimated=True)
+
+def _cache_lookup(llm: "ChatOpenAI", prompt: str, parse_json: Union[bool, str], node: Optional[str],
+                  profile: ModelProfile):
+    """return (cache, key) for deterministic cacheable calls, (None, None) otherwise"""
+    cache = get_response_cache()
+    if cache is None or not cache.is_cacheable(node, llm.temperature):
+        return None, None
+    return cache, cache.make_key(llm.model_name, llm.temperature, prompt, parse_json, profile.max_tokens, profile.stop)
+
+async def _acache_lookup(llm: "ChatOpenAI", prompt: str, parse_json: Union[bool, str], node: Optional[str],
+                         profile: ModelProfile):
+    """(cache, key, cached value) with the sqlite reads in a worker thread, they would block the event loop"""
+    if not Config().LLM_CACHE.get("ENABLED", False):
+        return None, None, None
+    cache, cache_key = await asyncio.to_thread(_cache_lookup, llm, prompt, parse_json, node, profile)
+    if not cache_key:
+        return cache, cache_key, None
+    return cache, cache_key, await asyncio.to_thread(cache.get, cache_key)
+
+async def _finish_off_loop(cache_key: Optional[str], finish: Callable[..., Any], *args) -> Any:
+    """finish(*args), in a worker thread when it stores the answer in the sqlite cache"""
+    if cache_key:
+        return await asyncio.to_thread(finish, *args)
+    return finish(*args)
+
+def _finish_response(content: str, parse_json: bool, node: Optional[str], cache, cache_key: Optional[str]):
+    """parse the completion and store it in the cache"""
+    result = parse_json_content(content) if parse_json else content
+
+    if cache_key and not (isinstance(result, dict) and "raw_content" in result):
+        cache.set(cache_key, result, node)
+
+    return result
+
+def parse_json_content(content: str):
+    """lenient json parsing of an llm completion"""
+    try:
+        #make sure the content is json
+        if "```json" in content and "```" in content:
+            #removing json part
+            content = content.split("```json")[1].split("```")[0].strip()
+            logging.info(f"Parsed content as JSON is :{content}")
+        elif "```" in content and content.count("```") >= 2:
+            #content from any code block
+            content = content.split("```")[1].split("```")[0].strip()
+            logging.info(f"Parsed content from code block is :{content}")
+        return json.loads(content)
+    except json.JSONDecodeError:
+        #if JSON parsing fails
+        try:
+            # finding similar json structure
+            if "{" in content and "}" in content:
+                json_str = content.split("{", 1)[1].rsplit("}", 1)[0].strip()
+                json_str = "{" + json_str + "}"
+                return json.loads(json_str)
+        except (IndexError, json.JSONDecodeError):
+            pass
+        # a completion cut off by max_tokens keeps the fields that were complete
+        fields = JsonFieldScanner().feed(content)
+        if fields:
+            return dict(fields)
+        if "{" in content and "}" in content:
+            # return raw content is json parsing fails
+            logging.warning("Warning: Failed to parse JSON from LLM response")
+            return {"error": "Failed to parse JSON", "raw_content": content}
     
     return content
 
@@ -0,0 +1,77 @@
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .token_budget import FittedPrompt, Section, fit_prompt, truncate
+
+# a stored turn is {"user": ..., "assistant": ...}
+Turn = Dict[str, str]
+
+def history_text(state: Optional[Mapping]) -> str:
+    """rolling summary and recent turns of the conversation, empty for a new thread"""
+    state = state or {}
+    parts = []
+    if state.get("summary"):
+        parts.append(f"Summary of earlier turns: {state['summary']}")
+    for turn in state.get("history") or []:
+        parts.append(f"User: {turn['user']}\nAssistant: {turn['assistant']}")
+    return "\n".join(parts)
+
+def with_history(render: Callable[..., str]) -> Callable[..., str]:
+    """render that puts the conversation so far in front of the prompt of render"""
+    def render_with_history(history: str = "", **sections: str) -> str:
+        prompt = render(**sections)
+        if not history:
+            return prompt
+        return f"\n    Conversation so far:\n{history}\n{prompt}"
+    return render_with_history
+
+def history_section(state: Optional[Mapping]) -> Section:
+    # the first thing cut when a prompt is over budget
+    return Section(history_text(state), priority=-1)
+
+def new_turn(state: Mapping, max_chars: int) -> Turn:
+    def clip(text: str) -> str:
+        text = (text or "").strip()
+        return text if len(text) <= max_chars else text[:max_chars] + " ..."
+    return {"user": clip(state["messages"][-1].content), "assistant": clip(state.get("response") or "")}
+
+def split_window(history: List[Turn], settings: Mapping) -> Tuple[List[Turn], List[Turn]]:
+    """
+    (turns to fold into the summary, turns to keep). Nothing is folded until
+    the window overflows by SUMMARY_BATCH turns, so the summary is rewritten
+    once every SUMMARY_BATCH turns instead of every turn.
+    """
+    window = max(0, settings.get("WINDOW", 6))
+    batch = max(1, settings.get("SUMMARY_BATCH", 4))
+    if len(history) < window + batch:
+        return [], history
+    cut = len(history) - window
+    return history[:cut], history[cut:]
+
+def _render_summary_prompt(summary: str, turns: str, max_words: int = 200) -> str:
+    return f"""
+    Update the running summary of a conversation between a user and an assistant
+    with the turns below. Keep requests, decisions, languages, file names and
+    anything still open, drop greetings and repetition.
+    Reply with the summary only, at most {max_words} words.
+
+    Current summary:
+    {summary or "(empty)"}
+
+    New turns:
+    {turns}
+    """
+
+def build_summary_prompt(summary: str, turns: List[Turn], settings: Mapping) -> FittedPrompt:
+    max_words = settings.get("MAX_SUMMARY_TOKENS", 300) * 3 // 4
+    render = lambda summary, turns: _render_summary_prompt(summary, turns, max_words)
+    return fit_prompt("summarize_memory", render, summary=Section(summary, 1),
+                      turns=Section(history_text({"history": turns})))
+
+def finish_summary(reply: Any, settings: Mapping) -> str:
+    return truncate(str(reply or "").strip(), settings.get("MAX_SUMMARY_TOKENS", 300))
+
+def fallback_summary(summary: str, turns: List[Turn], settings: Mapping) -> str:
+    """summary without the model, the new requests are appended and the text is cut to its limit"""
+    requests = "; ".join(turn["user"][:200] for turn in turns)
+    text = f"{summary} Earlier requests: {requests}".strip()
+    return truncate(text, settings.get("MAX_SUMMARY_TOKENS", 300))
@@ -0,0 +1,195 @@
+import re
+from functools import cached_property
+from typing import List, NamedTuple, Optional, Tuple
+
+class ParsedMessage:
+    """
+    language (detected programming language) and output_file (hint like "save to loop.c")
+    are found when parsing, the code blocks and file references on first access
+    """
+
+    def __init__(self, message: str, language: Optional[str], output_file: Optional[str]):
+        self.message = message
+        self.language = language
+        self.output_file = output_file
+
+    @cached_property
+    def code_blocks(self) -> List[Tuple[Optional[str], str]]:
+        """(fence language, code) of each fenced block"""
+        return _find_code_blocks(self.message)
+
+    @cached_property
+    def file_refs(self) -> List[str]:
+        """file names with a known source extension"""
+        return _find_file_refs(self.message)
+
+# explicit mentions like "in Python", earlier entries win when several are present
+_MENTIONED_LANGUAGES = {
+    'python': 'python',
+    'javascript': 'javascript',
+    'js': 'javascript',
+    'java': 'java',
+    'c++': 'cpp',
+    'c#': 'csharp',
+    'go': 'go',
+    'rust': 'rust',
+    'typescript': 'typescript',
+    'ruby': 'ruby',
+    'php': 'php',
+    'swift': 'swift',
+    'kotlin': 'kotlin',
+    'scala': 'scala',
+}
+_MENTION_PRIORITY = {name: i for i, name in enumerate(_MENTIONED_LANGUAGES)}
+_MENTION_BY_PRIORITY = list(_MENTIONED_LANGUAGES.values())
+
+# abbreviations used after ``` fences
+_FENCE_LANGUAGES = {
+    'py': 'python',
+    'js': 'javascript',
+    'ts': 'typescript',
+    'rb': 'ruby',
+    'cs': 'csharp',
+}
+
+_EXTENSION_LANGUAGES = {
+    'py': 'python',
+    'js': 'javascript',
+    'java': 'java',
+    'cpp': 'cpp',
+    'cs': 'csharp',
+    'go': 'go',
+    'rs': 'rust',
+    'ts': 'typescript',
+    'rb': 'ruby',
+    'php': 'php',
+    'swift': 'swift',
+    'kt': 'kotlin',
+    'scala': 'scala',
+}
+
+# Case-insensitive patterns are written in lowercase and run case-sensitively
+# over message.lower(), which is several times faster than re.IGNORECASE.
+# For ASCII text lowering keeps every offset, so spans map back to the
+# original message; other text uses the IGNORECASE variants directly.
+_MENTION = r'\b(?:in|using|with)\s+(python|javascript|js|java|c\+\+|c#|go|rust|typescript|ruby|php|swift|kotlin|scala)\b'
+_OUTPUT_FILE = r'\s+[\'"]?([a-z0-9_\-\.\/\\]+\.[a-z0-9]+)[\'"]?'
+_OUTPUT_HINTS = [
+    r'(?:save|output|write|export|store)(?:\s+(?:it|this|the\s+(?:result|code|output)))?\s+(?:to|in|as|in\s+file|to\s+file|as\s+file)' + _OUTPUT_FILE,
+    r'output\s+file\s*(?:is|should\s+be|:)?' + _OUTPUT_FILE,
+    r'filename\s*(?:is|should\s+be|:)?' + _OUTPUT_FILE,
+]
+
+_MENTION_RE = re.compile(_MENTION)
+_MENTION_RE_I = re.compile(_MENTION, re.IGNORECASE)
+_OUTPUT_HINTS_RE = [re.compile(p) for p in _OUTPUT_HINTS]
+_OUTPUT_HINTS_RE_I = [re.compile(p, re.IGNORECASE) for p in _OUTPUT_HINTS]
+
+# case-sensitive in the original message
+_FENCE_LANG_RE = re.compile(r'```([a-zA-Z0-9_+#]+)\s')
+_FENCE_RE = re.compile(r'```')
+# anchored on the rare ".ext" suffix instead of every word, the word before it is found afterwards
+_EXTENSION_RE = re.compile(r'\.(?<=\w\.)(py|js|java|cpp|cs|go|rs|ts|rb|php|swift|kt|scala)\b')
+_WORD_BEFORE_RE = re.compile(r'\w+\Z')
+_MAX_FILENAME = 255
+# chars searched for hints that settle the parse before the whole message is folded
+_PROBE_CHARS = 4096
+
+def parse_message(message: str) -> ParsedMessage:
+    """
+    Extracts language, code blocks, file references and output file hints from a message.
+    Language detection prefers, in order:
+    1. Explicit mentions like "in Python" or "using JavaScript"
+    2. Code blocks with language specifiers like ```python or ```js
+    3. Common file extensions like .py, .js, etc.
+    """
+    language, output_file = _probe(message)
+    if language is not None and output_file is not None:
+        return ParsedMessage(message, language, output_file)
+
+    if message.isascii():
+        folded, mention_re, output_res = message.lower(), _MENTION_RE, _OUTPUT_HINTS_RE
+    else:
+        folded, mention_re, output_res = message, _MENTION_RE_I, _OUTPUT_HINTS_RE_I
+
+    if language is None:
+        language = _find_mention(folded, mention_re)
+    if language is None:
+        language = _find_fence_language(message)
+    if language is None:
+        language = _find_extension_language(message)
+    if output_file is None:
+        output_file = _find_output_file(message, folded, output_res)
+    return ParsedMessage(message, language, output_file)
+
+def _probe(message: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    the answers that a match near the start settles: "in python" beats every
+    other mention and the first output pattern beats the others, so neither
+    needs the rest of a pasted file. Matches must end before the probe end
+    so a word or file name is not cut
+    """
+    end = min(len(message), _PROBE_CHARS)
+    language = output_file = None
+    for match in _MENTION_RE_I.finditer(message, 0, end):
+        if match.group(1).lower() == "python" and (match.end() < end or end == len(message)):
+            language = "python"
+            break
+    match = _OUTPUT_HINTS_RE_I[0].search(message, 0, end)
+    if match and (match.end() < end or end == len(message)):
+        output_file = match.group(1).strip()
+    return language, output_file
+
+def _find_mention(folded: str, mention_re: re.Pattern) -> Optional[str]:
+    best = None
+    for match in mention_re.finditer(folded):
+        priority = _MENTION_PRIORITY[match.group(1).lower()]
+        if best is None or priority < best:
+            best = priority
+            if priority == 0:
+                # nothing can beat the first entry
+                break
+    return None if best is None else _MENTION_BY_PRIORITY[best]
+
+def _find_fence_language(message: str) -> Optional[str]:
+    match = _FENCE_LANG_RE.search(message)
+    if match is None:
+        return None
+    lang = match.group(1).lower()
+    return _FENCE_LANGUAGES.get(lang, lang)
+
+def _find_extension_language(message: str) -> Optional[str]:
+    """language of the first file name like main.py"""
+    match = _EXTENSION_RE.search(message)
+    return None if match is None else _EXTENSION_LANGUAGES.get(match.group(1).lower())
+
+def _find_file_refs(message: str) -> List[str]:
+    """file names like main.py"""
+    file_refs = []
+    for match in _EXTENSION_RE.finditer(message):
+        dot = match.start()
+        word = _WORD_BEFORE_RE.search(message, max(0, dot - _MAX_FILENAME), dot)
+        file_refs.append(word.group(0) + match.group(0))
+    return file_refs
+
+def _find_output_file(message: str, folded: str, output_res: List[re.Pattern]) -> Optional[str]:
+    for pattern in output_res:
+        match = pattern.search(folded)
+        if match:
+            # spans of the folded text are valid in the original, which keeps the case
+            return message[match.start(1):match.end(1)].strip()
+    return None
+
+def _find_code_blocks(message: str) -> List[Tuple[Optional[str], str]]:
+    """(language, code) of each fenced block, same pairing as splitting on ```"""
+    blocks = []
+    fences = [m.start() for m in _FENCE_RE.finditer(message)]
+    for opening, closing in zip(fences[0::2], fences[1::2]):
+        body = message[opening + 3:closing]
+        first_line, _, rest = body.partition("\n")
+        if first_line.strip() and rest:
+            lang = first_line.strip().lower()
+            blocks.append((_FENCE_LANGUAGES.get(lang, lang), rest))
+        else:
+            blocks.append((None, body))
+    return blocks
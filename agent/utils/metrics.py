@@ -0,0 +1,291 @@
+import math
+import time
+import bisect
+import logging
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import Config
+
+class Histogram:
+    """
+    fixed log-scale buckets, observe is a bisect and two additions.
+    Quantiles are interpolated inside a bucket, within about 10% of the true value
+    """
+
+    def __init__(self, start: float, factor: float, size: int):
+        self.bounds = [start * factor ** i for i in range(size)]
+        self.counts = [0] * (size + 1)  # the last bucket is above every bound
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.bounds[i - 1] if i > 0 else 0.0
+                high = self.bounds[i] if i < len(self.bounds) else self.max
+                value = low + (high - low) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+        return self.max
+
+# 0.1 ms to about an hour in steps of 19%, sizes from 1 to 2^30 in steps of 41%
+_TIME = (0.0001, 2 ** 0.25, 100)
+_SIZE = (1, 2 ** 0.5, 60)
+# Prometheus gets every Nth bound only (doublings from the start), fine grained enough for dashboards
+_EXPORT_EVERY = {_TIME: 4, _SIZE: 2}
+
+# name -> (help, bucket layout)
+HISTOGRAMS = {
+    "agent_node_seconds": ("Wall time of a graph node", _TIME),
+    "agent_llm_seconds": ("Time of an LLM call, streams until the last token", _TIME),
+    "agent_llm_first_token_seconds": ("Time to the first token of a streamed LLM call", _TIME),
+    "agent_llm_prompt_chars": ("Prompt size of an LLM call in characters", _SIZE),
+    "agent_llm_completion_chars": ("Completion size of an LLM call in characters", _SIZE),
+    "agent_file_write_seconds": ("Time of an atomic output file write", _TIME),
+    "agent_speculative_saved_seconds": ("Routing time saved by running classify_intent alongside analyze_message", _TIME),
+    "agent_speculative_wasted_seconds": ("LLM time spent on speculative classify_intent calls that were not used", _TIME),
+    "agent_llm_queue_wait_seconds": ("Time an LLM call waited for a rate limit slot", _TIME),
+    "agent_question_cache_lookup_seconds": ("Time of a near duplicate question lookup", _TIME),
+}
+COUNTERS = {
+    "agent_node_errors_total": "Graph node runs that raised",
+    "agent_llm_errors_total": "LLM calls that raised",
+    "agent_llm_cache_hits_total": "LLM calls answered by the response cache",
+    "agent_llm_tokens_total": "Tokens reported by the API",
+    "agent_llm_early_exits_total": "Streamed JSON calls stopped once the needed fields were complete",
+    "agent_speculative_calls_total": "Speculative classify_intent calls by outcome: used, discarded or cancelled",
+    "agent_prefetch_total": "Edit target reads by outcome: hit (prefetched and current), stale or miss",
+    "agent_llm_retries_total": "LLM call attempts retried after a retryable error",
+    "agent_llm_timeouts_total": "LLM call attempts that ran past their node timeout",
+    "agent_llm_hedges_total": "Duplicate LLM requests sent for calls slower than the p95 of their node, by winner",
+    "agent_llm_breaker_transitions_total": "Circuit breaker state changes per model",
+    "agent_llm_fallbacks_total": "LLM calls sent to the fallback model while the circuit of the default one was open",
+    "agent_llm_throttled_total": "LLM calls that had to queue for a rate limit slot",
+    "agent_question_cache_total": "Question cache lookups by outcome: hit, miss, bypass or context (follow up asked with history)",
+}
+GAUGES = {
+    "agent_llm_queue_depth": "LLM calls waiting for a rate limit slot",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Metrics:
+    """process wide histograms, counters and gauges, keyed by metric name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.started = time.time()
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(*HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def quantile(self, name: str, q: float, **labels: str) -> Tuple[float, int]:
+        """(quantile, observations) of one histogram, (0.0, 0) before the first observation"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            return (histogram.quantile(q), histogram.count) if histogram else (0.0, 0)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.started = time.time()
+
+    def node_summary(self) -> List[Dict[str, Any]]:
+        """one row per node: runs, errors, throughput, wall and LLM time quantiles in ms"""
+        uptime = max(time.time() - self.started, 1e-9)
+        with self._lock:
+            nodes = sorted({dict(labels)["node"] for name, labels in self.histograms
+                            if name in ("agent_node_seconds", "agent_llm_seconds")})
+            rows = []
+            for node in nodes:
+                wall = self.histograms.get(("agent_node_seconds", (("node", node),)))
+                llm = [h for (name, labels), h in self.histograms.items()
+                       if name == "agent_llm_seconds" and dict(labels)["node"] == node]
+                row = {"node": node, "runs": wall.count if wall else 0,
+                       "errors": self.counters.get(("agent_node_errors_total", (("node", node),)), 0),
+                       "per_second": round((wall.count if wall else 0) / uptime, 3),
+                       "llm_calls": sum(h.count for h in llm),
+                       "llm_ms": round(sum(h.sum for h in llm) * 1000 / max(1, sum(h.count for h in llm)), 3)}
+                for q in (0.5, 0.95, 0.99):
+                    row[f"p{int(q * 100)}_ms"] = round(wall.quantile(q) * 1000, 3) if wall else None
+                rows.append(row)
+        return rows
+
+    def prometheus(self) -> str:
+        """text exposition format"""
+        lines = []
+        with self._lock:
+            for name, (help_text, layout) in HISTOGRAMS.items():
+                series = sorted((labels, h) for (n, labels), h in self.histograms.items() if n == name)
+                if not series:
+                    continue
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                every = _EXPORT_EVERY[layout]
+                for labels, histogram in series:
+                    cumulative = 0
+                    for i, bound in enumerate(histogram.bounds):
+                        cumulative += histogram.counts[i]
+                        if i % every == 0:
+                            lines.append(f"{name}_bucket{_labels(labels, le=f'{bound:.6g}')} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+            for name, help_text in COUNTERS.items():
+                series = sorted((labels, v) for (n, labels), v in self.counters.items() if n == name)
+                if not series:
+                    continue
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(labels)} {value:g}" for labels, value in series]
+            for name, help_text in GAUGES.items():
+                series = sorted((labels, v) for (n, labels), v in self.gauges.items() if n == name)
+                if not series:
+                    continue
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                lines += [f"{name}{_labels(labels)} {value:g}" for labels, value in series]
+            lines += ["# HELP agent_uptime_seconds Seconds since the metrics were reset",
+                      "# TYPE agent_uptime_seconds gauge",
+                      f"agent_uptime_seconds {time.time() - self.started:.3f}"]
+        return "\n".join(lines) + "\n"
+
+def _labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+metrics = Metrics()
+
+def enabled() -> bool:
+    return Config().METRICS.get("ENABLED", True)
+
+def timed_node(name: str, func: Callable, afunc: Callable) -> Tuple[Callable, Callable]:
+    """sync and async node functions that record their wall time and errors under name"""
+    @wraps(func)
+    def timed(state):
+        start = time.perf_counter()
+        try:
+            return func(state)
+        except Exception:
+            metrics.inc("agent_node_errors_total", node=name)
+            raise
+        finally:
+            metrics.observe("agent_node_seconds", time.perf_counter() - start, node=name)
+
+    @wraps(afunc)
+    async def atimed(state):
+        start = time.perf_counter()
+        try:
+            return await afunc(state)
+        except Exception:
+            metrics.inc("agent_node_errors_total", node=name)
+            raise
+        finally:
+            metrics.observe("agent_node_seconds", time.perf_counter() - start, node=name)
+
+    return timed, atimed
+
+def record_llm(node: Optional[str], mode: str, seconds: float, prompt: str, completion: str,
+               usage_metadata: Optional[dict] = None):
+    if not enabled():
+        return
+    node = node or "unknown"
+    metrics.observe("agent_llm_seconds", seconds, node=node, mode=mode)
+    metrics.observe("agent_llm_prompt_chars", len(prompt), node=node)
+    metrics.observe("agent_llm_completion_chars", len(completion or ""), node=node)
+    if usage_metadata:
+        metrics.inc("agent_llm_tokens_total", usage_metadata.get("input_tokens", 0), node=node, kind="input")
+        metrics.inc("agent_llm_tokens_total", usage_metadata.get("output_tokens", 0), node=node, kind="output")
+
+def record_llm_error(node: Optional[str]):
+    if enabled():
+        metrics.inc("agent_llm_errors_total", node=node or "unknown")
+
+def record_cache_hit(node: Optional[str]):
+    if enabled():
+        metrics.inc("agent_llm_cache_hits_total", node=node or "unknown")
+
+def record_early_exit(node: Optional[str]):
+    if enabled():
+        metrics.inc("agent_llm_early_exits_total", node=node or "unknown")
+
+def record_first_token(node: Optional[str], seconds: float):
+    if enabled():
+        metrics.observe("agent_llm_first_token_seconds", seconds, node=node or "unknown")
+
+def record_file_write(seconds: float):
+    if enabled():
+        metrics.observe("agent_file_write_seconds", seconds)
+
+def record_speculation(outcome: str, saved: float = 0.0, wasted: float = 0.0):
+    """outcome of one speculative classify_intent call, saved and wasted in seconds"""
+    if not enabled():
+        return
+    metrics.inc("agent_speculative_calls_total", outcome=outcome)
+    if outcome == "used":
+        metrics.observe("agent_speculative_saved_seconds", saved)
+    else:
+        metrics.observe("agent_speculative_wasted_seconds", wasted)
+
+def record_queue_wait(model: str, priority: str, seconds: float, throttled: bool):
+    """one rate limiter admission, throttled when the call had to queue"""
+    if not enabled():
+        return
+    metrics.observe("agent_llm_queue_wait_seconds", seconds, priority=priority)
+    if throttled:
+        metrics.inc("agent_llm_throttled_total", model=model, priority=priority)
+
+def record_queue_depth(model: str, depth: int):
+    if enabled():
+        metrics.set("agent_llm_queue_depth", depth, model=model)
+
+def dump_metrics(path: Optional[str] = None) -> Optional[str]:
+    """write the Prometheus text to path (METRICS.DUMP_PATH by default), returns the path"""
+    from .file_writer import atomic_write
+    path = path or Config().METRICS.get("DUMP_PATH")
+    if not path or not enabled():
+        return None
+    try:
+        atomic_write(path, metrics.prometheus())
+    except OSError as e:
+        logging.error(f"Cannot write metrics to {path}: {str(e)}")
+        return None
+    return path
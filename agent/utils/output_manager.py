@@ -4,10 +4,18 @@ from rich.text import Text
 from rich.table import Table
 from rich.syntax import Syntax
 from rich.markdown import Markdown
-from typing import Dict, Any, Optional
+from rich.live import Live
+from typing import Dict, Any, Iterable, List, Optional
+import time
+import logging
+
+from ..config import Config
 
 console = Console()
 
+# seconds between re-renders of a streaming panel, markdown is re-parsed on each one
+STREAM_RENDER_INTERVAL = 0.05
+
 class OutputManager:
     """
     Manages terminal output formatting using the Rich library.
@@ -32,20 +40,69 @@ class OutputManager:
         intent = state.get("intent", "")
         output_file = state.get("output_file", "")
         
+        # content already rendered live by display_stream is not shown again
+        streamed = state.get("streamed", False)
+        
         # Display based on intent type
         if intent == "question":
-            OutputManager.display_answer(response)
+            if not streamed:
+                OutputManager.display_answer(response)
         elif intent in ["generate_code", "edit_code"]:
-            source_code = state.get("source_code", "")
+            source_code = "" if streamed else state.get("source_code", "")
             language = state.get("language", "python")
             OutputManager.display_code_result(response, source_code, language, output_file)
         elif intent in ["generate_text", "edit_text"]:
-            source_text = state.get("source_text", "")
+            source_text = "" if streamed else state.get("source_text", "")
             OutputManager.display_text_result(response, source_text, output_file)
         else:
             # Generic response
             OutputManager.display_generic(response)
     
+    @staticmethod
+    def stream_enabled() -> bool:
+        """stream only to an interactive terminal that is not silenced (batch, server)"""
+        return bool(Config.STREAM_OUTPUT) and not console.quiet and console.is_terminal
+    
+    @staticmethod
+    def display_stream(chunks: Iterable[str], title: str, border_style: str = "blue") -> str:
+        """
+        Render chunks in a live updating panel as they arrive.
+        
+        Args:
+            chunks: text chunks, e.g. from stream_llm
+            title: panel title
+            border_style: panel border style
+        
+        Returns:
+            The full text once the stream ends
+        """
+        def _panel(text: str) -> Panel:
+            return Panel(Markdown(text), title=title, border_style=border_style, padding=(1, 2))
+        
+        parts = []
+        start = time.perf_counter()
+        first_token = None
+        last_render = 0.0
+        
+        console.print("\n")
+        with Live(_panel(""), console=console, refresh_per_second=20, vertical_overflow="visible") as live:
+            for chunk in chunks:
+                now = time.perf_counter()
+                if first_token is None:
+                    first_token = now - start
+                parts.append(chunk)
+                if now - last_render >= STREAM_RENDER_INTERVAL:
+                    live.update(_panel("".join(parts)))
+                    last_render = now
+            text = "".join(parts)
+            live.update(_panel(text))
+        console.print("\n")
+        
+        full_render = time.perf_counter() - start
+        logging.debug(f"{title}: first token after {(first_token or full_render) * 1000:.0f} ms, "
+                      f"full render after {full_render * 1000:.0f} ms")
+        return text
+    
     @staticmethod
     def display_answer(answer: str):
         """Display an answer to a question."""
@@ -180,6 +237,23 @@ class OutputManager:
         ))
         console.print("\n")
     
+    @staticmethod
+    def display_stats(rows: List[Dict[str, Any]]):
+        """Display per node latency percentiles, the rows of metrics.node_summary()."""
+        if not rows:
+            console.print("[yellow]No requests measured yet.[/yellow]")
+            return
+        table = Table(title="Node latency", border_style="cyan")
+        for column in ("Node", "Runs", "Errors", "Runs/s", "p50 ms", "p95 ms", "p99 ms", "LLM calls", "LLM avg ms"):
+            table.add_column(column, justify="left" if column == "Node" else "right")
+        for row in rows:
+            table.add_row(row["node"], str(row["runs"]), f"{row['errors']:g}", f"{row['per_second']:.3f}",
+                          *(f"{row[key]:.1f}" if row[key] is not None else "-" for key in ("p50_ms", "p95_ms", "p99_ms")),
+                          str(row["llm_calls"]), f"{row['llm_ms']:.1f}")
+        console.print("\n")
+        console.print(table)
+        console.print("\n")
+    
     @staticmethod
     def display_welcome():
         """Display a welcome message on startup."""
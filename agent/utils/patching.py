@@ -0,0 +1,153 @@
+import re
+from typing import List, Optional, Tuple
+
+class PatchError(ValueError):
+    """the reply is not a patch or does not apply to the original"""
+
+PATCH_INSTRUCTIONS = """Reply only with SEARCH/REPLACE blocks that make the change, no explanations:
+<<<<<<< SEARCH
+lines copied exactly from the existing content
+=======
+the lines that replace them
+>>>>>>> REPLACE
+Use one block per changed region and include just enough lines for each SEARCH to match once."""
+
+_HUNK_HEADER_RE = re.compile(r'^@@\s*(?:-(\d+)(?:,\d+)?\s+\+\d+(?:,\d+)?\s*)?@@')
+
+def apply_patch(original: str, reply: str) -> str:
+    """apply a SEARCH/REPLACE or unified diff reply to original, raises PatchError"""
+    reply = _strip_fence(reply)
+    lines = reply.split("\n")
+    if any(line.startswith("<<<<<<<") for line in lines):
+        return apply_search_replace(original, parse_search_replace(reply))
+    if any(_HUNK_HEADER_RE.match(line) for line in lines):
+        return apply_unified_diff(original, reply)
+    raise PatchError("Reply contains no SEARCH/REPLACE blocks or diff hunks")
+
+def _strip_fence(reply: str) -> str:
+    """drop a markdown fence wrapped around the whole reply"""
+    lines = reply.strip().split("\n")
+    if len(lines) >= 2 and lines[0].startswith("```") and lines[-1].strip() == "```":
+        return "\n".join(lines[1:-1])
+    return reply
+
+def parse_search_replace(reply: str) -> List[Tuple[str, str]]:
+    """(search, replace) pairs of every block in the reply"""
+    blocks = []
+    search: Optional[List[str]] = None
+    replace: Optional[List[str]] = None
+    for line in reply.split("\n"):
+        marker = line.strip()
+        if marker.startswith("<<<<<<<") and "SEARCH" in marker:
+            if search is not None:
+                raise PatchError("SEARCH block is not closed")
+            search = []
+        elif marker == "=======" and search is not None and replace is None:
+            replace = []
+        elif marker.startswith(">>>>>>>") and "REPLACE" in marker:
+            if replace is None:
+                raise PatchError("REPLACE marker without a SEARCH block")
+            blocks.append(("\n".join(search), "\n".join(replace)))
+            search = replace = None
+        elif replace is not None:
+            replace.append(line)
+        elif search is not None:
+            search.append(line)
+    if search is not None:
+        raise PatchError("SEARCH/REPLACE block is not closed")
+    if not blocks:
+        raise PatchError("No SEARCH/REPLACE blocks found")
+    return blocks
+
+def apply_search_replace(original: str, blocks: List[Tuple[str, str]]) -> str:
+    """
+    every SEARCH has to match whole lines in exactly one place, first as is
+    then ignoring surrounding whitespace of each line. A SEARCH matching
+    nowhere, several places or only part of a line raises PatchError
+    """
+    text = original
+    for i, (search, replace) in enumerate(blocks, 1):
+        if not search.strip():
+            if text.strip():
+                raise PatchError(f"Block {i} has an empty SEARCH but the file is not empty")
+            text = replace
+            continue
+        lines = text.split("\n")
+        try:
+            start, end = _find_lines(lines, search.split("\n"), None)
+        except PatchError as e:
+            raise PatchError(f"SEARCH of block {i}: {e}")
+        text = "\n".join(lines[:start] + replace.split("\n") + lines[end:])
+    return text
+
+def apply_unified_diff(original: str, diff: str) -> str:
+    """
+    apply the hunks of a unified diff. Line numbers of the hunk headers are
+    only a hint, each hunk is located by its context and removed lines.
+    """
+    hunks = _parse_hunks(diff)
+    lines = original.split("\n")
+    offset = 0
+    for i, (hint, old, new) in enumerate(hunks, 1):
+        expected = None if hint is None else max(0, hint - 1 + offset)
+        if not old:
+            # pure insertion, only the header says where
+            if expected is None:
+                raise PatchError(f"Hunk {i} adds lines without context or line numbers")
+            start = end = min(expected + (1 if hint else 0), len(lines))
+        else:
+            try:
+                start, end = _find_lines(lines, old, expected)
+            except PatchError as e:
+                raise PatchError(f"Hunk {i}: {e}")
+        lines[start:end] = new
+        offset += len(new) - len(old)
+    return "\n".join(lines)
+
+def _parse_hunks(diff: str) -> List[Tuple[Optional[int], List[str], List[str]]]:
+    """(old start line, old lines, new lines) of every hunk"""
+    hunks = []
+    current = None
+    for line in diff.split("\n"):
+        header = _HUNK_HEADER_RE.match(line)
+        if header:
+            current = (int(header.group(1)) if header.group(1) else None, [], [])
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(("--- ", "+++ ", "\\")):
+            continue
+        if line.startswith("-"):
+            current[1].append(line[1:])
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+        else:
+            # context, models often drop the leading space of empty lines
+            context = line[1:] if line.startswith(" ") else line
+            current[1].append(context)
+            current[2].append(context)
+    if not hunks:
+        raise PatchError("No diff hunks found")
+    # trailing empty context comes from the end of the reply, not from the file
+    for _, old, new in hunks:
+        while old and new and old[-1] == "" and new[-1] == "":
+            old.pop()
+            new.pop()
+    return hunks
+
+def _find_lines(lines: List[str], target: List[str], expected: Optional[int]) -> Tuple[int, int]:
+    """(start, end) of target in lines, exact first, then comparing stripped lines"""
+    for normalize in (None, str.strip):
+        if normalize is None:
+            wanted, haystack = target, lines
+        else:
+            wanted, haystack = [normalize(l) for l in target], [normalize(l) for l in lines]
+        size = len(wanted)
+        starts = [i for i in range(len(haystack) - size + 1)
+                  if haystack[i] == wanted[0] and haystack[i:i + size] == wanted]
+        if len(starts) == 1 or (starts and expected is not None):
+            # several matches are resolved by the line number hint
+            start = min(starts, key=lambda s: abs(s - expected)) if expected is not None else starts[0]
+            return start, start + size
+        if len(starts) > 1:
+            raise PatchError(f"{size} lines match {len(starts)} places")
+    raise PatchError(f"{len(target)} lines were not found in the original")
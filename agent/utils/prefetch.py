@@ -0,0 +1,139 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from ..config import Config
+from .metrics import metrics, enabled as metrics_enabled
+
+# identity of a file version, an atomic write always gives the path a new inode
+Stamp = Tuple[int, int, int]
+
+def _stamp(st: os.stat_result) -> Stamp:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _read(path: str, max_bytes: int) -> Optional[Tuple[str, Stamp]]:
+    try:
+        with open(path, "r") as f:
+            # stamped before reading, a change during the read makes the entry stale
+            stamp = _stamp(os.fstat(f.fileno()))
+            if stamp[2] > max_bytes:
+                return None
+            return f.read(), stamp
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Cannot prefetch {path}: {str(e)}")
+        return None
+
+class FilePrefetcher:
+    """
+    reads likely edit targets in the background while routing runs.
+    An entry is only handed out while the file on disk still has the inode,
+    mtime and size it had when it was read
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024, max_entries: int = 16):
+        self.max_bytes = max_bytes
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+
+    def prefetch(self, path: str):
+        """start reading path unless an entry for it is loading or still fresh"""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                if not entry.done():
+                    return
+                loaded = entry.result()
+                if loaded is not None and self._fresh(path, loaded[1]):
+                    self._entries.move_to_end(path)
+                    return
+            self._entries[path] = self._pool.submit(_read, path, self.max_bytes)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, path: str) -> Optional[str]:
+        """prefetched content of path if it is still current, None means read it yourself"""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is None:
+            self._count("miss")
+            return None
+        # a read still in flight is waited for, it is already ahead of a new one
+        loaded = entry.result()
+        if loaded is None or not self._fresh(path, loaded[1]):
+            with self._lock:
+                if self._entries.get(path) is entry:
+                    del self._entries[path]
+            self._count("stale" if loaded is not None else "miss")
+            return None
+        self._count("hit")
+        return loaded[0]
+
+    @staticmethod
+    def _fresh(path: str, stamp: Stamp) -> bool:
+        try:
+            return _stamp(os.stat(path)) == stamp
+        except OSError:
+            return False
+
+    @staticmethod
+    def _count(outcome: str):
+        if metrics_enabled():
+            metrics.inc("agent_prefetch_total", outcome=outcome)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            self._entries.clear()
+
+
+_prefetcher: Optional[FilePrefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher() -> Optional[FilePrefetcher]:
+    """return the shared prefetcher, or None when PREFETCH is disabled in configs.yaml"""
+    global _prefetcher
+    settings = Config().PREFETCH
+    if not settings.get("ENABLED", True):
+        return None
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                _prefetcher = FilePrefetcher(
+                    max_bytes=settings.get("MAX_BYTES", 8 * 1024 * 1024),
+                    max_entries=settings.get("MAX_ENTRIES", 16),
+                )
+    return _prefetcher
+
+def prefetch_edit_targets(language: Optional[str]):
+    """
+    queue reads of the files edit_code and edit_text would open for a message,
+    the code file of the detected language (python when none is detected, like
+    CodeEditor) and the text file
+    """
+    prefetcher = get_prefetcher()
+    if prefetcher is None:
+        return
+    from .file_utils import FileUtils
+    prefetcher.prefetch(FileUtils.get_existing_file_for_language(language or "python"))
+    prefetcher.prefetch(FileUtils.get_textgen_filename(filename="fixed_output.txt"))
+
+def prefetched_content(path: str) -> Optional[str]:
+    prefetcher = _prefetcher
+    return prefetcher.get(path) if prefetcher is not None else None
+
+def close_prefetcher():
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is not None:
+            _prefetcher.close()
+            _prefetcher = None
@@ -0,0 +1,35 @@
+import logging
+from typing import NamedTuple, Optional, Tuple
+
+from ..config import Config
+
+class ModelProfile(NamedTuple):
+    model: str
+    temperature: float
+    max_tokens: Optional[int]  # completion cap, None leaves it to the model
+    stop: Optional[Tuple[str, ...]]
+    timeout: Optional[float]  # seconds per attempt, None keeps the RESILIENCE timeout of the node
+
+def profile_for(node: Optional[str]) -> ModelProfile:
+    """
+    model settings of a node from MODEL_PROFILES in configs.yaml, settings a
+    profile leaves out (and nodes without a profile) use DEFAULT_MODEL and TEMPERATURE
+    """
+    config = Config()
+    profiles = config.MODEL_PROFILES
+    name = (profiles.get("NODES") or {}).get(node)
+    settings = {}
+    if name is not None:
+        settings = (profiles.get("PROFILES") or {}).get(name)
+        if settings is None:
+            logging.warning(f"Unknown model profile {name!r} for {node}, using the default model")
+            settings = {}
+    temperature = settings.get("TEMPERATURE")
+    stop = settings.get("STOP")
+    return ModelProfile(
+        model=settings.get("MODEL") or config.DEFAULT_MODEL,
+        temperature=config.TEMPERATURE if temperature is None else temperature,
+        max_tokens=settings.get("MAX_TOKENS") or None,
+        stop=(stop,) if isinstance(stop, str) else (tuple(stop) if stop else None),
+        timeout=settings.get("TIMEOUT") or None,
+    )
@@ -0,0 +1,353 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from ..config import Config
+from .metrics import metrics, enabled as metrics_enabled
+
+# words that do not change what is asked
+_FILLER = frozenset("""
+a an the please pls hey hi hello can could would you me tell explain quick quickly briefly
+just some about i im i'm want wanted know like to do does is are was were be
+""".split())
+# the same thing written differently
+_ALIASES = {
+    "js": "javascript", "ts": "typescript", "py": "python", "cpp": "c++", "golang": "go",
+    "whats": "what is", "what's": "what is", "hows": "how is", "how's": "how is", "whys": "why is",
+    "why's": "why is", "wheres": "where is", "where's": "where is", "whos": "who is", "who's": "who is",
+    "isnt": "is not", "isn't": "is not", "dont": "do not", "don't": "do not", "doesnt": "does not",
+    "doesn't": "does not", "cant": "can not", "can't": "can not", "cannot": "can not",
+}
+# words that pick the answer, a near duplicate must have the same ones: negations,
+# languages and technologies (plus the FILE_EXTENSIONS languages) and either side of an opposite pair.
+# Terms are never plural folded, everything else is compared in the singular
+_NEGATIONS = frozenset({"not", "no", "never", "without"})
+_TERMS = frozenset("""
+python javascript typescript java c c++ c# csharp go rust ruby php swift kotlin scala r perl haskell
+lua dart elixir erlang clojure julia matlab sql bash shell powershell html css json yaml xml csv
+react vue angular svelte django flask fastapi rails spring express node nodejs deno numpy pandas
+pytorch tensorflow mysql postgres postgresql sqlite mongodb redis kafka docker kubernetes linux
+windows macos ios android git aws azure gcp http https tcp udp rest graphql grpc
+thread process coroutine asyncio multiprocessing lock mutex semaphore list array tuple dict
+dictionary set map hashmap string int integer float queue stack heap tree graph struct interface
+""".split()) | frozenset(alias for alias in _ALIASES.values() if " " not in alias)
+_OPPOSITES = frozenset("""
+ascending descending increase decrease increment decrement min max minimum maximum first last
+before after sync async synchronous asynchronous encode decode encrypt decrypt serialize deserialize
+compress decompress upper lower uppercase lowercase add remove insert delete push pop enable disable
+open close read write import export input output client server frontend backend left right true
+false start stop begin end include exclude public private static dynamic mutable immutable local
+global inner outer join split upload download
+""".split())
+# words that point back at earlier turns, such a question is only cached when asked without history
+_CONTEXT_WORDS = frozenset("""
+it its this that these those they them their he she him her his above previous earlier again same
+also instead former latter
+""".split())
+_FOLLOW_UP_STARTS = frozenset({"and", "or", "but", "so", "then", "what about", "how about"})
+_WORD_RE = re.compile(r"[a-z0-9+#']+")
+# Mersenne prime modulus of the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+def _singular(word: str) -> str:
+    if word in _TERMS:
+        return word
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("sses", "ches", "shes", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def normalize(question: str) -> List[str]:
+    """lower case words of a question with aliases expanded, filler dropped and plurals folded"""
+    words = []
+    for word in _WORD_RE.findall(question.lower()):
+        for part in _ALIASES.get(word.strip("'"), word.strip("'")).split():
+            if part in _FILLER or not part:
+                continue
+            words.append(_singular(part))
+    return words
+
+def shingles(words: List[str]) -> Set[str]:
+    """single words and word pairs, pairs keep the order of short questions"""
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+def guard(words: List[str], terms: FrozenSet[str] = _TERMS) -> FrozenSet[str]:
+    """
+    words of a question that pick its answer: numbers and versions, negations,
+    technology terms and opposites. Near duplicates must agree on them
+    exactly, every other word only counts towards the similarity
+    """
+    return frozenset(w for w in words if w in _NEGATIONS or w in terms or w in _OPPOSITES
+                     or any(c.isdigit() for c in w))
+
+def depends_on_context(question: str) -> bool:
+    """
+    True for a follow up that needs the turns before it to make sense:
+    a pronoun or "above", a leading "and" / "what about", or under three words
+    """
+    raw = [w.split("'")[0] for w in _WORD_RE.findall(question.lower())]
+    if any(w in _CONTEXT_WORDS for w in raw):
+        return True
+    if raw and (raw[0] in _FOLLOW_UP_STARTS or " ".join(raw[:2]) in _FOLLOW_UP_STARTS):
+        return True
+    return len(normalize(question)) < 3
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+class QuestionCache:
+    """
+    answers of earlier questions found by similarity. Questions are reduced
+    to word shingles, MinHash signatures go into an LSH index of bands held
+    in memory, and candidates from the index are confirmed by the Jaccard
+    similarity of their shingles. Entries are stored in sqlite and the index
+    is rebuilt from it on open
+    """
+
+    def __init__(self, path: str, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 max_entries: int = 10000, ttl: float = 86400, terms: Iterable[str] = ()):
+        if num_perm % bands:
+            raise ValueError(f"QUESTION_CACHE.NUM_PERM ({num_perm}) must be a multiple of BANDS ({bands})")
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.terms = _TERMS | {term.lower() for term in terms}
+        # fixed seeds, signatures stored on disk stay valid across processes
+        seeds = [int.from_bytes(hashlib.blake2b(f"perm{i}".encode(), digest_size=16).digest(), "big")
+                 for i in range(num_perm)]
+        self._perms = [((s >> 64) % (_PRIME - 1) + 1, (s & ((1 << 64) - 1)) % _PRIME) for s in seeds]
+
+        # band number -> band hash -> entry ids, and entry id -> (model, shingles, guard, answer, expires)
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in range(bands)]
+        self._entries: Dict[int, Tuple[str, FrozenSet[str], FrozenSet[str], str, float]] = {}
+        self._signatures: Dict[int, Tuple[int, ...]] = {}
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS question_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model TEXT NOT NULL,
+                question TEXT NOT NULL,
+                shingles TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                expires REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute("DELETE FROM question_cache WHERE expires <= ?", (time.time(),))
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        """rebuild the in-memory index from sqlite, signatures of another NUM_PERM are recomputed"""
+        rows = self._db.execute("SELECT id, model, shingles, signature, answer, expires FROM question_cache").fetchall()
+        for entry_id, model, raw_shingles, raw_signature, answer, expires in rows:
+            words = json.loads(raw_shingles)
+            signature = tuple(json.loads(raw_signature))
+            if len(signature) != len(self._perms):
+                signature = self.signature(set(words))
+            self._add(entry_id, model, frozenset(words), guard([w for w in words if " " not in w], self.terms),
+                      signature, answer, expires)
+        logging.debug(f"Question cache loaded {len(rows)} entries from {self.path}")
+
+    def signature(self, shingle_set: Set[str]) -> Tuple[int, ...]:
+        hashes = [_hash(s) for s in shingle_set] or [0]
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms)
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[int]:
+        return [hash(signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def _add(self, entry_id: int, model: str, shingle_set: FrozenSet[str], words_guard: FrozenSet[str],
+             signature: Tuple[int, ...], answer: str, expires: float):
+        self._entries[entry_id] = (model, shingle_set, words_guard, answer, expires)
+        self._signatures[entry_id] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, set()).add(entry_id)
+
+    def _drop(self, entry_id: int):
+        self._entries.pop(entry_id, None)
+        signature = self._signatures.pop(entry_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def lookup(self, question: str, model: str) -> Optional[Tuple[str, float]]:
+        """(answer, similarity) of the most similar earlier question at or above the threshold"""
+        words = normalize(question)
+        if not words:
+            return None
+        shingle_set = shingles(words)
+        words_guard = guard(words, self.terms)
+        signature = self.signature(shingle_set)
+        now = time.time()
+        best = None
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates |= self._buckets[band].get(key, set())
+            for entry_id in candidates:
+                entry_model, entry_shingles, entry_guard, answer, expires = self._entries[entry_id]
+                if entry_model != model or entry_guard != words_guard or expires <= now:
+                    continue
+                similarity = len(shingle_set & entry_shingles) / len(shingle_set | entry_shingles)
+                if similarity >= self.threshold and (best is None or similarity > best[2]):
+                    best = (entry_id, answer, similarity)
+            if best is None:
+                return None
+            self._db.execute("UPDATE question_cache SET last_access = ? WHERE id = ?", (now, best[0]))
+            self._db.commit()
+        return best[1], best[2]
+
+    def store(self, question: str, model: str, answer: str):
+        words = normalize(question)
+        if not words or not answer:
+            return
+        shingle_set = shingles(words)
+        signature = self.signature(shingle_set)
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO question_cache (model, question, shingles, signature, answer, expires, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model, question, json.dumps(sorted(shingle_set)), json.dumps(signature), answer, now + self.ttl, now),
+            )
+            self._add(cursor.lastrowid, model, frozenset(shingle_set), guard(words, self.terms), signature, answer, now + self.ttl)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """once over max_entries drop expired entries, then the least recently used ones"""
+        if len(self._entries) <= self.max_entries:
+            # expired entries are skipped by lookup until then
+            return
+        now = time.time()
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry[4] <= now]
+        over = len(self._entries) - len(expired) - self.max_entries
+        if over > 0:
+            expired += [row[0] for row in self._db.execute(
+                "SELECT id FROM question_cache WHERE expires > ? ORDER BY last_access LIMIT ?", (now, over))]
+        for entry_id in expired:
+            self._drop(entry_id)
+            self._db.execute("DELETE FROM question_cache WHERE id = ?", (entry_id,))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._signatures.clear()
+            self._buckets = [{} for _ in range(self.bands)]
+            self._db.execute("DELETE FROM question_cache")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache: Optional[QuestionCache] = None
+_cache_lock = threading.Lock()
+
+def get_question_cache() -> Optional[QuestionCache]:
+    """return the shared question cache, or None when QUESTION_CACHE is disabled in configs.yaml"""
+    global _cache
+    settings = Config().QUESTION_CACHE
+    if not settings.get("ENABLED", False):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QuestionCache(
+                    path=settings.get("PATH", "outputs/cache/question_cache.sqlite"),
+                    threshold=settings.get("THRESHOLD", 0.8),
+                    num_perm=settings.get("NUM_PERM", 64),
+                    bands=settings.get("BANDS", 16),
+                    max_entries=settings.get("MAX_ENTRIES", 10000),
+                    ttl=settings.get("TTL", 86400),
+                    terms=Config().FILE_EXTENSIONS.keys(),
+                )
+    return _cache
+
+def _count(outcome: str):
+    if metrics_enabled():
+        metrics.inc("agent_question_cache_total", outcome=outcome)
+
+def _standalone(state) -> bool:
+    """
+    a question asked with history or a summary may lean on it, it is only
+    served and stored when it makes sense on its own
+    """
+    if not (state.get("history") or state.get("summary")):
+        return True
+    return not depends_on_context(state["messages"][-1].content)
+
+def _usable(state, cache: Optional[QuestionCache]) -> bool:
+    if cache is None:
+        return False
+    if state.get("bypass_cache"):
+        _count("bypass")
+        return False
+    if not _standalone(state):
+        _count("context")
+        return False
+    return True
+
+def cached_answer(state, model: str) -> Optional[str]:
+    """stored answer of a near duplicate of the current question, None to ask the LLM"""
+    cache = get_question_cache()
+    if not _usable(state, cache):
+        return None
+    start = time.perf_counter()
+    found = cache.lookup(state["messages"][-1].content, model)
+    if metrics_enabled():
+        metrics.observe("agent_question_cache_lookup_seconds", time.perf_counter() - start)
+    if found is None:
+        _count("miss")
+        return None
+    answer, similarity = found
+    _count("hit")
+    logging.info(f"Question cache hit, similarity {similarity:.2f}")
+    return answer
+
+def store_answer(state, model: str, answer: str):
+    cache = get_question_cache()
+    if cache is None or state.get("bypass_cache") or not _standalone(state):
+        return
+    try:
+        cache.store(state["messages"][-1].content, model, answer)
+    except sqlite3.Error as e:
+        logging.error(f"Cannot store answer in the question cache: {str(e)}")
+
+def close_question_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            try:
+                _cache.close()
+            except Exception as e:
+                logging.error(f"Error closing question cache: {str(e)}")
+            _cache = None
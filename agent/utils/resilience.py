@@ -0,0 +1,459 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, NamedTuple, Optional, Union
+
+from ..config import Config
+from .metrics import metrics, enabled as metrics_enabled
+from .profiles import profile_for
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+class LLMTimeoutError(TimeoutError):
+    """an LLM call ran past the timeout of its node"""
+
+class LLMUnavailableError(RuntimeError):
+    """the circuit of the model is open and there is no fallback model to use"""
+
+class Policy(NamedTuple):
+    timeout: Optional[float]
+    retries: int
+    backoff_base: float
+    backoff_max: float
+    hedge: bool
+    hedge_min_samples: int
+    hedge_min_delay: float
+
+def settings() -> Dict[str, Any]:
+    return Config().RESILIENCE
+
+def enabled() -> bool:
+    return settings().get("ENABLED", True)
+
+def policy_for(node: Optional[str]) -> Policy:
+    """
+    timeouts, retries and hedging of a node, from the RESILIENCE block of
+    configs.yaml. The TIMEOUT of the node's model profile wins over NODE_TIMEOUTS
+    """
+    s = settings()
+    profile_timeout = profile_for(node).timeout
+    if not s.get("ENABLED", True):
+        return Policy(profile_timeout, 0, 0.0, 0.0, False, 0, 0.0)
+    timeout = profile_timeout or (s.get("NODE_TIMEOUTS") or {}).get(node, s.get("TIMEOUT", 120))
+    return Policy(
+        timeout=timeout or None,
+        retries=s.get("RETRIES", 2),
+        backoff_base=s.get("BACKOFF_BASE", 0.5),
+        backoff_max=s.get("BACKOFF_MAX", 8),
+        hedge=s.get("HEDGE", True) and metrics_enabled(),
+        hedge_min_samples=s.get("HEDGE_MIN_SAMPLES", 20),
+        hedge_min_delay=s.get("HEDGE_MIN_DELAY", 0.25),
+    )
+
+def _inc(name: str, **labels: str):
+    if metrics_enabled():
+        metrics.inc(name, **labels)
+
+class _Trial:
+    """the one call a half open circuit lets through"""
+    __slots__ = ("started",)
+
+    def __init__(self):
+        self.started = time.monotonic()
+
+class CircuitBreaker:
+    """
+    closed until failures consecutive failed requests, then open for cooldown
+    seconds. After that one trial call is let through (half open), its outcome
+    closes or reopens the circuit. A trial that ends without an outcome is
+    released, one that never ends expires after cooldown seconds
+    """
+
+    def __init__(self, model: str, failures: int = 5, cooldown: float = 30):
+        self.model = model
+        self.failures = max(1, failures)
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._failed = 0
+        self._opened = 0.0
+        self._trial: Optional[_Trial] = None
+        self._lock = threading.Lock()
+
+    def _move(self, state: str):
+        if state != self.state:
+            logging.warning(f"Circuit of {self.model} is now {state}")
+            self.state = state
+            _inc("agent_llm_breaker_transitions_total", model=self.model, state=state)
+
+    def _trial_free(self, now: float) -> bool:
+        if self.state == "open":
+            return now - self._opened >= self.cooldown
+        return self._trial is None or now - self._trial.started >= self.cooldown
+
+    def allow(self) -> bool:
+        """whether a call would be let through now, takes nothing"""
+        with self._lock:
+            return self.state == "closed" or self._trial_free(time.monotonic())
+
+    def begin(self) -> Union[bool, _Trial, None]:
+        """
+        right before a request is sent: True while closed, the trial when it
+        is the half open trial, None when the circuit rejects the call
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if not self._trial_free(now):
+                return None
+            self._move("half_open")
+            self._trial = _Trial()
+            return self._trial
+
+    def release(self, ticket: Union[bool, _Trial, None]):
+        """end of an attempt, a trial that got no outcome lets the next call try"""
+        with self._lock:
+            if self._trial is not None and self._trial is ticket:
+                self._trial = None
+
+    def retry_in(self) -> float:
+        return max(0.0, self.cooldown - (time.monotonic() - self._opened))
+
+    def success(self):
+        with self._lock:
+            self._failed = 0
+            self._trial = None
+            self._move("closed")
+
+    def failure(self):
+        with self._lock:
+            self._failed += 1
+            self._trial = None
+            if self.state == "half_open" or self._failed >= self.failures:
+                self._opened = time.monotonic()
+                self._move("open")
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            s = settings()
+            breaker = _breakers[model] = CircuitBreaker(model, s.get("BREAKER_FAILURES", 5), s.get("BREAKER_COOLDOWN", 30))
+        return breaker
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+def select_llm(llm: "ChatOpenAI", node: Optional[str], get_client: Callable[..., "ChatOpenAI"]) -> "ChatOpenAI":
+    """
+    llm while its circuit lets calls through, else the client of FALLBACK_MODEL
+    (same temperature and base url), else LLMUnavailableError right away.
+    Only checks the circuit, a half open trial is taken when the request is sent
+    """
+    if not enabled() or get_breaker(llm.model_name).allow():
+        return llm
+    fallback = settings().get("FALLBACK_MODEL")
+    if fallback and fallback != llm.model_name and get_breaker(fallback).allow():
+        _inc("agent_llm_fallbacks_total", node=node or "unknown")
+        return get_client(model=fallback, temperature=llm.temperature, base_url=llm.openai_api_base)
+    raise LLMUnavailableError(f"Circuit of {llm.model_name} is open after repeated failures, "
+                              f"retrying in {get_breaker(llm.model_name).retry_in():.0f}s")
+
+def _is_timeout(error: BaseException) -> bool:
+    import openai
+    return isinstance(error, (TimeoutError, openai.APITimeoutError))
+
+def is_retryable(error: BaseException) -> bool:
+    """timeouts, connection errors, 408/409/429 and 5xx responses"""
+    if _is_timeout(error):
+        return True
+    import openai
+    if isinstance(error, openai.APIConnectionError):  # APITimeoutError included
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+def retry_delay(error: BaseException, attempt: int, policy: Policy) -> float:
+    """the retry-after of the response when there is one, else full jitter exponential backoff"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return min(float(headers["retry-after-ms"]) / 1000, policy.backoff_max)
+        if "retry-after" in headers:
+            return min(float(headers["retry-after"]), policy.backoff_max)
+    except ValueError:
+        pass
+    return random.uniform(0, min(policy.backoff_max, policy.backoff_base * 2 ** attempt))
+
+def hedge_delay(node: Optional[str], policy: Policy) -> Optional[float]:
+    """p95 of the node's invoke calls once there are enough of them, None means no hedge"""
+    if not policy.hedge:
+        return None
+    p95, count = metrics.quantile("agent_llm_seconds", 0.95, node=node or "unknown", mode="invoke")
+    if count < policy.hedge_min_samples:
+        return None
+    delay = max(p95, policy.hedge_min_delay)
+    return delay if policy.timeout is None or delay < policy.timeout else None
+
+def _is_rate_limited(error: BaseException) -> bool:
+    import openai
+    return isinstance(error, openai.APIStatusError) and error.status_code == 429
+
+def _failed(llm: "ChatOpenAI", node: Optional[str], error: BaseException, attempt: int, policy: Policy,
+            ticket: Union[bool, _Trial, None] = True) -> Optional[float]:
+    """
+    breaker bookkeeping of a failed attempt, the delay before the next one or
+    None to give up. A request counts as one breaker failure once its last
+    retry fails, a 429 never does (the model is up, the quota is spent).
+    A failed trial reopens the circuit right away
+    """
+    trial = isinstance(ticket, _Trial)
+    if not is_retryable(error):
+        if trial:
+            # any error ends a trial, a 400 says nothing good about the model either
+            get_breaker(llm.model_name).failure()
+        return None
+    if _is_timeout(error):
+        _inc("agent_llm_timeouts_total", node=node or "unknown")
+    last = attempt >= policy.retries
+    if (trial or last) and not _is_rate_limited(error):
+        get_breaker(llm.model_name).failure()
+    if last:
+        return None
+    _inc("agent_llm_retries_total", node=node or "unknown", reason=type(error).__name__)
+    return retry_delay(error, attempt, policy)
+
+# sync hedges run here, the caller waits on both futures
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=Config().LLM_POOL_SIZE, thread_name_prefix="llm-hedge")
+        return _pool
+
+def close_resilience():
+    """drop the hedge pool (abandoned calls end with their request timeout) and the breakers"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+    reset_breakers()
+
+def _submit(fn: Callable[[], Any]) -> Future:
+    # callbacks of the graph run (stream_mode="messages") live in context variables
+    return _get_pool().submit(contextvars.copy_context().run, fn)
+
+def _hedged(fn: Callable[[], Any], node: Optional[str], policy: Policy) -> Any:
+    delay = hedge_delay(node, policy)
+    if delay is None:
+        # the request timeout passed to the client ends the call
+        return fn()
+    deadline = time.monotonic() + policy.timeout if policy.timeout else None
+    primary = _submit(fn)
+    futures = [primary]
+    done, _ = wait(futures, timeout=delay)
+    hedged = not done
+    if hedged:
+        futures.append(_submit(fn))
+    error = None
+    while futures:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            raise LLMTimeoutError(f"LLM call of {node} timed out after {policy.timeout}s")
+        for future in done:
+            futures.remove(future)
+            if future.exception() is None:
+                _hedge_won(node, hedged, primary=future is primary)
+                return future.result()
+            error = future.exception()
+    raise error
+
+async def _ahedged(afn: Callable[[], Awaitable[Any]], node: Optional[str], policy: Policy) -> Any:
+    delay = hedge_delay(node, policy)
+    if delay is None:
+        try:
+            return await asyncio.wait_for(afn(), policy.timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"LLM call of {node} timed out after {policy.timeout}s") from None
+    deadline = time.monotonic() + policy.timeout if policy.timeout else None
+    primary = asyncio.ensure_future(afn())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        hedged = not done
+        if hedged:
+            tasks.append(asyncio.ensure_future(afn()))
+        error = None
+        while tasks:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise LLMTimeoutError(f"LLM call of {node} timed out after {policy.timeout}s")
+            for task in done:
+                tasks.remove(task)
+                if task.exception() is None:
+                    _hedge_won(node, hedged, primary=task is primary)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # the slower request is cancelled, its connection goes back to the pool closed
+        for task in tasks:
+            task.cancel()
+
+def _hedge_won(node: Optional[str], hedged: bool, primary: bool):
+    if hedged:
+        _inc("agent_llm_hedges_total", node=node or "unknown", winner="primary" if primary else "hedge")
+
+def _begin(llm: "ChatOpenAI") -> Union[bool, _Trial]:
+    """breaker ticket of an attempt about to be sent, raises when the circuit closed on it meanwhile"""
+    if not enabled():
+        return True
+    ticket = get_breaker(llm.model_name).begin()
+    if ticket is None:
+        raise LLMUnavailableError(f"Circuit of {llm.model_name} is open after repeated failures, "
+                                  f"retrying in {get_breaker(llm.model_name).retry_in():.0f}s")
+    return ticket
+
+def _release(llm: "ChatOpenAI", ticket: Union[bool, _Trial]):
+    if isinstance(ticket, _Trial):
+        get_breaker(llm.model_name).release(ticket)
+
+def call_llm(llm: "ChatOpenAI", node: Optional[str], invoke: Callable[["ChatOpenAI", Optional[float]], Any]) -> Any:
+    """
+    invoke(llm, timeout) with the node's timeout, retries with backoff and a
+    hedged duplicate request once the call is slower than the node's p95
+    """
+    policy = policy_for(node)
+    attempt = 0
+    while True:
+        ticket = _begin(llm)
+        try:
+            response = _hedged(lambda: invoke(llm, policy.timeout), node, policy)
+        except Exception as e:
+            delay = _failed(llm, node, e, attempt, policy, ticket)
+            if delay is None:
+                raise
+            logging.warning(f"LLM call of {node} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        finally:
+            _release(llm, ticket)
+        _succeeded(llm)
+        return response
+
+async def acall_llm(llm: "ChatOpenAI", node: Optional[str],
+                ainvoke: Callable[["ChatOpenAI", Optional[float]], Awaitable[Any]]) -> Any:
+    """async version of call_llm, a losing hedge is cancelled"""
+    policy = policy_for(node)
+    attempt = 0
+    while True:
+        ticket = _begin(llm)
+        try:
+            response = await _ahedged(lambda: ainvoke(llm, policy.timeout), node, policy)
+        except Exception as e:
+            delay = _failed(llm, node, e, attempt, policy, ticket)
+            if delay is None:
+                raise
+            logging.warning(f"LLM call of {node} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        finally:
+            # a cancelled trial (speculation, a request timeout) lets the next call try
+            _release(llm, ticket)
+        _succeeded(llm)
+        return response
+
+def stream_chunks(llm: "ChatOpenAI", node: Optional[str], open_stream: Callable[["ChatOpenAI", Optional[float]], Iterator]) -> Iterator:
+    """
+    chunks of open_stream(llm, timeout), retried like call_llm until the first
+    chunk arrives. Chunks already handed out cannot be taken back, a failure
+    after that is raised. No hedging, the output may be on screen already
+    """
+    policy = policy_for(node)
+    attempt = 0
+    while True:
+        ticket = _begin(llm)
+        try:
+            chunks = open_stream(llm, policy.timeout)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                _succeeded(llm)
+                return
+            except Exception as e:
+                chunks.close()
+                delay = _failed(llm, node, e, attempt, policy, ticket)
+                if delay is None:
+                    raise
+                logging.warning(f"LLM stream of {node} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+        finally:
+            _release(llm, ticket)
+        _succeeded(llm)
+        yield first
+        # closing this generator closes the inner stream and its http response
+        yield from chunks
+        return
+
+async def astream_chunks(llm: "ChatOpenAI", node: Optional[str],
+                  open_stream: Callable[["ChatOpenAI", Optional[float]], AsyncIterator]) -> AsyncIterator:
+    """async version of stream_chunks"""
+    policy = policy_for(node)
+    attempt = 0
+    while True:
+        ticket = _begin(llm)
+        try:
+            chunks = open_stream(llm, policy.timeout)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                _succeeded(llm)
+                return
+            except Exception as e:
+                await chunks.aclose()
+                delay = _failed(llm, node, e, attempt, policy, ticket)
+                if delay is None:
+                    raise
+                logging.warning(f"LLM stream of {node} failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # cancelled before the first chunk, the http response is closed with the stream
+                await chunks.aclose()
+                raise
+        finally:
+            _release(llm, ticket)
+        _succeeded(llm)
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+        return
+
+def _succeeded(llm: "ChatOpenAI"):
+    if enabled():
+        get_breaker(llm.model_name).success()
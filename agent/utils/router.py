@@ -22,4 +22,10 @@ def intent_router(state: MessageState) -> str:
     elif specific_intent == "edit_text":
         return "edit_text"
     else:
-        return "generate_response"
\ No newline at end of file
+        return "generate_response"
+
+def combined_router(state: MessageState) -> str:
+    """single dispatch for the combined routing mode, intent is already final."""
+    if state.get("intent") == "question":
+        return "handle_question"
+    return intent_router(state)
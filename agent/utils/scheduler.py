@@ -0,0 +1,251 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import Config
+from .metrics import record_queue_depth, record_queue_wait
+
+# lower classes are admitted first when calls queue for the same model
+PRIORITY_CLASSES = ("routing", "generation", "background")
+
+class TokenBucket:
+    """
+    per_minute units refilled continuously, holding at most burst_seconds of
+    refill. A request larger than the bucket waits for a full bucket instead
+    of forever
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """seconds until amount can be taken, 0 when it can be taken now"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "queued", "cancelled", "wake")
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.queued = time.monotonic()
+        self.cancelled = False
+        self.wake: Callable[[], Any] = lambda: None
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class ModelLimiter:
+    """
+    request and token buckets of one model with a priority queue in front.
+    Only the head of the queue (lowest class, then arrival) takes from the
+    buckets, so a queued routing call goes before every queued generation.
+    A call queued for max_wait seconds becomes the head whatever its class,
+    so background calls are not starved by a steady stream of routing calls
+    """
+
+    def __init__(self, model: str, rpm: float, tpm: float, burst_seconds: float = 10, max_wait: float = 0):
+        self.model = model
+        self.requests = TokenBucket(rpm, burst_seconds) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, burst_seconds) if tpm > 0 else None
+        self.max_wait = max_wait
+        self._queue: List[_Waiter] = []
+        self._waiting = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _push(self, priority: int, tokens: int) -> _Waiter:
+        waiter = _Waiter(priority, next(self._seq), tokens)
+        heapq.heappush(self._queue, waiter)
+        self._waiting += 1
+        return waiter
+
+    def _head(self) -> Optional[_Waiter]:
+        while self._queue and self._queue[0].cancelled:
+            heapq.heappop(self._queue)
+        if not self._queue:
+            return None
+        if self.max_wait > 0:
+            oldest = min((w for w in self._queue if not w.cancelled), key=lambda w: w.seq)
+            if time.monotonic() - oldest.queued >= self.max_wait:
+                return oldest
+        return self._queue[0]
+
+    def _pop(self, waiter: _Waiter):
+        if self._queue[0] is waiter:
+            heapq.heappop(self._queue)
+        else:
+            # an old call that jumped the priority order
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+
+    def _grant(self, waiter: _Waiter) -> Optional[float]:
+        """0 when waiter got its slot, seconds to wait when it is the head, None behind another call"""
+        head = self._head()
+        if head is not waiter:
+            if head is not self._queue[0]:
+                # promoted by its wait, it sleeps without a timeout
+                head.wake()
+            return None
+        now = time.monotonic()
+        delay = max(self.requests.wait_time(1, now) if self.requests else 0.0,
+                    self.tokens.wait_time(waiter.tokens, now) if self.tokens else 0.0)
+        if delay > 0:
+            return delay
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(waiter.tokens)
+        self._pop(waiter)
+        self._left()
+        return 0.0
+
+    def _left(self):
+        """a waiter was admitted or gave up, the next head checks the buckets"""
+        self._waiting -= 1
+        record_queue_depth(self.model, self._waiting)
+        head = self._head()
+        if head is not None:
+            head.wake()
+
+    def _cancel(self, waiter: _Waiter):
+        with self._lock:
+            if waiter.cancelled or waiter not in self._queue:
+                return
+            waiter.cancelled = True
+            self._left()
+
+    def acquire(self, tokens: int, priority: int) -> bool:
+        """block until the call may be sent, True when it had to wait"""
+        event = threading.Event()
+        with self._lock:
+            waiter = self._push(priority, tokens)
+            waiter.wake = event.set
+            delay = self._grant(waiter)
+            if delay == 0:
+                return False
+            record_queue_depth(self.model, self._waiting)
+        try:
+            while delay != 0:
+                event.wait(delay)
+                with self._lock:
+                    # cleared before the check, a wake after it is not lost
+                    event.clear()
+                    delay = self._grant(waiter)
+        except BaseException:
+            self._cancel(waiter)
+            raise
+        return True
+
+    async def aacquire(self, tokens: int, priority: int) -> bool:
+        """async version of acquire, a cancelled call leaves the queue"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            waiter = self._push(priority, tokens)
+            delay = self._grant(waiter)
+            if delay == 0:
+                return False
+            record_queue_depth(self.model, self._waiting)
+            woken = _arm(waiter, loop)
+        try:
+            while True:
+                await asyncio.wait([woken], timeout=delay)
+                with self._lock:
+                    delay = self._grant(waiter)
+                    if delay == 0:
+                        return True
+                    woken = _arm(waiter, loop)
+        except BaseException:
+            self._cancel(waiter)
+            raise
+
+def _arm(waiter: _Waiter, loop: asyncio.AbstractEventLoop) -> asyncio.Future:
+    """a future resolved by the next wake of waiter, armed under the lock of its limiter"""
+    woken = loop.create_future()
+    waiter.wake = lambda: _resolve_threadsafe(loop, woken)
+    return woken
+
+def _resolve_threadsafe(loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+    def _resolve():
+        if not future.done():
+            future.set_result(None)
+    try:
+        loop.call_soon_threadsafe(_resolve)
+    except RuntimeError:
+        # the loop is closed, nobody is waiting anymore
+        pass
+
+def settings() -> Dict[str, Any]:
+    return Config().LLM_RATE_LIMITS
+
+def priority_of(node: Optional[str]) -> Tuple[int, str]:
+    """(rank, class name) of a node from NODE_PRIORITIES, DEFAULT_PRIORITY otherwise"""
+    s = settings()
+    name = (s.get("NODE_PRIORITIES") or {}).get(node, s.get("DEFAULT_PRIORITY", "generation"))
+    if name not in PRIORITY_CLASSES:
+        logging.warning(f"Unknown LLM priority {name!r} for {node}, using generation")
+        name = "generation"
+    return PRIORITY_CLASSES.index(name), name
+
+def estimate_call_tokens(prompt: str, max_tokens: Optional[int] = None) -> int:
+    """tokens a call is charged up front, the prompt plus max_tokens (COMPLETION_TOKENS when uncapped) for the answer"""
+    from .token_budget import estimate_tokens
+    return estimate_tokens(prompt) + (max_tokens or settings().get("COMPLETION_TOKENS", 500))
+
+_limiters: Dict[str, Optional[ModelLimiter]] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(model: str) -> Optional[ModelLimiter]:
+    """limiter of a model from LLM_RATE_LIMITS, None when the model has no limits"""
+    s = settings()
+    if not s.get("ENABLED", True):
+        return None
+    with _limiters_lock:
+        if model not in _limiters:
+            limits = (s.get("MODELS") or {}).get(model) or s.get("DEFAULT") or {}
+            rpm, tpm = limits.get("RPM", 0), limits.get("TPM", 0)
+            _limiters[model] = (ModelLimiter(model, rpm, tpm, s.get("BURST_SECONDS", 10), s.get("MAX_QUEUE_WAIT", 30))
+                                if rpm > 0 or tpm > 0 else None)
+        return _limiters[model]
+
+def admit(model: str, node: Optional[str], prompt: str, max_tokens: Optional[int] = None):
+    """wait for a rate limit slot of model before sending prompt"""
+    limiter = get_limiter(model)
+    if limiter is None:
+        return
+    rank, name = priority_of(node)
+    start = time.perf_counter()
+    throttled = limiter.acquire(estimate_call_tokens(prompt, max_tokens), rank)
+    record_queue_wait(model, name, time.perf_counter() - start, throttled)
+
+async def aadmit(model: str, node: Optional[str], prompt: str, max_tokens: Optional[int] = None):
+    """async version of admit"""
+    limiter = get_limiter(model)
+    if limiter is None:
+        return
+    rank, name = priority_of(node)
+    start = time.perf_counter()
+    throttled = await limiter.aacquire(estimate_call_tokens(prompt, max_tokens), rank)
+    record_queue_wait(model, name, time.perf_counter() - start, throttled)
+
+def close_scheduler():
+    """forget the limiters, the next call starts with full buckets and the current config"""
+    with _limiters_lock:
+        _limiters.clear()
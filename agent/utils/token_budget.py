@@ -0,0 +1,149 @@
+import re
+import math
+import logging
+import threading
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from ..config import Config
+
+class Section(NamedTuple):
+    text: str
+    priority: int = 0  # lower priorities are truncated first
+    truncatable: bool = True  # False for content that must reach the model whole
+    min_tokens: int = 0  # never truncated below this
+
+class PromptTooLargeError(ValueError):
+    """the parts of a prompt that cannot be cut are over the node budget, raised before any LLM call"""
+
+class FittedPrompt(NamedTuple):
+    text: str
+    report: Dict[str, Any]  # budget, tokens of the final prompt and tokens cut per section
+
+# words and single punctuation marks, most of them are one token each
+_PIECE_RE = re.compile(r'\w+|[^\w\s]')
+_encoder = None
+_encoder_lock = threading.Lock()
+_encoder_failed = False
+
+def _get_encoder():
+    """tiktoken encoding of the default model, None when tiktoken or its encoding file is unavailable"""
+    global _encoder, _encoder_failed
+    if _encoder is not None or _encoder_failed:
+        return _encoder
+    with _encoder_lock:
+        if _encoder is None and not _encoder_failed:
+            try:
+                import tiktoken
+                try:
+                    _encoder = tiktoken.encoding_for_model(Config().DEFAULT_MODEL)
+                except KeyError:
+                    _encoder = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # offline hosts cannot download the encoding, the estimate is used instead
+                _encoder_failed = True
+                logging.warning(f"tiktoken unavailable, estimating prompt tokens: {str(e).splitlines()[0]}")
+    return _encoder
+
+def _use_tiktoken() -> bool:
+    return Config().TOKEN_BUDGETS.get("TOKENIZER", "tiktoken") == "tiktoken"
+
+def estimate_tokens(text: str) -> int:
+    """
+    tokenizer free estimate, the larger of ~4 characters per token and one
+    token per word or punctuation mark, so it tends to overcount
+    """
+    return max(math.ceil(len(text) / 4), len(_PIECE_RE.findall(text)))
+
+def count_tokens(text: str) -> int:
+    encoder = _get_encoder() if _use_tiktoken() else None
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+def budget_for(node: str) -> int:
+    """prompt token budget of a node, 0 means unlimited"""
+    settings = Config().TOKEN_BUDGETS
+    return (settings.get("NODES") or {}).get(node, settings.get("DEFAULT", 0))
+
+def request_section(text: str, priority: int = 0) -> Section:
+    """the user's request, cut no further than TOKEN_BUDGETS.MIN_REQUEST_TOKENS so the model still sees it"""
+    return Section(text, priority, min_tokens=Config().TOKEN_BUDGETS.get("MIN_REQUEST_TOKENS", 256))
+
+def truncate(text: str, max_tokens: int) -> str:
+    """
+    keep the start and the end of text within max_tokens, the cut is marked in
+    the text. Deterministic: the same text and limit always give the same result
+    """
+    if max_tokens <= 0:
+        return ""
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    encoder = _get_encoder() if _use_tiktoken() else None
+    if encoder is not None:
+        tokens = encoder.encode(text, disallowed_special=())
+        marker = f"\n... [{total - max_tokens} tokens truncated] ...\n"
+        keep = max(0, max_tokens - len(encoder.encode(marker)))
+        head = keep * 2 // 3
+        return encoder.decode(tokens[:head]) + marker + encoder.decode(tokens[len(tokens) - (keep - head):] if keep > head else [])
+
+    # without a tokenizer cut by characters and shrink until the estimate fits
+    ratio = max_tokens / total
+    while True:
+        keep = int(len(text) * ratio)
+        head = keep * 2 // 3
+        marker = f"\n... [{total - max_tokens} tokens truncated] ...\n"
+        result = text[:head] + marker + text[len(text) - (keep - head):] if keep > head else text[:head] + marker
+        if count_tokens(result) <= max_tokens or keep == 0:
+            return result
+        ratio *= 0.9
+
+def fit_prompt(node: str, render: Callable[..., str], **sections: Section) -> FittedPrompt:
+    """
+    render the prompt of node from its sections and fit it into the node budget.
+    When it is too large the lowest priority sections (then the last declared)
+    are truncated first, down to their min_tokens. The fixed part of the
+    template is never cut, PromptTooLargeError is raised when it does not fit.
+    """
+    budget = budget_for(node)
+    prompt = render(**{name: section.text for name, section in sections.items()})
+    tokens = count_tokens(prompt)
+    report = {"budget": budget, "tokens": tokens, "truncated": {}}
+    if not budget or tokens <= budget:
+        return FittedPrompt(prompt, report)
+
+    texts = {name: section.text for name, section in sections.items()}
+    sizes = {name: count_tokens(text) for name, text in texts.items()}
+    overhead = count_tokens(render(**{name: "" for name in sections}))
+    fixed = overhead + sum(sizes[name] if not section.truncatable else min(sizes[name], section.min_tokens)
+                           for name, section in sections.items())
+    if fixed > budget:
+        uncut = ", ".join(f"{name} {sizes[name]}" for name, section in sections.items() if not section.truncatable)
+        raise PromptTooLargeError(
+            f"{node}: {fixed} tokens of the prompt cannot be cut ({uncut or 'template and request'}), "
+            f"the budget is {budget}. Raise TOKEN_BUDGETS.NODES.{node} or send less content")
+    excess = sum(sizes.values()) - (budget - overhead)
+    order = list(sections)
+    for name in sorted(order, key=lambda n: (sections[n].priority, -order.index(n))):
+        if excess <= 0:
+            break
+        if not sections[name].truncatable or sizes[name] <= sections[name].min_tokens:
+            continue
+        texts[name] = truncate(texts[name], max(sections[name].min_tokens, sizes[name] - excess))
+        cut = sizes[name] - count_tokens(texts[name])
+        report["truncated"][name] = cut
+        excess -= cut
+
+    prompt = render(**texts)
+    report["tokens"] = count_tokens(prompt)
+    if report["tokens"] > budget:
+        logging.warning(f"{node}: prompt is {report['tokens']} tokens after truncation, budget is {budget}")
+    else:
+        logging.info(f"{node}: prompt truncated to {report['tokens']} tokens, budget is {budget}")
+    return FittedPrompt(prompt, report)
+
+def budget_update(state: Optional[dict], node: str, report: Dict[str, Any]) -> Dict[str, Any]:
+    """state update that adds the report of node to the token_budget of the state"""
+    reports = dict((state or {}).get("token_budget") or {})
+    reports[node] = report
+    return {"token_budget": reports}
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the agent.
+
+Run modules directly, e.g. ``python -m benchmarks.llm_client``.
+"""
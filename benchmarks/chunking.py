@@ -0,0 +1,109 @@
+"""
+Timings of the edit chunking stage on multi-thousand-line files.
+
+For generated Python, JavaScript and plain text files of a few thousand
+lines, and for this repo's own sources, it reports split and select times,
+how many lines are sent instead of the whole file and how often a request
+naming one function selects the chunk holding it. The correctness checks
+(lossless cover, target selection, splice round trip) are in
+tests/test_chunking.py.
+
+    python -m benchmarks.chunking
+"""
+import os
+import time
+import random
+import argparse
+from typing import List, Tuple
+
+from agent.utils.chunking import split_chunks, select_chunks
+
+
+def python_file(functions: int, rng: random.Random) -> Tuple[str, List[str]]:
+    names = [f"handle_{rng.choice(['order', 'user', 'invoice', 'report'])}_{i}" for i in range(functions)]
+    parts = ["import os", "import json", "", "CONSTANT = 1", ""]
+    for i, name in enumerate(names):
+        if i % 10 == 0:
+            parts += ["", f"class Service{i}:", f'    """service {i}"""', "    retries = 3", ""]
+            for m in range(12):
+                parts += [f"    def method_{i}_{m}(self, value):",
+                          *[f"        value = value * {k} + {m}  # step {k}" for k in range(6)],
+                          "        return value", ""]
+        parts += ["", "@decorator" if i % 7 == 0 else "# plain function",
+                  f"def {name}(payload):",
+                  f'    """process {name.replace("_", " ")}"""',
+                  *[f"    payload['{name}_{k}'] = {k}" for k in range(rng.randint(3, 25))],
+                  "    return payload", ""]
+    return "\n".join(parts), names
+
+
+def javascript_file(functions: int, rng: random.Random) -> Tuple[str, List[str]]:
+    names = [f"render{rng.choice(['Cart', 'Profile', 'Search', 'Footer'])}{i}" for i in range(functions)]
+    parts = ["'use strict';", "const config = { retries: 3 };", ""]
+    for name in names:
+        parts += [f"/** builds {name} */",
+                  f"function {name}(props) {{",
+                  "  const items = props.items.map((item) => {",
+                  "    return { id: item.id, label: `{${item.name}}` };",
+                  "  });",
+                  *[f"  if (props.flag{k}) {{ items.push('{k}'); }} // {{ not a brace" for k in range(rng.randint(2, 20))],
+                  "  return items;",
+                  "}", ""]
+    return "\n".join(parts), names
+
+
+def text_file(sections: int, rng: random.Random) -> Tuple[str, List[str]]:
+    names = [f"Section {i} {rng.choice(['pricing', 'shipping', 'returns', 'privacy'])}" for i in range(sections)]
+    parts = []
+    for i, name in enumerate(names):
+        parts += [name, *[f"  sentence {k} about topic{i} and more words." for k in range(rng.randint(3, 15))], ""]
+    return "\n".join(parts), names
+
+
+def report(label: str, content: str, language: str, targets: List[str], queries: int, rng: random.Random):
+    start = time.perf_counter()
+    chunks = split_chunks(content, language)
+    split_ms = (time.perf_counter() - start) * 1000
+    lines = content.count("\n") + 1
+
+    found, sent, select_ms = 0, 0, 0.0
+    for target in rng.sample(targets, min(queries, len(targets))):
+        start = time.perf_counter()
+        selected = select_chunks(chunks, f"fix the bug in {target} so it handles empty input", top_k=6, max_lines=400)
+        select_ms += (time.perf_counter() - start) * 1000
+        sent += sum(chunk.end - chunk.start for chunk in selected)
+        found += any(target in c.text for c in selected)
+
+    asked = min(queries, len(targets))
+    print(f"{label:>26}: {lines:6d} lines, {len(chunks):4d} chunks, split {split_ms:7.2f} ms, "
+          f"select {select_ms / asked:6.2f} ms, sent {sent / asked:6.1f} lines per edit, "
+          f"target found {found}/{asked}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--functions", type=int, default=300, help="functions per generated file")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    for label, (content, names), language in [
+        ("generated python", python_file(args.functions, rng), "python"),
+        ("generated javascript", javascript_file(args.functions, rng), "javascript"),
+        ("generated text", text_file(args.functions, rng), None),
+    ]:
+        report(label, content, language, names, args.queries, rng)
+
+    # real sources, every def name is a target
+    root = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent")
+    sources = []
+    for folder, _, files in os.walk(root):
+        sources += [os.path.join(folder, f) for f in sorted(files) if f.endswith(".py")]
+    content = "\n".join(open(path).read() for path in sources)
+    names = sorted({chunk.name for chunk in split_chunks(content, "python") if chunk.name.isidentifier()})
+    report("agent/ sources concatenated", content, "python", names, args.queries, rng)
+
+
+if __name__ == "__main__":
+    main()
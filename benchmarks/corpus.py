@@ -0,0 +1,85 @@
+"""
+Benchmark corpus seeded from the change requests in requests.jsonl.
+
+Every request title becomes the topic of one message per intent, each intent
+has its own opening phrase so the fake model can route it without a lookup:
+
+    python -m benchmarks.corpus -o outputs/benchmarks/corpus.jsonl
+"""
+import os
+import json
+import random
+import argparse
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REQUESTS_PATH = os.path.join(ROOT, "requests.jsonl")
+
+# intent -> opening phrase, the order matters for intent_of
+TEMPLATES = {
+    "edit_code": "Update the existing python code so that it covers {topic}",
+    "generate_code": "Write python code that implements {topic}",
+    "edit_text": "Revise the existing note so that it mentions {topic}",
+    "generate_text": "Draft a short note about {topic}",
+    "question": "Quick question: what is the idea behind {topic}?",
+}
+_MARKERS = [(template.split(" {topic}")[0].split(" so that")[0], intent) for intent, template in TEMPLATES.items()]
+
+
+def intent_of(prompt: str) -> Tuple[str, str]:
+    """
+    (intent, language) of the corpus message inside a prompt, the last one
+    wins since conversation history comes before the current message
+    """
+    position, intent = max((prompt.rfind(marker), intent) for marker, intent in _MARKERS)
+    return (intent if position >= 0 else "question"), "python"
+
+
+def load_topics(path: str = REQUESTS_PATH) -> List[Tuple[str, str]]:
+    """(title, body) of every request line"""
+    topics = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                topics.append((record.get("title", ""), record.get("body", "")))
+    return topics
+
+
+def build_corpus(size: int = 200, seed: int = 7, path: str = REQUESTS_PATH) -> List[Dict[str, str]]:
+    """
+    size messages cycling through the intents, a third of them carry the
+    request body as well so prompt sizes vary like real requests
+    """
+    rng = random.Random(seed)
+    topics = load_topics(path)
+    intents = list(TEMPLATES)
+    corpus = []
+    for i in range(size):
+        title, body = rng.choice(topics)
+        intent = intents[i % len(intents)]
+        message = TEMPLATES[intent].format(topic=title[:1].lower() + title[1:])
+        if rng.random() < 1 / 3:
+            message += f"\n\nContext: {body}"
+        corpus.append({"id": f"bench-{i:04d}", "message": message, "intent": intent, "language": "python"})
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-o", "--output", default="outputs/benchmarks/corpus.jsonl")
+    parser.add_argument("--size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.size, args.seed)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        for record in corpus:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"wrote {len(corpus)} messages to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
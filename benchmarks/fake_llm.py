@@ -0,0 +1,146 @@
+"""
+Deterministic in-process stand-in for the chat model under query_llm.
+
+The fake replaces get_llm / get_async_llm, so query_llm, its JSON parsing,
+the response cache and the metrics still run as in production; only the
+network call is replaced by a sleep drawn from a latency distribution:
+
+    fixed:0.2             always 200 ms
+    uniform:0.1,0.5       between 100 and 500 ms
+    exp:0.3               exponential with a 300 ms mean
+    lognormal:-1.5,0.6    exp(normal(mu, sigma)) seconds
+
+Replies are chosen from the prompt: routing prompts get the intent of the
+corpus message they contain, edit prompts a SEARCH/REPLACE block that
+applies to the code or text the fake generated before. The block replaces
+a line with itself so it keeps applying however often the file is edited.
+"""
+import time
+import random
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from .corpus import intent_of
+
+FAKE_CODE = """def handle(items):
+    result = []
+    for item in items:
+        result.append(item * 2)
+    return result
+"""
+FAKE_TEXT = "Offline benchmark note.\nThis paragraph was written by the fake model.\nIt has three lines."
+
+
+def parse_latency(spec: str, seed: int = 7) -> Callable[[], float]:
+    """sampler of seconds for a spec like "lognormal:-1.5,0.6", see the module docstring"""
+    kind, _, raw = spec.partition(":")
+    args = [float(a) for a in raw.split(",") if a.strip()]
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def locked(draw: Callable[[], float]) -> Callable[[], float]:
+        # one seeded stream shared by every thread, same seed gives the same sequence of delays
+        def sample() -> float:
+            with lock:
+                return max(0.0, draw())
+        return sample
+
+    if kind == "fixed":
+        return lambda: args[0] if args else 0.0
+    if kind == "uniform":
+        return locked(lambda: rng.uniform(args[0], args[1]))
+    if kind == "exp":
+        return locked(lambda: rng.expovariate(1 / args[0]) if args[0] > 0 else 0.0)
+    if kind == "lognormal":
+        return locked(lambda: rng.lognormvariate(args[0], args[1]))
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def fake_reply(prompt: str) -> str:
+    """reply of the fake for a prompt, only plain substring checks so it adds microseconds"""
+    if "running summary" in prompt:
+        return "The user asked for several offline benchmark requests."
+    if '"specific_intent"' in prompt:
+        intent, language = intent_of(prompt)
+        return f'{{"specific_intent": "{intent}", "language": "{language}", "details": "fake"}}'
+    if '"intent": "question" | "generate_code"' in prompt:
+        intent, language = intent_of(prompt)
+        return f'{{"intent": "{intent}", "language": "{language}"}}'
+    if '"intent": "question" | "generation"' in prompt:
+        intent, _ = intent_of(prompt)
+        return f'{{"intent": "{"question" if intent == "question" else "generation"}", "details": "fake"}}'
+    if "<<<<<<< SEARCH" in prompt:
+        if "Existing text (" in prompt:
+            return "<<<<<<< SEARCH\nIt has three lines.\n=======\nIt has three lines.\n>>>>>>> REPLACE"
+        return "<<<<<<< SEARCH\n    return result\n=======\n    return result\n>>>>>>> REPLACE"
+    if "### CHUNK" in prompt:
+        start = prompt.index("### CHUNK")
+        return prompt[start:prompt.index("\n", start) + 1] + FAKE_CODE
+    if "Generate code based on" in prompt or "Edit the following code" in prompt:
+        return f"```python\n{FAKE_CODE}```"
+    if "direct and helpful answer" in prompt:
+        return "A short deterministic answer from the fake model."
+    return FAKE_TEXT
+
+
+class FakeChatModel:
+    """the parts of ChatOpenAI that query_llm and stream_llm use"""
+
+    def __init__(self, latency: Callable[[], float], model_name: str = "fake-model", temperature: float = 0):
+        self.latency = latency
+        self.model_name = model_name
+        self.temperature = temperature
+        self.calls = 0
+
+    def _reply(self, messages: List) -> Tuple[str, dict]:
+        self.calls += 1
+        prompt = messages[-1].content
+        reply = fake_reply(prompt)
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(reply) // 4,
+                 "total_tokens": (len(prompt) + len(reply)) // 4}
+        return reply, usage
+
+    def invoke(self, messages: List, **kwargs) -> AIMessage:
+        reply, usage = self._reply(messages)
+        time.sleep(self.latency())
+        return AIMessage(content=reply, usage_metadata=usage)
+
+    async def ainvoke(self, messages: List, **kwargs) -> AIMessage:
+        reply, usage = self._reply(messages)
+        await asyncio.sleep(self.latency())
+        return AIMessage(content=reply, usage_metadata=usage)
+
+    def stream(self, messages: List, **kwargs) -> Iterator[AIMessageChunk]:
+        reply, usage = self._reply(messages)
+        time.sleep(self.latency())
+        tokens = reply.split(" ")
+        for i, token in enumerate(tokens):
+            last = i == len(tokens) - 1
+            yield AIMessageChunk(content=token if last else token + " ", usage_metadata=usage if last else None)
+
+    async def astream(self, messages: List, **kwargs):
+        reply, usage = self._reply(messages)
+        await asyncio.sleep(self.latency())
+        tokens = reply.split(" ")
+        for i, token in enumerate(tokens):
+            last = i == len(tokens) - 1
+            yield AIMessageChunk(content=token if last else token + " ", usage_metadata=usage if last else None)
+
+
+@contextmanager
+def fake_llm(latency: str = "fixed:0", seed: int = 7, model: Optional[FakeChatModel] = None):
+    """patch agent.utils.llm to hand out the fake model, restored on exit"""
+    from agent.utils import llm as llm_module
+
+    model = model or FakeChatModel(parse_latency(latency, seed))
+    originals = (llm_module.get_llm, llm_module.get_async_llm)
+    llm_module.get_llm = lambda *args, **kwargs: model
+    llm_module.get_async_llm = lambda *args, **kwargs: model
+    try:
+        yield model
+    finally:
+        llm_module.get_llm, llm_module.get_async_llm = originals
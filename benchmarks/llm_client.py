@@ -0,0 +1,59 @@
+"""
+Per-call overhead of building a fresh ChatOpenAI versus the pooled registry.
+
+    python -m benchmarks.llm_client --calls 200
+"""
+import os
+import time
+import argparse
+import statistics
+
+from langchain_openai import ChatOpenAI
+from langchain_core.messages import HumanMessage
+
+from agent.utils.llm import get_llm, close_clients
+from .stub_server import StubServer
+
+
+def _fresh_call(base_url: str):
+    # what query_llm used to do on every call
+    llm = ChatOpenAI(model="stub-model", temperature=0, base_url=base_url)
+    return llm.invoke([HumanMessage(content="ping")])
+
+
+def _pooled_call(base_url: str):
+    return get_llm(model="stub-model", temperature=0, base_url=base_url).invoke([HumanMessage(content="ping")])
+
+
+def _measure(fn, base_url: str, calls: int) -> list:
+    fn(base_url)  # first call is not representative for either path
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn(base_url)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    with StubServer() as server:
+        results = {
+            "fresh client": _measure(_fresh_call, server.base_url, args.calls),
+            "pooled client": _measure(_pooled_call, server.base_url, args.calls),
+        }
+    close_clients()
+
+    for name, timings in results.items():
+        timings.sort()
+        print(f"{name:>14}: mean {statistics.mean(timings):7.3f} ms  "
+              f"p50 {timings[len(timings) // 2]:7.3f} ms  "
+              f"p95 {timings[int(len(timings) * 0.95)]:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
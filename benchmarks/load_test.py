@@ -0,0 +1,206 @@
+"""
+Load test of the whole agent against the OpenAI-compatible stub server.
+
+Unlike benchmarks.suite nothing is patched: ChatOpenAI talks HTTP to the
+stub through LLM_BASE_URL, so connection pooling, the openai client's own
+retries, streaming and JSON parsing are all on the measured path. The stub
+can add latency, stalls, 500 errors and 429 rate-limit responses, which
+the resilience layer of query_llm has to absorb.
+
+Concurrent sessions are ramped in stages, each session is one conversation
+thread sending corpus messages back to back with graph.ainvoke until its
+stage ends:
+
+    python -m benchmarks.load_test --stages 1,4,16 --stage-seconds 10
+    python -m benchmarks.load_test --latency exp:0.3 --error-rate 0.02 --rate-limit-rate 0.05
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8999/v1   # stub started separately
+
+Reported per stage and per graph path (question and each generation intent):
+throughput, p50/p95/p99 latency in ms and the outcomes, "ok", "misrouted"
+or the name of the exception that reached the caller.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import asyncio
+import argparse
+import platform
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .corpus import ROOT, TEMPLATES, build_corpus
+from .fake_llm import fake_reply
+from .stub_server import StubServer
+from .suite import git_revision, sandbox, summarize
+
+# (stage concurrency, path, seconds, outcome)
+Sample = Tuple[int, str, float, str]
+
+
+def _outcome(state: Dict[str, Any], expected_intent: str) -> str:
+    if state.get("intent") == expected_intent and state.get("response"):
+        return "ok"
+    return "misrouted"
+
+
+async def run_stage(manager, corpus: List[Dict[str, str]], stage: int, stage_seconds: float,
+                    stateless: bool) -> List[Sample]:
+    """starts stage sessions together and lets them run until the stage deadline"""
+    from agent.utils.state import create_initial_state
+
+    samples: List[Sample] = []
+
+    async def session(index: int, deadline: float):
+        graph, config = manager.for_thread(None if stateless else f"load-{stage}-{index}")
+        turn = index  # sessions start at different corpus offsets
+        while time.perf_counter() < deadline:
+            record = corpus[turn % len(corpus)]
+            turn += stage
+            started = time.perf_counter()
+            try:
+                state = await graph.ainvoke(create_initial_state(record["message"]), config)
+                outcome = _outcome(state, record["intent"])
+            except Exception as e:
+                outcome = type(e).__name__
+            samples.append((stage, record["intent"], time.perf_counter() - started, outcome))
+
+    deadline = time.perf_counter() + stage_seconds
+    await asyncio.gather(*(session(i, deadline) for i in range(stage)))
+    return samples
+
+
+def report(samples: List[Sample], stage_walls: Dict[int, float]) -> Dict[str, Any]:
+    """stats per stage, and per path inside each stage, with an outcome breakdown"""
+    grouped: Dict[int, Dict[str, List[Tuple[float, str]]]] = defaultdict(lambda: defaultdict(list))
+    for stage, path, seconds, outcome in samples:
+        grouped[stage][path].append((seconds, outcome))
+
+    def stats(rows: List[Tuple[float, str]], wall: float) -> Dict[str, Any]:
+        result = summarize([seconds for seconds, _ in rows], wall)
+        outcomes = Counter(outcome for _, outcome in rows)
+        result["outcomes"] = dict(outcomes)
+        result["error_rate"] = round(1 - outcomes.get("ok", 0) / len(rows), 4)
+        return result
+
+    stages = {}
+    for stage, paths in sorted(grouped.items()):
+        wall = stage_walls[stage]
+        everything = [row for rows in paths.values() for row in rows]
+        stages[str(stage)] = {
+            "sessions": stage,
+            "total": stats(everything, wall),
+            "paths": {path: stats(paths[path], wall) for path in TEMPLATES if path in paths},
+        }
+    return stages
+
+
+def print_report(stages: Dict[str, Any], stub_counts: Optional[Dict[str, int]]):
+    print(f"\n{'sessions':>8}  {'path':>14}  {'n':>5}  {'req/s':>8}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}  outcomes")
+    for stage in stages.values():
+        rows = [("all", stage["total"])] + list(stage["paths"].items())
+        for path, result in rows:
+            outcomes = ", ".join(f"{k} {v}" for k, v in sorted(result["outcomes"].items()))
+            print(f"{stage['sessions']:>8}  {path:>14}  {result['n']:5d}  {result['ops_per_s']:8.2f}  "
+                  f"{result['p50_ms']:9.1f}  {result['p95_ms']:9.1f}  {result['p99_ms']:9.1f}  {outcomes}")
+    if stub_counts is not None:
+        print(f"\nstub responses: {stub_counts}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_test", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", default="outputs/benchmarks/load_test.json")
+    parser.add_argument("--stages", default="1,4,16", help="concurrent sessions per stage, comma separated")
+    parser.add_argument("--stage-seconds", type=float, default=10.0)
+    parser.add_argument("--base-url", default=None, help="use a running server instead of starting the stub")
+    parser.add_argument("--latency", default="fixed:0", help="stub latency distribution, see benchmarks.fake_llm")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="stub seconds per generated token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of stub requests answered with a 429")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share of stub requests that stall")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--stream", action="store_true", help="stream the responses like the CLI does")
+    parser.add_argument("--stateless", action="store_true", help="no conversation threads, every request is one turn")
+    parser.add_argument("--corpus-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--config", default=os.path.join(ROOT, "configs.yaml"))
+    args = parser.parse_args(argv)
+
+    stages = [int(s) for s in args.stages.split(",") if s.strip()]
+    output = os.path.abspath(args.output)
+    os.environ.setdefault("OPENAI_API_KEY", "offline-load-test")
+    corpus = build_corpus(args.corpus_size, args.seed)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+
+    stub = None
+    if args.base_url is None:
+        stub = StubServer(latency=args.latency, token_latency=args.token_latency, reply_for=fake_reply,
+                          error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, stall_rate=args.stall_rate,
+                          stall_seconds=args.stall_seconds, seed=args.seed)
+        stub.__enter__()
+    base_url = args.base_url or stub.base_url
+
+    try:
+        with sandbox(args.config, LLM_BASE_URL=base_url, STREAM_OUTPUT=args.stream):
+            from agent.config import Config
+            from agent.helper import GraphManager
+            from agent.utils.state import create_initial_state
+            from agent.utils import output_manager
+
+            output_manager.console.quiet = True
+            with GraphManager(Config()) as manager:
+                # the edit paths need a generated file to patch
+                for intent in ("generate_code", "generate_text"):
+                    record = next(r for r in corpus if r["intent"] == intent)
+                    try:
+                        manager.graph.invoke(create_initial_state(record["message"]))
+                    except Exception as e:
+                        print(f"warmup {intent} failed: {type(e).__name__}")
+                if stub:
+                    warmup_counts = stub.counts
+
+                stage_walls: Dict[int, float] = {}
+
+                async def ramp():
+                    samples = []
+                    for stage in stages:
+                        started = time.perf_counter()
+                        samples += await run_stage(manager, corpus, stage, args.stage_seconds, args.stateless)
+                        stage_walls[stage] = time.perf_counter() - started
+                    return samples
+
+                samples = asyncio.run(ramp())
+    finally:
+        if stub:
+            stub.__exit__(None, None, None)
+
+    stub_counts = None
+    if stub:
+        stub_counts = {k: v - warmup_counts.get(k, 0) for k, v in stub.counts.items()}
+    stage_reports = report(samples, stage_walls)
+    print_report(stage_reports, stub_counts)
+
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "stub_responses": stub_counts,
+        "stages": stage_reports,
+    }
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nresults written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
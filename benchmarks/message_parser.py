@@ -0,0 +1,181 @@
+"""
+Micro-benchmark and equivalence check of the single pass message parser.
+
+parse_message replaced detect_language_from_message / extract_output_file,
+which ran up to 19 separate case-insensitive searches. The original
+functions are kept here as the reference: the benchmark first checks both
+give the same language and output file on a seeded corpus, then times
+them on small and ~1 MB inputs.
+
+    python -m benchmarks.message_parser
+"""
+import re
+import time
+import random
+import argparse
+from typing import List, Optional
+
+from agent.utils import llm as llm_module
+from agent.utils.message_parser import parse_message
+
+
+# reference implementations, as they were before parse_message
+
+def legacy_detect_language(message: str) -> Optional[str]:
+    # Check for explicit language mentions
+    language_patterns = {
+        r'\b(?:in|using|with)\s+python\b': 'python',
+        r'\b(?:in|using|with)\s+javascript\b': 'javascript',
+        r'\b(?:in|using|with)\s+js\b': 'javascript',
+        r'\b(?:in|using|with)\s+java\b': 'java',
+        r'\b(?:in|using|with)\s+c\+\+\b': 'cpp',
+        r'\b(?:in|using|with)\s+c#\b': 'csharp',
+        r'\b(?:in|using|with)\s+go\b': 'go',
+        r'\b(?:in|using|with)\s+rust\b': 'rust',
+        r'\b(?:in|using|with)\s+typescript\b': 'typescript',
+        r'\b(?:in|using|with)\s+ruby\b': 'ruby',
+        r'\b(?:in|using|with)\s+php\b': 'php',
+        r'\b(?:in|using|with)\s+swift\b': 'swift',
+        r'\b(?:in|using|with)\s+kotlin\b': 'kotlin',
+        r'\b(?:in|using|with)\s+scala\b': 'scala',
+    }
+    
+    for pattern, lang in language_patterns.items():
+        if re.search(pattern, message, re.IGNORECASE):
+            return lang
+    
+    code_block_pattern = r'```([a-zA-Z0-9_+#]+)[\s\n]'
+    code_blocks = re.findall(code_block_pattern, message)
+    if code_blocks:
+        lang = code_blocks[0].lower()
+        # Map some common abbreviations
+        lang_map = {
+            'py': 'python',
+            'js': 'javascript',
+            'ts': 'typescript',
+            'rb': 'ruby',
+            'cs': 'csharp',
+        }
+        return lang_map.get(lang, lang)
+    
+    # Check for file extensions
+    file_ext_pattern = r'\b\w+\.(py|js|java|cpp|cs|go|rs|ts|rb|php|swift|kt|scala)\b'
+    file_exts = re.findall(file_ext_pattern, message)
+    if file_exts:
+        ext = file_exts[0].lower()
+        ext_map = {
+            'py': 'python',
+            'js': 'javascript',
+            'java': 'java',
+            'cpp': 'cpp',
+            'cs': 'csharp',
+            'go': 'go',
+            'rs': 'rust',
+            'ts': 'typescript',
+            'rb': 'ruby',
+            'php': 'php',
+            'swift': 'swift',
+            'kt': 'kotlin',
+            'scala': 'scala',
+        }
+        return ext_map.get(ext)
+    
+    return None
+
+def legacy_extract_output_file(message: str) -> Optional[str]:
+    # Patterns that might indicate output files
+    output_patterns = [
+        r'(?:save|output|write|export|store)(?:\s+(?:it|this|the\s+(?:result|code|output)))?\s+(?:to|in|as|in\s+file|to\s+file|as\s+file)\s+[\'"]?([a-zA-Z0-9_\-\.\/\\]+\.[a-zA-Z0-9]+)[\'"]?',
+        r'output\s+file\s*(?:is|should\s+be|:)?\s+[\'"]?([a-zA-Z0-9_\-\.\/\\]+\.[a-zA-Z0-9]+)[\'"]?',
+        r'filename\s*(?:is|should\s+be|:)?\s+[\'"]?([a-zA-Z0-9_\-\.\/\\]+\.[a-zA-Z0-9]+)[\'"]?'
+    ]
+    
+    for pattern in output_patterns:
+        match = re.search(pattern, message, re.IGNORECASE)
+        if match:
+            return match.group(1).strip()
+    
+    return None
+
+
+FRAGMENTS = [
+    "in python", "In Python", "using JavaScript", "with js", "in java", "using javascripts",
+    "in c++", "in c++11", "with c#", "using c#7", "in go", "in golang", "using rust",
+    "with typescript", "in ruby", "using php", "in swift", "with kotlin", "in scala",
+    "```python\n", "```py ", "```js\n", "```\n", "```ts\nconst x = 1\n```", "````rb\n",
+    "main.py", "App.java", "lib.rs", "Main.PY", "index.ts", "server.go", "x.cpp", "y.cs",
+    "save to loop.c", "save it to 'out.py'", "write the code to src/app.js", "resave to a.txt",
+    "export as file report.md", "store this in notes.txt", "output file is result.json",
+    "output file: data.csv", "filename should be hello.rb", "filename: x", "output to",
+    "create a C loop that counts from 1 to 10", "What is DNA?", "fix the bug", "\n", "  ",
+    "def greet(name):", "print(greet('Bob'))", "os.path.join", "module.exports", ".py", "save in python.py",
+    "SAVE TO OUT.PY", "Using Go", "ünïcode in Python", "ſave to x.py", "İn java", "naïve.py", "WITH C#9",
+]
+
+
+def build_corpus(size: int = 5000, seed: int = 7, extra: Optional[List[str]] = None) -> List[str]:
+    """seeded random combinations of fragments that exercise every pattern and their overlaps"""
+    rng = random.Random(seed)
+    corpus = list(FRAGMENTS) + list(extra or [])
+    for _ in range(size):
+        parts = rng.choices(FRAGMENTS, k=rng.randint(1, 8))
+        corpus.append(rng.choice([" ", "", "\n"]).join(parts))
+    return corpus
+
+
+def check_equivalence(corpus: List[str]) -> int:
+    """number of messages where parse_message disagrees with the legacy functions"""
+    mismatches = 0
+    for message in corpus:
+        parsed = parse_message(message)
+        expected = (legacy_detect_language(message), legacy_extract_output_file(message))
+        if (parsed.language, parsed.output_file) != expected:
+            mismatches += 1
+            print(f"MISMATCH {message!r}: {(parsed.language, parsed.output_file)} != {expected}")
+    return mismatches
+
+
+def _time(fn, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def _legacy(text: str):
+    return legacy_detect_language(text), legacy_extract_output_file(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus-size", type=int, default=5000)
+    parser.add_argument("--requests", default=None, help="optional JSONL file whose lines are added to the corpus")
+    args = parser.parse_args()
+
+    extra = []
+    if args.requests:
+        with open(args.requests) as f:
+            extra = [line for line in f if line.strip()]
+    corpus = build_corpus(args.corpus_size, extra=extra)
+    mismatches = check_equivalence(corpus)
+    print(f"equivalence: {len(corpus) - mismatches}/{len(corpus)} messages match")
+
+    small = "create a C loop that counts from 1 to 10 in python and save in loop.c"
+    # a pasted source file without any hint is the worst case for the legacy chain,
+    # a hint at the very start is its best case (early exit)
+    with open(llm_module.__file__) as f:
+        source = f.read()
+    pasted = (source * (1_000_000 // len(source) + 1))[:1_000_000]
+    inputs = [
+        ("small", small, 5000),
+        ("1 MB pasted code", pasted, 3),
+        ("1 MB, hint first", "fix this in python and save to fixed.py\n" + pasted, 3),
+    ]
+    for name, text, repeat in inputs:
+        print(f"{name:>18}: legacy {_time(_legacy, text, repeat):9.3f} ms  "
+              f"parse_message {_time(parse_message, text, repeat):9.3f} ms")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
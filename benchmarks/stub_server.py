@@ -0,0 +1,246 @@
+"""
+Minimal OpenAI-compatible stand-in server for benchmarks and load tests.
+
+Answers /v1/chat/completions (plain and streamed) and /v1/models so client
+overhead and capacity can be measured without the real API. Latency can be
+a fixed number of seconds or a distribution spec of benchmarks.fake_llm,
+a share of requests can be answered with injected 500 errors or 429
+rate-limit responses, and a share can stall for a long time before they
+are answered:
+
+    python -m benchmarks.stub_server --port 8999 --latency lognormal:-1.5,0.6 \\
+        --error-rate 0.01 --rate-limit-rate 0.02 --stall-rate 0.01 --stall-seconds 30
+
+With --fake-replies the reply is picked from the prompt like the in-process
+fake does, so the graph takes its real routes.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Union
+
+from .fake_llm import fake_reply, parse_latency
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+    reply = "stub reply"
+    reply_for: Optional[Callable[[str], str]] = None  # prompt -> reply, overrides reply
+    latency: Callable[[], float] = staticmethod(lambda: 0.0)
+    token_latency = 0.0
+    error_rate = 0.0
+    rate_limit_rate = 0.0
+    retry_after_ms = 200
+    stall_rate = 0.0
+    stall_seconds = 30.0
+    rng = random.Random(7)
+    counts: Counter = Counter()  # ok / stream / client_closed / error / rate_limited / stalled, per server
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading: an early exit of query_llm_fields, a timeout, a lost hedge
+            self._count("client_closed")
+
+    def _send_json(self, payload: dict, status: int = 200, headers: Optional[dict] = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, outcome: str):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "stub-model", "object": "model"}]})
+        else:
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.lock:
+            draw = self.rng.random()
+        if draw < self.rate_limit_rate:
+            # answered right away, like the real API
+            self._count("rate_limited")
+            self._send_json({"error": {"message": "Rate limit reached (injected)", "type": "requests",
+                                       "code": "rate_limit_exceeded"}},
+                            status=429, headers={"retry-after-ms": str(self.retry_after_ms)})
+            return
+        delay = self.latency()
+        if self.rate_limit_rate + self.error_rate <= draw < self.rate_limit_rate + self.error_rate + self.stall_rate:
+            # answered normally, but only after the stall
+            self._count("stalled")
+            delay += self.stall_seconds
+        if delay:
+            time.sleep(delay)
+        if draw < self.rate_limit_rate + self.error_rate:
+            self._count("error")
+            self._send_json({"error": {"message": "Injected server error", "type": "server_error"}}, status=500)
+            return
+
+        messages = request.get("messages") or [{}]
+        content = self.reply_for(messages[-1].get("content", "")) if self.reply_for else self.reply
+        finish_reason = "stop"
+        # newer clients send max_tokens as max_completion_tokens
+        max_tokens = request.get("max_completion_tokens") or request.get("max_tokens")
+        if max_tokens and len(content.split(" ")) > max_tokens:
+            # cut like the real API, one whitespace separated token per token
+            content = " ".join(content.split(" ")[:max_tokens])
+            finish_reason = "length"
+        if request.get("stream"):
+            self._stream_reply(request, content, finish_reason)
+            self._count("stream")
+            return
+        if self.token_latency:
+            # the whole generation happens before a non streamed reply is sent
+            time.sleep(self.token_latency * len(content.split(" ")))
+        self._count("ok")
+        self._send_json({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason,
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    def _stream_reply(self, request: dict, content: str, finish_reason: str = "stop"):
+        """chat.completion.chunk events over SSE, one per whitespace separated token"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(delta: dict, finish_reason=None):
+            payload = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub-model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self._write_chunk(f"data: {json.dumps(payload)}\n\n")
+
+        chunk({"role": "assistant", "content": ""})
+        for i, token in enumerate(content.split(" ")):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            chunk({"content": token if i == 0 else " " + token})
+        chunk({}, finish_reason=finish_reason)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: str):
+        body = data.encode()
+        self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # benchmarks open many connections at once
+
+
+class StubServer:
+    """Runs the stub in a background thread, usable as a context manager."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: Union[float, str] = 0.0,
+                 reply: Optional[str] = None, token_latency: float = 0.0,
+                 reply_for: Optional[Callable[[str], str]] = None, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after_ms: int = 200, stall_rate: float = 0.0,
+                 stall_seconds: float = 30.0, seed: int = 7):
+        sampler = parse_latency(latency, seed) if isinstance(latency, str) else (lambda: latency)
+        handler = type("Handler", (StubHandler,), {
+            "latency": staticmethod(sampler),
+            "token_latency": token_latency,
+            "reply": reply or StubHandler.reply,
+            "reply_for": staticmethod(reply_for) if reply_for else None,
+            "error_rate": error_rate,
+            "rate_limit_rate": rate_limit_rate,
+            "retry_after_ms": retry_after_ms,
+            "stall_rate": stall_rate,
+            "stall_seconds": stall_seconds,
+            "rng": random.Random(seed),
+            "counts": Counter(),
+            "lock": threading.Lock(),
+        })
+        self.handler = handler
+        self.httpd = _Server((host, port), handler)
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def counts(self) -> dict:
+        """responses sent so far by outcome"""
+        with self.handler.lock:
+            return dict(self.handler.counts)
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stub_server", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--latency", default="fixed:0", help="seconds per request, e.g. fixed:0.2 or exp:0.3")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per generated token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--retry-after-ms", type=int, default=200)
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share of requests answered only after --stall-seconds")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--fake-replies", action="store_true", help="reply like benchmarks.fake_llm instead of a fixed text")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    server = StubServer(args.host, args.port, latency=args.latency, token_latency=args.token_latency,
+                        reply_for=fake_reply if args.fake_replies else None, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate, retry_after_ms=args.retry_after_ms,
+                        stall_rate=args.stall_rate, stall_seconds=args.stall_seconds, seed=args.seed)
+    with server:
+        print(f"stub serving {server.base_url}, Ctrl+C to stop")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+    print(f"responses: {server.counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Offline benchmark suite, no network and no API key needed.
+
+The chat model under query_llm is replaced by the deterministic fake of
+benchmarks.fake_llm, so the numbers are the framework overhead plus the
+latency distribution asked for. Runs in a temporary folder with a copy of
+configs.yaml, output files never touch the repo.
+
+    python -m benchmarks.suite                                # zero latency, framework overhead only
+    python -m benchmarks.suite --latency lognormal:-1.5,0.6 -c 8
+    python -m benchmarks.suite -o new.json --compare outputs/benchmarks/results.json
+
+Micro benchmarks: create_initial_state, extract_code_from_markdown, JSON
+parsing in query_llm, FileUtils writes and OutputManager rendering.
+End to end: graph.invoke on a thread pool and graph.ainvoke on one event
+loop over a corpus seeded from requests.jsonl.
+
+Results are written as JSON (one entry per benchmark with n, mean, p50, p95,
+p99 in ms and ops/s). With --compare the p50 of every benchmark is checked
+against an earlier results file and the exit code is 1 when one regressed
+by more than --tolerance.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import yaml
+
+from .corpus import ROOT, build_corpus
+from .fake_llm import FAKE_CODE, FAKE_TEXT, FakeChatModel, fake_llm, fake_reply, parse_latency
+
+
+def summarize(timings: List[float], wall: Optional[float] = None) -> Dict[str, float]:
+    """stats in ms of per-call timings in seconds, ops/s from wall time when calls overlapped"""
+    ordered = sorted(timings)
+    n = len(ordered)
+    total = wall if wall is not None else sum(ordered)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(n - 1, int(q * n))] * 1000, 4)
+
+    return {
+        "n": n,
+        "mean_ms": round(sum(ordered) / n * 1000, 4),
+        "p50_ms": pick(0.5),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "ops_per_s": round(n / total, 2) if total else None,
+    }
+
+
+def time_calls(fn: Callable[[Any], Any], inputs: List[Any], repeat: int) -> Dict[str, float]:
+    for item in inputs[:5]:
+        fn(item)  # warm caches and lazy imports
+    timings = []
+    for i in range(repeat):
+        item = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        fn(item)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+@contextmanager
+def sandbox(config_path: str, **overrides: Any) -> Iterator[str]:
+    """
+    temporary working folder with a copy of configs.yaml, the warmup request
+    and live rendering are switched off since nothing is listening,
+    overrides replace further top level keys
+    """
+    folder = tempfile.mkdtemp(prefix="agent-bench-")
+    with open(config_path) as f:
+        configs = yaml.safe_load(f)
+    configs.update(LLM_WARMUP=False, STREAM_OUTPUT=False, CONFIG_RELOAD_INTERVAL=0)
+    configs.update(overrides)
+    with open(os.path.join(folder, "configs.yaml"), "w") as f:
+        yaml.safe_dump(configs, f)
+    previous = os.getcwd()
+    os.chdir(folder)
+    try:
+        yield folder
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def micro_benchmarks(corpus: List[Dict[str, str]], repeat: int) -> Dict[str, Dict[str, float]]:
+    from agent.utils.state import create_initial_state
+    from agent.utils.llm import extract_code_from_markdown, parse_json_content, query_llm
+    from agent.utils.file_utils import FileUtils
+    from agent.utils.file_writer import atomic_write, flush_file_writer
+    from agent.utils import output_manager
+    from agent.utils.output_manager import OutputManager
+    from rich.console import Console
+
+    messages = [record["message"] for record in corpus]
+    results = {}
+    results["create_initial_state"] = time_calls(create_initial_state, messages, repeat)
+
+    big_code = "\n".join(FAKE_CODE.replace("handle", f"handle_{i}") for i in range(200))
+    replies = [f"```python\n{FAKE_CODE}```", f"Here it is:\n```python\n{big_code}```\nDone.", FAKE_CODE]
+    results["extract_code_from_markdown"] = time_calls(lambda r: extract_code_from_markdown(r, "python"), replies, repeat)
+
+    json_replies = [fake_reply(f'"specific_intent" {m}') for m in messages[:20]]
+    json_replies += [f"```json\n{r}\n```" for r in json_replies[:10]]
+    results["parse_json_content"] = time_calls(parse_json_content, json_replies, repeat)
+
+    with fake_llm("fixed:0"):
+        prompts = [f'"specific_intent"\n{m}' for m in messages[:20]]
+        results["query_llm_json"] = time_calls(lambda p: query_llm(p, parse_json=True, node="classify_intent"),
+                                               prompts, repeat)
+
+    contents = [FAKE_CODE, big_code, FAKE_TEXT]
+    writes = [(os.path.join("outputs", "bench", f"atomic_{i % 20}.py"), contents[i % len(contents)]) for i in range(60)]
+    results["atomic_write"] = time_calls(lambda w: atomic_write(*w), writes, repeat)
+    # with FILE_WRITER.WRITE_BEHIND this is the cost on the request path, the disk write is behind it
+    results["file_utils_write"] = time_calls(
+        lambda i: FileUtils.write_to_file(f"outputs/bench/utils_{i % 20}.py", contents[i % len(contents)], is_code=True),
+        list(range(60)), repeat)
+    flush_file_writer()
+
+    states = [
+        {"intent": "question", "response": "A short answer.\n\n- one\n- two", "streamed": False},
+        {"intent": "generate_code", "response": "Generated python code", "source_code": big_code,
+         "language": "python", "output_file": "outputs/code/output.py", "streamed": False},
+        {"intent": "generate_text", "response": "Generated text", "source_text": FAKE_TEXT * 20,
+         "output_file": "outputs/text/output.txt", "streamed": False},
+    ]
+    original = output_manager.console
+    output_manager.console = Console(file=io.StringIO(), width=120, force_terminal=False, color_system=None)
+    try:
+        def render(state):
+            OutputManager.display_response(state)
+            output_manager.console.file = io.StringIO()
+        results["output_manager_render"] = time_calls(render, states, max(30, repeat // 20))
+    finally:
+        output_manager.console = original
+    return results
+
+
+def _state_checks(state: Dict[str, Any], expected_intent: str) -> bool:
+    return state.get("intent") == expected_intent and bool(state.get("response"))
+
+
+def graph_benchmarks(corpus: List[Dict[str, str]], requests: int, concurrency: int, latency: str, seed: int) -> Dict[str, Dict[str, float]]:
+    from agent.config import Config
+    from agent.helper import GraphManager
+    from agent.utils.state import create_initial_state
+    from agent.utils import output_manager
+
+    output_manager.console.quiet = True
+    results = {}
+    records = [corpus[i % len(corpus)] for i in range(requests)]
+    model = FakeChatModel(parse_latency(latency, seed))
+    with fake_llm(model=model), GraphManager(Config()) as manager:
+        # ordering matters for the edit paths, generate once so there is a file to patch
+        for record in corpus[:len(set(r["intent"] for r in corpus))]:
+            manager.graph.invoke(create_initial_state(record["message"]))
+
+        def run(record):
+            start = time.perf_counter()
+            state = manager.graph.invoke(create_initial_state(record["message"]))
+            return time.perf_counter() - start, _state_checks(state, record["intent"])
+
+        calls_before = model.calls
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(run, records))
+        wall = time.perf_counter() - start
+        results["graph_invoke"] = summarize([t for t, _ in outcomes], wall)
+        results["graph_invoke"].update(concurrency=concurrency, misrouted=sum(1 for _, ok in outcomes if not ok),
+                                       llm_calls_per_request=round((model.calls - calls_before) / len(records), 3))
+
+        async def run_async():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(record):
+                async with semaphore:
+                    started = time.perf_counter()
+                    state = await manager.graph.ainvoke(create_initial_state(record["message"]))
+                    return time.perf_counter() - started, _state_checks(state, record["intent"])
+
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(one(record) for record in records))
+            return outcomes, time.perf_counter() - started
+
+        outcomes, wall = asyncio.run(run_async())
+        results["graph_ainvoke"] = summarize([t for t, _ in outcomes], wall)
+        results["graph_ainvoke"].update(concurrency=concurrency, misrouted=sum(1 for _, ok in outcomes if not ok))
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> int:
+    """print p50 changes against baseline, the number of regressions over tolerance"""
+    regressions = 0
+    print(f"\n{'benchmark':>28}  {'baseline p50':>12}  {'current p50':>12}  change")
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before or not before.get("p50_ms"):
+            print(f"{name:>28}  {'-':>12}  {result['p50_ms']:12.4f}  new")
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1
+        flag = ""
+        if change > tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:>28}  {before['p50_ms']:12.4f}  {result['p50_ms']:12.4f}  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", default="outputs/benchmarks/results.json")
+    parser.add_argument("--compare", default=None, metavar="RESULTS", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown, 0.2 is 20%%")
+    parser.add_argument("--latency", default="fixed:0", help="fake LLM latency distribution, see benchmarks.fake_llm")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="graph runs per end to end benchmark")
+    parser.add_argument("--repeat", type=int, default=2000, help="calls per micro benchmark")
+    parser.add_argument("--corpus-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--config", default=os.path.join(ROOT, "configs.yaml"))
+    parser.add_argument("--skip-graph", action="store_true", help="micro benchmarks only")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    corpus = build_corpus(args.corpus_size, args.seed)
+
+    with sandbox(args.config):
+        results = micro_benchmarks(corpus, args.repeat)
+        if not args.skip_graph:
+            results.update(graph_benchmarks(corpus, args.requests, args.concurrency, args.latency, args.seed))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    for name, result in results.items():
+        print(f"{name:>28}: n {result['n']:5d}  mean {result['mean_ms']:9.4f} ms  p50 {result['p50_ms']:9.4f} ms  "
+              f"p95 {result['p95_ms']:9.4f} ms  p99 {result['p99_ms']:9.4f} ms  {result['ops_per_s']} ops/s")
+
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{regressions} benchmarks regressed by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,4 +5,10 @@ SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 export PYTHONPATH="$SCRIPT_DIR:$PYTHONPATH"
 
 
-python -c "from agent.main import main; main()"
\ No newline at end of file
+# "./run.sh server" starts the HTTP service, anything else the interactive prompt
+if [ "$1" == "server" ]; then
+    shift
+    python -m agent.server "$@"
+else
+    python -m agent "$@"
+fi
\ No newline at end of file
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from benchmarks.corpus import ROOT
+from benchmarks.suite import sandbox
+
+
+@pytest.fixture(scope="session", autouse=True)
+def agent_sandbox():
+    """
+    temporary working folder with its own configs.yaml and outputs. Config
+    is loaded once per process, so every test runs against this copy
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "offline-tests")
+    with sandbox(os.path.join(ROOT, "configs.yaml"), MEMORY={"ENABLED": False}) as folder:
+        yield folder
+
+
+@pytest.fixture
+def configure(agent_sandbox):
+    """
+    configure(**overrides) rewrites top level keys of the sandbox configs.yaml
+    and reloads Config, the file is restored after the test
+    """
+    import yaml
+    from agent.config import Config
+
+    path = os.path.join(agent_sandbox, "configs.yaml")
+    with open(path) as f:
+        original = f.read()
+
+    configs = yaml.safe_load(original)
+
+    def apply(**overrides):
+        # calls in one test add up
+        configs.update(overrides)
+        with open(path, "w") as f:
+            yaml.safe_dump(configs, f)
+        return Config.reload()
+
+    yield apply
+    with open(path, "w") as f:
+        f.write(original)
+    Config.reload()
@@ -0,0 +1,46 @@
+import time
+import asyncio
+
+import pytest
+
+from benchmarks.fake_llm import fake_llm
+
+LATENCY = 0.2
+CONCURRENCY = 8
+QUESTION = "What is DNA?"
+
+
+@pytest.fixture(scope="module")
+def manager():
+    from agent.config import Config
+    from agent.helper import GraphManager
+    from agent.utils import output_manager
+
+    output_manager.console.quiet = True
+    with fake_llm(f"fixed:{LATENCY}"), GraphManager(Config()) as manager:
+        yield manager
+
+
+def test_concurrent_ainvoke_calls_overlap(manager):
+    from agent.utils.state import create_initial_state
+
+    async def one():
+        return await manager.graph.ainvoke(create_initial_state(QUESTION))
+
+    async def many():
+        return await asyncio.gather(*(one() for _ in range(CONCURRENCY)))
+
+    start = time.perf_counter()
+    solo = asyncio.run(one())
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    states = asyncio.run(many())
+    concurrent = time.perf_counter() - start
+
+    assert solo["response"]
+    assert all(state["intent"] == "question" and state["response"] for state in states)
+    # a question is two LLM round trips, each run waits on the fake on its own
+    assert single >= 2 * LATENCY
+    # overlapping runs take about as long as one, serialized ones would take CONCURRENCY times as long
+    assert concurrent < 2 * single, f"{CONCURRENCY} runs took {concurrent:.2f}s, one took {single:.2f}s"
@@ -0,0 +1,116 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from agent.utils import cache as cache_module
+from agent.utils.cache import ResponseCache
+
+TTL = 60
+VALUE = {"intent": "question", "details": "x" * 80}
+
+
+class Clock:
+    """wall clock that only moves when the test advances it"""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def open_cache(tmp_path, clock):
+    opened = []
+
+    def open_cache(**settings) -> ResponseCache:
+        settings = {"default_ttl": TTL, **settings}
+        opened.append(ResponseCache(os.path.join(tmp_path, "cache", "llm.sqlite"), **settings))
+        return opened[-1]
+
+    yield open_cache
+    for cache in opened:
+        cache.close()
+
+
+def row_size() -> int:
+    return len(json.dumps(VALUE).encode("utf-8"))
+
+
+def test_sqlite_runs_in_wal_mode_and_survives_a_restart(open_cache):
+    cache = open_cache()
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    cache.set("key", VALUE, "node")
+    # a reader on another connection sees the committed row while the writer stays open
+    reader = sqlite3.connect(cache.path)
+    assert reader.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 1
+    reader.close()
+    cache.close()
+
+    restarted = open_cache()
+    assert restarted.get("key") == VALUE
+    assert restarted.counters["disk_hits"] == 1 and restarted.stats()["disk_bytes"] == row_size()
+
+
+def test_memory_tier_evicts_the_least_recently_used(open_cache):
+    cache = open_cache(memory_max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert list(cache._memory) == ["a", "c"]
+    # evicted from memory only, the disk tier still has it and promotes it back
+    assert cache.get("b") == 2
+    assert cache.counters["memory_hits"] == 1 and cache.counters["disk_hits"] == 1
+    assert list(cache._memory) == ["c", "b"]
+
+
+def test_disk_tier_evicts_the_least_recently_accessed(open_cache, clock):
+    cache = open_cache(disk_max_bytes=3 * row_size())
+    for key in ("a", "b", "c"):
+        cache.set(key, VALUE)
+        clock.now += 1
+    cache._memory.clear()
+    # read from disk, "a" is now the most recent row
+    assert cache.get("a") == VALUE
+    clock.now += 1
+    cache.set("d", VALUE)
+    keys = {row[0] for row in cache._db.execute("SELECT key FROM llm_cache")}
+    assert keys == {"a", "c", "d"} and cache.counters["evictions"] == 1
+    assert cache.stats()["disk_bytes"] <= 3 * row_size()
+
+
+def test_entries_expire_in_both_tiers(open_cache, clock):
+    cache = open_cache(node_ttls={"short": 10})
+    cache.set("short", VALUE, "short")
+    cache.set("default", VALUE)
+    clock.now += 10
+    assert cache.get("short") is None and "short" not in cache._memory
+    assert cache.get("default") == VALUE
+    clock.now += TTL
+    cache._memory.clear()
+    assert cache.get("default") is None
+    # expired rows are dropped when the cache is opened again
+    cache.close()
+    assert open_cache()._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 0
+
+
+def test_what_is_cached(open_cache):
+    cache = open_cache(default_ttl=0, node_ttls={"classify_intent": TTL})
+    assert cache.is_cacheable("classify_intent", 0)
+    assert not cache.is_cacheable("classify_intent", 0.7) and not cache.is_cacheable("generate_code", 0)
+    cache.set("key", VALUE, "generate_code")
+    assert cache.get("key") is None
+
+    uncapped = ResponseCache.make_key("m", 0, "p", True)
+    assert ResponseCache.make_key("m", 0, "p", True, max_tokens=None, stop=None) == uncapped
+    assert ResponseCache.make_key("m", 0, "p", True, max_tokens=60) != uncapped
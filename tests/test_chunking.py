@@ -0,0 +1,72 @@
+import os
+import random
+
+import pytest
+
+from agent.utils.chunking import split_chunks, select_chunks, splice_chunks, render_chunks, parse_chunk_reply
+from benchmarks.chunking import python_file, javascript_file, text_file
+from benchmarks.corpus import ROOT
+
+FUNCTIONS = 300
+QUERIES = 50
+
+
+def agent_sources():
+    # real sources, every def name is a target
+    sources = []
+    for folder, _, files in os.walk(os.path.join(ROOT, "agent")):
+        sources += [os.path.join(folder, f) for f in sorted(files) if f.endswith(".py")]
+    content = "\n".join(open(path).read() for path in sources)
+    names = sorted({chunk.name for chunk in split_chunks(content, "python") if chunk.name.isidentifier()})
+    return content, names
+
+
+@pytest.fixture(scope="module", params=["python", "javascript", "text", "agent sources"])
+def source(request):
+    rng = random.Random(7)
+    if request.param == "python":
+        return python_file(FUNCTIONS, rng) + ("python",)
+    if request.param == "javascript":
+        return javascript_file(FUNCTIONS, rng) + ("javascript",)
+    if request.param == "text":
+        return text_file(FUNCTIONS, rng) + (None,)
+    return agent_sources() + ("python",)
+
+
+def test_chunks_cover_every_line_once(source):
+    content, _, language = source
+    chunks = split_chunks(content, language)
+    assert content.count("\n") + 1 >= 2000
+    assert "\n".join(chunk.text for chunk in chunks) == content
+    assert chunks[0].start == 0 and chunks[-1].end == content.count("\n") + 1
+    assert all(a.end == b.start for a, b in zip(chunks, chunks[1:]))
+
+
+def test_request_selects_target_and_splice_changes_only_it(source):
+    content, names, language = source
+    chunks = split_chunks(content, language)
+    file_lines = content.split("\n")
+    targets = random.Random(7).sample(names, min(QUERIES, len(names)))
+    found = 0
+    for target in targets:
+        selected = select_chunks(chunks, f"fix the bug in {target} so it handles empty input", top_k=6, max_lines=400)
+        assert len(selected) == 1 or sum(chunk.end - chunk.start for chunk in selected) <= 400
+        holder = next((c for c in selected if target in c.text), None)
+        if holder is None:
+            continue
+        found += 1
+        new_text = holder.text.replace(target, target + "_fixed", 1)
+        edited = splice_chunks(content, selected, {holder.index: new_text})
+        assert edited == "\n".join(file_lines[:holder.start] + new_text.split("\n") + file_lines[holder.end:])
+    assert found >= len(targets) * 0.9, f"target chunk selected for only {found}/{len(targets)} requests"
+
+
+def test_reply_round_trip_keeps_inner_fences():
+    content = "\n".join(["# Notes", "", "intro", "", "```python", "x = 1", "```", "", "# End", "", "bye"])
+    chunks = split_chunks(content, None)
+    assert any("```" in chunk.text for chunk in chunks)
+    reply = "\n".join(f"### CHUNK {chunk.index}\n```markdown\n{chunk.text}\n```" for chunk in chunks)
+    assert splice_chunks(content, chunks, parse_chunk_reply(reply)) == content
+    # the whole reply wrapped in one fence
+    wrapped = "```\n" + render_chunks(chunks) + "\n```"
+    assert splice_chunks(content, chunks, parse_chunk_reply(wrapped)) == content
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+import yaml
+
+from agent import config as config_module
+from agent.config import Config, ConfigError
+
+INTERVAL = 5
+
+
+class Clock:
+    """monotonic time that only moves when the test advances it"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(configure, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(config_module, "time", clock)
+    configure(CONFIG_RELOAD_INTERVAL=INTERVAL, DEFAULT_MODEL="model-a")
+    return clock
+
+
+def edit(**overrides):
+    """change configs.yaml the way a user does, without reloading"""
+    path = Config().path
+    with open(path) as f:
+        configs = yaml.safe_load(f)
+    configs.update(overrides)
+    with open(path, "w") as f:
+        yaml.safe_dump(configs, f)
+    # a new mtime even on filesystems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_edit_is_picked_up_after_the_interval(clock):
+    before = Config()
+    edit(DEFAULT_MODEL="model-b")
+    clock.now += INTERVAL - 1
+    assert Config() is before and Config.DEFAULT_MODEL == "model-a"
+
+    clock.now += 1
+    assert Config.DEFAULT_MODEL == "model-b"
+    # the snapshot taken before keeps its values
+    assert before.DEFAULT_MODEL == "model-a"
+
+
+def test_unchanged_file_keeps_the_snapshot(clock):
+    before = Config()
+    clock.now += INTERVAL * 3
+    assert Config() is before
+
+
+def test_broken_edit_keeps_the_previous_config(clock, caplog):
+    before = Config()
+    edit(TEMPERATURE=7, DEFAULT_MODEL="model-b")
+    for _ in range(3):
+        clock.now += INTERVAL
+        assert Config() is before
+    # logged once per broken version of the file
+    assert sum("Keeping the previous config" in r.message for r in caplog.records) == 1
+    with pytest.raises(ConfigError, match="TEMPERATURE should be a number between 0 and 2"):
+        Config.reload()
+
+    edit(TEMPERATURE=0, DEFAULT_MODEL="model-c")
+    clock.now += INTERVAL
+    assert Config.DEFAULT_MODEL == "model-c"
+
+
+def test_interval_comes_from_the_new_snapshot(clock):
+    edit(CONFIG_RELOAD_INTERVAL=0, DEFAULT_MODEL="model-b")
+    clock.now += INTERVAL
+    assert Config.DEFAULT_MODEL == "model-b"
+    # hot reload is now off, later edits wait for Config.reload()
+    edit(CONFIG_RELOAD_INTERVAL=0, DEFAULT_MODEL="model-c")
+    clock.now += INTERVAL
+    assert Config.DEFAULT_MODEL == "model-b"
+    assert Config.reload().DEFAULT_MODEL == "model-c"
+
+
+def test_config_is_read_only(clock):
+    with pytest.raises(AttributeError, match="read-only"):
+        Config.DEFAULT_MODEL = "model-b"
+    with pytest.raises(TypeError):
+        Config().LLM_CACHE["ENABLED"] = True
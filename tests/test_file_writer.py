@@ -0,0 +1,126 @@
+import os
+import stat
+import subprocess
+import sys
+import textwrap
+import threading
+
+import pytest
+
+from agent.utils import file_writer
+from agent.utils.file_writer import FileWriter, atomic_write
+from benchmarks.corpus import ROOT
+
+TIMEOUT = 10
+
+
+class GatedWrites:
+    """atomic_write that records its calls and holds the writer thread until opened"""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self, path, content, fsync=False):
+        self.started.set()
+        assert self.gate.wait(TIMEOUT)
+        self.calls.append((os.path.basename(path), content))
+        atomic_write(path, content, fsync)
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    gated = GatedWrites()
+    monkeypatch.setattr(file_writer, "atomic_write", gated)
+    writer = FileWriter()
+    yield writer, gated
+    gated.gate.set()
+    writer.close(TIMEOUT)
+
+
+def read(path) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def test_writes_of_a_path_land_in_submission_order(writes, tmp_path):
+    writer, gated = writes
+    path = os.path.join(tmp_path, "out.py")
+    first = writer.submit(path, "v1")
+    # the writer thread is busy with v1, the next writes queue behind it
+    assert gated.started.wait(TIMEOUT)
+    later = [writer.submit(path, f"v{i}") for i in range(2, 6)]
+    other = writer.submit(os.path.join(tmp_path, "other.py"), "other")
+    # readers see their own writes before they reach the disk
+    assert writer.pending_content(path) == "v5" and not os.path.exists(path)
+
+    gated.gate.set()
+    assert writer.flush(TIMEOUT)
+    assert read(path) == "v5" and writer.pending_content(path) is None
+    assert [f.result(0) for f in [first] + later] == [path] * 5 and other.result(0)
+    # v2..v4 were replaced by v5 in the same round and never written
+    assert gated.calls == [("out.py", "v1"), ("out.py", "v5"), ("other.py", "other")]
+
+
+def test_flush_waits_only_for_earlier_writes(writes, tmp_path):
+    writer, gated = writes
+    writer.submit(os.path.join(tmp_path, "a.txt"), "a")
+    assert gated.started.wait(TIMEOUT)
+    assert not writer.flush(0.05)
+    gated.gate.set()
+    assert writer.flush(TIMEOUT) and read(os.path.join(tmp_path, "a.txt")) == "a"
+
+
+def test_close_writes_everything_queued(writes, tmp_path):
+    writer, gated = writes
+    paths = [os.path.join(tmp_path, f"{i}.txt") for i in range(5)]
+    for i, path in enumerate(paths):
+        writer.submit(path, str(i))
+    gated.gate.set()
+    writer.close(TIMEOUT)
+    assert [read(path) for path in paths] == [str(i) for i in range(5)]
+    with pytest.raises(RuntimeError, match="closed"):
+        writer.submit(paths[0], "late")
+
+
+def test_failed_write_reports_and_the_writer_goes_on(writes, tmp_path):
+    writer, gated = writes
+    gated.gate.set()
+    blocked = os.path.join(tmp_path, "file")
+    open(blocked, "w").close()
+    failed = writer.submit(os.path.join(blocked, "out.txt"), "x")
+    ok = writer.submit(os.path.join(tmp_path, "ok.txt"), "ok")
+    with pytest.raises(OSError):
+        failed.result(TIMEOUT)
+    assert ok.result(TIMEOUT) and writer.pending_content(os.path.join(blocked, "out.txt")) is None
+
+
+def test_atomic_write_keeps_the_mode_and_leaves_no_temp_files(tmp_path):
+    path = os.path.join(tmp_path, "script.sh")
+    atomic_write(path, "echo 1\n")
+    os.chmod(path, 0o750)
+    atomic_write(path, "echo 2\n", fsync=True)
+    assert read(path) == "echo 2\n" and stat.S_IMODE(os.stat(path).st_mode) == 0o750
+    assert os.listdir(tmp_path) == ["script.sh"]
+
+
+def test_queued_writes_are_flushed_on_exit(tmp_path):
+    path = os.path.join(tmp_path, "exit.txt")
+    script = textwrap.dedent(f"""
+        import time
+        from agent.utils import file_writer
+
+        def slow_write(path, content, fsync=False):
+            time.sleep(0.2)
+            file_writer.atomic_write_now(path, content, fsync)
+
+        file_writer.atomic_write_now = file_writer.atomic_write
+        file_writer.atomic_write = slow_write
+        file_writer._writer = file_writer.FileWriter()
+        for i in range(3):
+            file_writer._writer.submit({path!r}, f"content {{i}}")
+        # a plain exit, nobody calls close_file_writer
+    """)
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True, timeout=TIMEOUT * 3)
+    assert read(path) == "content 2"
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from agent.utils.json_stream import JsonFieldScanner
+from benchmarks.fake_llm import FakeChatModel, fake_llm, parse_latency
+
+REPLY = ('```json\n{\n  "specific_intent": "edit_code",\n  "language": "c++",\n  "confidence": 0.93,\n'
+         '  "flags": {"tests": [1, 2], "note": "a } and a \\" inside"},\n'
+         '  "details": "The user wants the loop rewritten"\n}\n```')
+FIELDS = json.loads(REPLY.split("```json")[1].split("```")[0])
+
+
+def feed_in_pieces(text: str, size: int) -> list:
+    """fields seen after every piece"""
+    scanner, seen = JsonFieldScanner(), []
+    for i in range(0, len(text), size):
+        seen.append(dict(scanner.feed(text[i:i + size])))
+    return seen
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(REPLY)])
+def test_any_split_gives_the_complete_fields(size):
+    assert feed_in_pieces(REPLY, size)[-1] == FIELDS
+
+
+def test_fields_are_reported_only_once_complete():
+    for end in range(len(REPLY) + 1):
+        fields = JsonFieldScanner().feed(REPLY[:end])
+        # every reported value is the final one, never a prefix of it
+        assert all(FIELDS[key] == value for key, value in fields.items()), REPLY[:end]
+
+
+def test_cut_completion_keeps_the_fields_before_the_cut():
+    cut = REPLY[:REPLY.index('"details"') + len('"details": "The user')]
+    scanner = JsonFieldScanner()
+    fields = scanner.feed(cut)
+    assert list(fields) == ["specific_intent", "language", "confidence", "flags"]
+    assert scanner.has(("specific_intent", "language")) and not scanner.has(("details",))
+    assert not scanner.closed
+
+
+def test_number_at_the_end_may_still_grow():
+    scanner = JsonFieldScanner()
+    assert scanner.feed('{"count": 12') == {}
+    assert scanner.feed("3") == {}
+    assert scanner.feed(",") == {"count": 123}
+    assert scanner.feed(' "ok": true}') == {"count": 123, "ok": True}
+    assert scanner.closed
+
+
+def test_text_after_the_object_is_ignored():
+    scanner = JsonFieldScanner()
+    scanner.feed('Sure! {"intent": "question"} and {"intent": "generation"}')
+    assert scanner.closed and scanner.fields == {"intent": "question"}
+
+
+@pytest.mark.parametrize("text", ['{"intent": "question", oops', '{"intent": "question" "x": 1}',
+                                  '{"intent": "question", "x" 1}'])
+def test_malformed_json_stops_the_scan_and_keeps_what_it_had(text):
+    scanner = JsonFieldScanner()
+    assert scanner.feed(text) == {"intent": "question"}
+    assert scanner.closed
+    assert scanner.feed('"language": "python"}') == {"intent": "question"}
+
+
+def test_no_object_yet():
+    scanner = JsonFieldScanner()
+    assert scanner.feed("Here is the classification") == {} and not scanner.closed
+    assert scanner.feed(': {"intent": "question"}') == {"intent": "question"}
+
+
+class ChunkedModel(FakeChatModel):
+    """streams REPLY a few characters at a time and counts the chunks read"""
+
+    def __init__(self):
+        super().__init__(parse_latency("fixed:0"))
+        self.chunks_read = 0
+
+    def stream(self, messages, **kwargs):
+        for i in range(0, len(REPLY), 4):
+            self.chunks_read += 1
+            yield AIMessageChunk(content=REPLY[i:i + 4])
+
+
+def test_query_stops_reading_once_the_fields_are_complete(configure):
+    from agent.utils.llm import query_llm_fields
+
+    configure(LLM_STREAM_JSON=True, LLM_CACHE={"ENABLED": False})
+    with fake_llm(model=ChunkedModel()) as model:
+        result = query_llm_fields("classify this", ("specific_intent", "language"), node="classify_intent")
+    assert result == {"specific_intent": "edit_code", "language": "c++"}
+    end = REPLY.index('"language": "c++"') + len('"language": "c++"')
+    # the chunk that completes language plus at most the one that shows the value ended
+    assert model.chunks_read <= end // 4 + 2 < len(REPLY) // 4
@@ -0,0 +1,42 @@
+import pytest
+
+from agent.utils import message_parser
+from agent.utils.message_parser import parse_message
+from benchmarks.message_parser import FRAGMENTS, build_corpus, legacy_detect_language, legacy_extract_output_file
+
+PROBE = message_parser._PROBE_CHARS
+
+
+def legacy(message: str):
+    return legacy_detect_language(message), legacy_extract_output_file(message)
+
+
+def test_same_answers_as_the_legacy_parser():
+    for message in build_corpus(2000):
+        parsed = parse_message(message)
+        assert (parsed.language, parsed.output_file) == legacy(message), message
+
+
+@pytest.mark.parametrize("hint", ["in python", "save to report.py", "in pythonic", "save to report.pyc"])
+def test_hints_across_the_probe_end(hint):
+    # the hint is cut by the probe end, longer forms must not be read as the cut one
+    for offset in range(len(hint) + 2):
+        message = "x " * ((PROBE - offset) // 2) + hint + " and in java"
+        parsed = parse_message(message)
+        assert (parsed.language, parsed.output_file) == legacy(message), offset
+
+
+def test_hint_first_does_not_scan_the_rest(monkeypatch):
+    pasted = "\n".join(FRAGMENTS) * 20000
+    message = "fix this in python and save to fixed.py\n" + pasted
+    monkeypatch.setattr(message_parser, "_find_mention", lambda *a: pytest.fail("scanned the whole message"))
+    monkeypatch.setattr(message_parser, "_find_output_file", lambda *a: pytest.fail("scanned the whole message"))
+    parsed = parse_message(message)
+    assert (parsed.language, parsed.output_file) == ("python", "fixed.py") == legacy(message)
+
+
+def test_code_blocks_and_file_refs():
+    parsed = parse_message("fix main.py and util.rs\n```py\nprint(1)\n```\n```\nraw\n```")
+    assert parsed.language == "python"
+    assert parsed.code_blocks == [("python", "print(1)\n"), (None, "\nraw\n")]
+    assert parsed.file_refs == ["main.py", "util.rs"]
@@ -0,0 +1,50 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fake_llm import FAKE_CODE, fake_llm
+
+
+@pytest.fixture
+def terminal(configure, monkeypatch):
+    """patch mode with live streaming on, streamed replies are recorded instead of rendered"""
+    from agent.utils.output_manager import OutputManager
+
+    configure(EDIT_MODE="patch", STREAM_OUTPUT=True, LLM_CACHE={"ENABLED": False}, CHUNKING={"ENABLED": False})
+    streamed = []
+
+    def display_stream(chunks, title, border_style="blue"):
+        streamed.append("".join(chunks))
+        return streamed[-1]
+
+    monkeypatch.setattr(OutputManager, "stream_enabled", staticmethod(lambda: True))
+    monkeypatch.setattr(OutputManager, "display_stream", staticmethod(display_stream))
+    with fake_llm() as model:
+        yield streamed, model
+
+
+def edit(content: str) -> dict:
+    from agent.nodes.code_processor import CodeEditor
+    from agent.utils.file_utils import FileUtils
+
+    with open(FileUtils.get_existing_file_for_language("python"), "w") as f:
+        f.write(content)
+    return CodeEditor({"messages": [HumanMessage(content="Double the result")], "language": "python"}).process()
+
+
+def test_applied_patch_is_not_streamed(terminal):
+    streamed, model = terminal
+    state = edit(FAKE_CODE)
+    assert streamed == [] and model.calls == 1
+    assert state["edit_stats"]["mode"] == "patch"
+    # not streamed, so the panel shows the patched file and not the SEARCH/REPLACE blocks
+    assert state["streamed"] is False
+    assert state["source_code"] == FAKE_CODE
+
+
+def test_failed_patch_streams_only_the_regenerated_file(terminal):
+    streamed, model = terminal
+    state = edit("def other():\n    pass\n")
+    assert model.calls == 2
+    assert state["edit_stats"]["mode"] == "patch_fallback"
+    assert len(streamed) == 1 and "<<<<<<<" not in streamed[0]
+    assert state["streamed"] is True
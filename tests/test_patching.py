@@ -0,0 +1,50 @@
+import pytest
+
+from agent.utils.patching import PatchError, apply_patch
+
+ORIGINAL = "\n".join([
+    "def total(items):",
+    "    result = 10",
+    "    for item in items:",
+    "        result += item",
+    "    return result",
+    "",
+    "def count(items):",
+    "    result = 0",
+    "    for item in items:",
+    "        result += 1",
+    "    return result",
+    "",
+])
+
+
+def block(search: str, replace: str) -> str:
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+
+def test_unique_search_is_replaced():
+    patched = apply_patch(ORIGINAL, block("    result = 10", "    result = 0"))
+    assert patched == ORIGINAL.replace("result = 10", "result = 0")
+
+
+def test_search_matching_several_places_is_rejected():
+    with pytest.raises(PatchError, match="2 places"):
+        apply_patch(ORIGINAL, block("    return result", "    return -result"))
+
+
+def test_overlapping_matches_are_rejected():
+    with pytest.raises(PatchError, match="2 places"):
+        apply_patch("}\n}\n}", block("}\n}", "}"))
+
+
+def test_search_matching_part_of_a_line_is_rejected():
+    # "result = 1" is in "result = 10" and "result += 1" but is no line of the file
+    with pytest.raises(PatchError, match="not found"):
+        apply_patch(ORIGINAL, block("    result = 1", "    result = 2"))
+
+
+def test_more_context_makes_a_search_unique():
+    search = "        result += 1\n    return result"
+    patched = apply_patch(ORIGINAL, block(search, "        result += 1\n    return int(result)"))
+    assert patched.count("return int(result)") == 1
+    assert patched.index("return int(result)") > patched.index("def count")
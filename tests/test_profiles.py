@@ -0,0 +1,78 @@
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from agent.utils.llm import parse_json_content
+from agent.utils.profiles import profile_for
+from agent.utils.token_budget import count_tokens
+from benchmarks.fake_llm import FakeChatModel, fake_llm, parse_latency
+
+MAX_TOKENS = 60
+DETAILS = "The user wants the existing parser to keep the original behaviour while it " * 10
+
+
+def cut(reply: str, max_tokens: int) -> str:
+    """the reply as the api returns it with max_tokens, cut where the cap is reached"""
+    words = reply.split(" ")
+    for i in range(len(words), 0, -1):
+        text = " ".join(words[:i])
+        if count_tokens(text) <= max_tokens:
+            return text
+    return ""
+
+
+class CappedModel(FakeChatModel):
+    """the fake model with verbose routing answers, cut at the max_tokens of the call"""
+
+    def __init__(self):
+        super().__init__(parse_latency("fixed:0"))
+        self.max_tokens = []
+
+    def _reply(self, messages, max_tokens=None):
+        reply, usage = super()._reply(messages)
+        reply = reply.replace('"details": "fake"', f'"details": "{DETAILS}"')
+        self.max_tokens.append(max_tokens)
+        return (cut(reply, max_tokens) if max_tokens else reply), usage
+
+    def invoke(self, messages, **kwargs):
+        reply, usage = self._reply(messages, kwargs.get("max_tokens"))
+        return AIMessage(content=reply, usage_metadata=usage)
+
+    def stream(self, messages, **kwargs):
+        reply, usage = self._reply(messages, kwargs.get("max_tokens"))
+        yield AIMessageChunk(content=reply, usage_metadata=usage)
+
+
+@pytest.fixture
+def routing_profile(configure):
+    configure(MODEL_PROFILES={"PROFILES": {"routing": {"MODEL": "gpt-4o-mini", "MAX_TOKENS": MAX_TOKENS}},
+                              "NODES": {"analyze_message": "routing", "classify_intent": "routing"}},
+              LLM_CACHE={"ENABLED": False})
+    with fake_llm(model=CappedModel()) as model:
+        yield model
+
+
+def test_routing_profile_is_opt_in():
+    # the shipped configs.yaml assigns no node to a profile
+    assert profile_for("classify_intent").max_tokens is None
+    assert profile_for("analyze_message").model == profile_for("generate_code").model
+
+
+def test_reply_cut_in_details_keeps_intent_and_language():
+    reply = f'```json\n{{"specific_intent": "edit_code", "language": "python", "details": "{DETAILS}"}}\n```'
+    truncated = cut(reply, MAX_TOKENS)
+    assert "details" in truncated and not truncated.rstrip().endswith("```")
+    result = parse_json_content(truncated)
+    assert result["specific_intent"] == "edit_code" and result["language"] == "python"
+
+
+@pytest.mark.parametrize("stream_json", [True, False])
+def test_capped_routing_nodes_still_route(routing_profile, configure, stream_json):
+    from agent.nodes.analyzer import analyze_message
+    from agent.nodes.intent_classifier import classify_intent
+
+    configure(LLM_STREAM_JSON=stream_json)
+    state = {"messages": [HumanMessage(content="Update the existing python code so that it covers empty input")]}
+    assert analyze_message(state)["intent"] == "generation"
+    updates = classify_intent(state)
+    assert updates["intent"] == "edit_code" and updates["language"] == "python"
+    assert routing_profile.max_tokens == [MAX_TOKENS, MAX_TOKENS]
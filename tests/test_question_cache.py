@@ -0,0 +1,96 @@
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agent.utils.question_cache import QuestionCache, cached_answer, close_question_cache, get_question_cache, store_answer
+
+MODEL = "gpt-4o"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = QuestionCache(str(tmp_path / "question_cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("what is a closure in JS?", "What's a closure in javascript"),
+    ("How do closures work in JavaScript?", "how does a closure work in js"),
+    ("how do I reverse a list in python", "How to reverse a list in Python?"),
+])
+def test_rewordings_share_an_answer(cache, stored, asked):
+    cache.store(stored, MODEL, "answer")
+    assert cache.lookup(asked, MODEL) == ("answer", 1.0)
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("How do I sort a list of dictionaries by the value of one key in ascending order?",
+     "How should I sort a list of dictionaries by the value of one key in ascending order?"),
+    ("How does garbage collection work in the Java virtual machine and when does it run?",
+     "How does garbage collection work in the Java virtual machine and when exactly does it run?"),
+])
+def test_near_duplicates_below_one_share_an_answer(cache, stored, asked):
+    cache.store(stored, MODEL, "answer")
+    answer, similarity = cache.lookup(asked, MODEL)
+    assert answer == "answer"
+    assert cache.threshold <= similarity < 1.0
+
+
+# the first three pairs are at or above the default THRESHOLD of 0.8 on similarity alone
+@pytest.mark.parametrize("stored, asked", [
+    ("How do I read a large CSV file line by line and skip the header row in Python?",
+     "How do I read a large CSV file line by line and skip the header row in Java?"),
+    ("How do I sort a list of dictionaries by the value of one key and then by a second key in ascending order",
+     "How do I sort a list of dictionaries by the value of one key and then by a second key in descending order"),
+    ("When should I use a thread instead of a process for blocking network calls in a web server?",
+     "When should I use a coroutine instead of a process for blocking network calls in a web server?"),
+    ("How do I read a file in Python 3?", "How do I read a file in Python 2?"),
+    ("Why is my loop slow?", "Why is my loop not slow?"),
+])
+def test_a_different_key_word_is_a_miss(cache, stored, asked):
+    cache.store(stored, MODEL, "answer")
+    assert cache.lookup(asked, MODEL) is None
+
+
+def test_answers_are_per_model_and_survive_a_reopen(cache, tmp_path):
+    cache.store("what is a closure in JS?", MODEL, "answer")
+    assert cache.lookup("What's a closure in javascript", "gpt-4o-mini") is None
+    reopened = QuestionCache(cache.path)
+    try:
+        assert reopened.lookup("What's a closure in javascript", MODEL) == ("answer", 1.0)
+        assert reopened.lookup("What's a closure in python", MODEL) is None
+    finally:
+        reopened.close()
+
+
+@pytest.fixture
+def memory_on(configure, tmp_path):
+    # a thread past its first turn carries history into every node
+    configure(QUESTION_CACHE={"ENABLED": True, "PATH": str(tmp_path / "question_cache.sqlite")},
+              MEMORY={"ENABLED": True})
+    yield {"history": [{"user": "How do I read a file in Python?", "assistant": "Use open()."}], "summary": ""}
+    close_question_cache()
+
+
+def state_for(question: str, context: dict) -> dict:
+    return {"messages": [HumanMessage(content=question)], "bypass_cache": False, **context}
+
+
+def test_standalone_questions_are_cached_with_memory_on(memory_on):
+    store_answer(state_for("What is a closure in JavaScript?", memory_on), MODEL, "answer")
+    assert cached_answer(state_for("what's a closure in js", memory_on), MODEL) == "answer"
+    assert cached_answer(state_for("what's a closure in js", {}), MODEL) == "answer"
+
+
+@pytest.mark.parametrize("follow_up", [
+    "How do I make it skip the header row?",
+    "and in Java?",
+    "Explain the code above",
+    "why?",
+])
+def test_follow_ups_skip_the_cache_with_memory_on(memory_on, follow_up):
+    store_answer(state_for(follow_up, {}), MODEL, "answer to a first turn")
+    assert cached_answer(state_for(follow_up, memory_on), MODEL) is None
+    store_answer(state_for(follow_up, memory_on), MODEL, "answer that leans on the history")
+    assert len(get_question_cache()) == 1
+    assert cached_answer(state_for(follow_up, {}), MODEL) == "answer to a first turn"
@@ -0,0 +1,192 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from agent.utils import resilience
+from agent.utils.resilience import CircuitBreaker, LLMTimeoutError, LLMUnavailableError, acall_llm, call_llm, get_breaker
+
+REQUEST = httpx.Request("POST", "https://api.openai.test/v1/chat/completions")
+RETRIES = 2
+FAILURES = 3
+COOLDOWN = 30
+
+
+def status_error(code: int) -> openai.APIStatusError:
+    kind = openai.RateLimitError if code == 429 else openai.APIStatusError
+    return kind(f"status {code}", response=httpx.Response(code, request=REQUEST), body=None)
+
+
+class Clock:
+    """monotonic time that only moves when a retry sleeps or the test advances it"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class Backend:
+    """fake model, every call takes the next outcome: an exception is raised, anything else returned"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def invoke(self, llm, timeout):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def clock(configure, monkeypatch):
+    configure(RESILIENCE={"ENABLED": True, "TIMEOUT": 5, "RETRIES": RETRIES, "BACKOFF_BASE": 0.5, "BACKOFF_MAX": 8,
+                          "HEDGE": False, "BREAKER_FAILURES": FAILURES, "BREAKER_COOLDOWN": COOLDOWN,
+                          "FALLBACK_MODEL": None},
+              MODEL_PROFILES={})
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", clock)
+    resilience.reset_breakers()
+    yield clock
+    resilience.reset_breakers()
+
+
+LLM = SimpleNamespace(model_name="fake-model", temperature=0, openai_api_base=None)
+
+
+def request(backend: Backend):
+    return call_llm(LLM, "handle_question", backend.invoke)
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker("model", failures=2, cooldown=COOLDOWN)
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open" and breaker.begin() is None
+
+    clock.now += COOLDOWN
+    trial = breaker.begin()
+    assert breaker.state == "half_open" and isinstance(trial, resilience._Trial)
+    # one trial at a time
+    assert breaker.begin() is None
+    breaker.success()
+    assert breaker.state == "closed" and breaker.begin() is True
+
+
+def test_failed_trial_reopens_and_a_lost_trial_expires(clock):
+    breaker = CircuitBreaker("model", failures=1, cooldown=COOLDOWN)
+    breaker.failure()
+    clock.now += COOLDOWN
+    breaker.begin()
+    breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += COOLDOWN
+    breaker.begin()
+    # the trial never reports back
+    clock.now += COOLDOWN - 1
+    assert breaker.begin() is None
+    clock.now += 1
+    assert isinstance(breaker.begin(), resilience._Trial)
+
+
+def test_retryable_errors_are_retried_with_backoff(clock):
+    backend = Backend(status_error(503), openai.APITimeoutError(request=REQUEST), "answer")
+    assert request(backend) == "answer"
+    assert backend.calls == 3 and len(clock.slept) == 2
+    assert all(0 <= delay <= 8 for delay in clock.slept)
+    assert get_breaker("fake-model").state == "closed"
+
+
+def test_retry_after_header_sets_the_delay(clock):
+    error = openai.RateLimitError("slow down", response=httpx.Response(429, headers={"retry-after": "3"},
+                                                                        request=REQUEST), body=None)
+    assert request(Backend(error, "answer")) == "answer"
+    assert clock.slept == [3.0]
+
+
+def test_client_errors_are_not_retried(clock):
+    backend = Backend(status_error(400))
+    with pytest.raises(openai.APIStatusError):
+        request(backend)
+    assert backend.calls == 1 and get_breaker("fake-model").state == "closed"
+
+
+def test_rate_limited_requests_never_open_the_circuit(clock):
+    for _ in range(FAILURES + 2):
+        with pytest.raises(openai.RateLimitError):
+            request(Backend(*[status_error(429)] * (RETRIES + 1)))
+    assert get_breaker("fake-model").state == "closed"
+
+
+def test_circuit_opens_after_failed_requests_not_attempts(clock):
+    for _ in range(FAILURES - 1):
+        with pytest.raises(openai.APIStatusError):
+            request(Backend(*[status_error(500)] * (RETRIES + 1)))
+    # two failed requests are six failed attempts, still closed
+    assert get_breaker("fake-model").state == "closed"
+    # a request that recovers on its retry counts as a success
+    assert request(Backend(status_error(500), "answer")) == "answer"
+    for _ in range(FAILURES):
+        with pytest.raises(openai.APIStatusError):
+            request(Backend(*[status_error(500)] * (RETRIES + 1)))
+    assert get_breaker("fake-model").state == "open"
+
+    backend = Backend("answer")
+    with pytest.raises(LLMUnavailableError):
+        request(backend)
+    assert backend.calls == 0
+
+    clock.now += COOLDOWN + 1
+    assert request(backend) == "answer"
+    assert get_breaker("fake-model").state == "closed"
+
+
+def test_failed_trial_is_not_retried(clock):
+    for _ in range(FAILURES):
+        with pytest.raises(openai.APIStatusError):
+            request(Backend(*[status_error(500)] * (RETRIES + 1)))
+    clock.now += COOLDOWN + 1
+    backend = Backend(status_error(500), "answer")
+    with pytest.raises(LLMUnavailableError):
+        request(backend)
+    assert backend.calls == 1 and get_breaker("fake-model").state == "open"
+
+
+def test_async_call_times_out(configure):
+    configure(RESILIENCE={"ENABLED": True, "TIMEOUT": 0.05, "RETRIES": 0, "HEDGE": False}, MODEL_PROFILES={})
+    resilience.reset_breakers()
+
+    async def slow(llm, timeout):
+        await asyncio.sleep(1)
+
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(acall_llm(LLM, "handle_question", slow))
+    resilience.reset_breakers()
+
+
+def test_slow_call_is_hedged_and_the_faster_answer_wins(configure, monkeypatch):
+    configure(RESILIENCE={"ENABLED": True, "TIMEOUT": 5, "RETRIES": 0, "HEDGE": True}, MODEL_PROFILES={})
+    monkeypatch.setattr(resilience, "hedge_delay", lambda node, policy: 0.05)
+    calls = []
+
+    async def first_slow(llm, timeout):
+        calls.append(len(calls))
+        await asyncio.sleep(2 if len(calls) == 1 else 0)
+        return f"answer {len(calls)}"
+
+    assert asyncio.run(acall_llm(LLM, "handle_question", first_slow)) == "answer 2"
+    assert len(calls) == 2
+    resilience.reset_breakers()
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from agent.utils import scheduler
+from agent.utils.scheduler import PRIORITY_CLASSES, ModelLimiter, TokenBucket
+
+ROUTING, GENERATION, BACKGROUND = range(len(PRIORITY_CLASSES))
+
+
+class Clock:
+    """monotonic time that only moves when the test advances it"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler, "time", clock)
+    return clock
+
+
+def one_call_per_second(max_wait: float = 0) -> ModelLimiter:
+    """a limiter with no burst, the first call is admitted and every next one waits a second"""
+    limiter = ModelLimiter("model", rpm=60, tpm=0, burst_seconds=1, max_wait=max_wait)
+    assert limiter._grant(limiter._push(ROUTING, 10)) == 0
+    return limiter
+
+
+def admit_next(limiter: ModelLimiter, pending: list, clock: Clock):
+    """what the blocked acquire calls do: the head waits out its delay and takes the slot"""
+    while True:
+        delays = [limiter._grant(waiter) for waiter in pending]
+        if 0 in delays:
+            return pending.pop(delays.index(0))
+        clock.now += min(d for d in delays if d is not None)
+
+
+def test_bucket_refills_up_to_its_burst(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=10)
+    assert bucket.capacity == 10 and bucket.wait_time(10, clock.now) == 0
+    bucket.take(10)
+    assert bucket.wait_time(1, clock.now) == pytest.approx(1)
+    clock.now += 4
+    assert bucket.wait_time(4, clock.now) == 0 and bucket.wait_time(5, clock.now) == pytest.approx(1)
+    clock.now += 3600
+    bucket.wait_time(1, clock.now)
+    assert bucket.level == 10
+
+
+def test_oversized_request_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(per_minute=600, burst_seconds=1)
+    bucket.take(10)
+    # 50 can never be in a bucket of 10, it waits until the bucket is full instead of forever
+    assert bucket.wait_time(50, clock.now) == pytest.approx(1)
+    clock.now += 1
+    assert bucket.wait_time(50, clock.now) == 0
+    bucket.take(50)
+    assert bucket.level == 0
+
+
+def test_queued_calls_are_admitted_by_class_then_arrival(clock):
+    limiter = one_call_per_second()
+    pending = [limiter._push(priority, 10) for priority in (GENERATION, BACKGROUND, ROUTING, GENERATION, ROUTING)]
+    order = [admit_next(limiter, pending, clock) for _ in range(5)]
+    assert [(w.priority, w.seq) for w in order] == [(ROUTING, 3), (ROUTING, 5), (GENERATION, 1), (GENERATION, 4),
+                                                    (BACKGROUND, 2)]
+    # one a second, no call skipped the bucket
+    assert clock.now == pytest.approx(1005)
+    assert limiter._waiting == 0
+
+
+def test_only_the_head_takes_from_the_buckets(clock):
+    limiter = one_call_per_second()
+    generation = limiter._push(GENERATION, 10)
+    clock.now += 0.5
+    routing = limiter._push(ROUTING, 10)
+    assert limiter._grant(generation) is None and limiter._grant(routing) == pytest.approx(0.5)
+    clock.now += 0.5
+    # the slot the generation call waited for goes to the routing call that came later
+    assert limiter._grant(generation) is None and limiter._grant(routing) == 0
+
+
+def routing_storm(limiter: ModelLimiter, clock: Clock, seconds: int):
+    """one routing call per second, as many as the limit lets through, next to one background call"""
+    background = limiter._push(BACKGROUND, 10)
+    pending = [background]
+    for _ in range(seconds):
+        pending.append(limiter._push(ROUTING, 10))
+        if admit_next(limiter, pending, clock) is background:
+            return clock.now - background.queued
+    return None
+
+
+def test_strict_priority_starves_background_calls(clock):
+    assert routing_storm(one_call_per_second(max_wait=0), clock, 120) is None
+
+
+def test_background_call_goes_next_after_max_wait(clock):
+    waited = routing_storm(one_call_per_second(max_wait=30), clock, 120)
+    assert waited is not None and 30 <= waited <= 31
+
+
+def test_promoted_call_is_woken(clock):
+    limiter = one_call_per_second(max_wait=30)
+    woken = []
+    background = limiter._push(BACKGROUND, 10)
+    background.wake = lambda: woken.append("background")
+    routing = limiter._push(ROUTING, 10)
+    clock.now += 30
+    # the routing call wakes on its timer, finds the background call ahead and wakes it
+    assert limiter._grant(routing) is None and woken == ["background"]
+    assert limiter._grant(background) == 0
+
+
+def test_cancelled_call_leaves_the_queue(clock):
+    limiter = one_call_per_second()
+
+    async def cancel_queued():
+        task = asyncio.create_task(limiter.aacquire(10, BACKGROUND))
+        await asyncio.sleep(0)
+        assert limiter._waiting == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_queued())
+    assert limiter._waiting == 0
+    clock.now += 1
+    assert limiter._grant(limiter._push(GENERATION, 10)) == 0
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agent.nodes import speculative_router
+
+TIMEOUT = 10
+STATE = {"messages": [], "token_budget": {}}
+
+
+class Routing:
+    """fake analyze / classify nodes, classify blocks until released and records how it ended"""
+
+    def __init__(self, intent: str):
+        self.intent = intent
+        self.classify_started = threading.Event()
+        self.release = threading.Event()
+        self.classify_ended = []
+        self.outcomes = []
+        self.recorded = threading.Event()
+
+    def analyze(self, state):
+        return {"intent": self.intent, "token_budget": {"analyze_message": 1}}
+
+    def classify(self, state):
+        self.classify_started.set()
+        assert self.release.wait(TIMEOUT)
+        self.classify_ended.append("finished")
+        return {"intent": "edit_code", "language": "python", "token_budget": {"classify_intent": 2}}
+
+    async def aanalyze(self, state):
+        await asyncio.sleep(0)
+        return self.analyze(state)
+
+    async def aclassify(self, state):
+        self.classify_started.set()
+        try:
+            while not self.release.is_set():
+                await asyncio.sleep(0.001)
+        except asyncio.CancelledError:
+            self.classify_ended.append("cancelled")
+            raise
+        self.classify_ended.append("finished")
+        return {"intent": "edit_code", "language": "python", "token_budget": {"classify_intent": 2}}
+
+    def record(self, outcome, saved=0.0, wasted=0.0):
+        self.outcomes.append(outcome)
+        self.recorded.set()
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    def install(intent: str) -> Routing:
+        fake = Routing(intent)
+        for name, func in [("analyze_message", fake.analyze), ("classify_intent", fake.classify),
+                           ("aanalyze_message", fake.aanalyze), ("aclassify_intent", fake.aclassify),
+                           ("record_speculation", fake.record)]:
+            monkeypatch.setattr(speculative_router, name, func)
+        return fake
+
+    yield install
+    speculative_router.close_speculative_pool()
+
+
+def test_async_question_cancels_the_classification(routing):
+    fake = routing("question")
+
+    async def route():
+        result = await speculative_router.aspeculative_route(STATE)
+        # let the cancellation reach the task
+        await asyncio.sleep(0.01)
+        return result
+
+    assert asyncio.run(route()) == fake.analyze(STATE)
+    assert fake.classify_started.is_set() and fake.classify_ended == ["cancelled"]
+    assert fake.outcomes == ["cancelled"]
+
+
+def test_async_generation_merges_both_answers(routing):
+    fake = routing("generation")
+    fake.release.set()
+    result = asyncio.run(speculative_router.aspeculative_route(STATE))
+    assert result["intent"] == "edit_code" and result["language"] == "python"
+    assert result["token_budget"] == {"analyze_message": 1, "classify_intent": 2}
+    assert fake.outcomes == ["used"]
+
+
+def test_async_finished_classification_is_discarded(routing, monkeypatch):
+    fake = routing("question")
+    fake.release.set()
+
+    async def slow_analyze(state):
+        # classify_intent finishes first, as on a response cache hit
+        while not fake.classify_ended:
+            await asyncio.sleep(0.001)
+        return fake.analyze(state)
+
+    monkeypatch.setattr(speculative_router, "aanalyze_message", slow_analyze)
+    assert asyncio.run(speculative_router.aspeculative_route(STATE))["intent"] == "question"
+    assert fake.classify_ended == ["finished"] and fake.outcomes == ["discarded"]
+
+
+def test_async_failed_analysis_cancels_the_classification(routing, monkeypatch):
+    fake = routing("question")
+
+    async def broken(state):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("analyze failed")
+
+    monkeypatch.setattr(speculative_router, "aanalyze_message", broken)
+
+    async def route():
+        with pytest.raises(RuntimeError, match="analyze failed"):
+            await speculative_router.aspeculative_route(STATE)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(route())
+    assert fake.classify_ended == ["cancelled"] and fake.outcomes == []
+
+
+def test_sync_question_cancels_a_classification_not_started(routing, monkeypatch):
+    fake = routing("question")
+    # one busy worker, the classification waits in the pool queue
+    pool = ThreadPoolExecutor(max_workers=1)
+    busy = threading.Event()
+    pool.submit(busy.wait, TIMEOUT)
+    monkeypatch.setattr(speculative_router, "_get_pool", lambda: pool)
+
+    assert speculative_router.speculative_route(STATE)["intent"] == "question"
+    busy.set()
+    pool.shutdown(wait=True)
+    assert not fake.classify_started.is_set() and fake.outcomes == ["cancelled"]
+
+
+def test_sync_question_discards_a_running_classification(routing, monkeypatch):
+    fake = routing("question")
+
+    def analyze(state):
+        assert fake.classify_started.wait(TIMEOUT)
+        return fake.analyze(state)
+
+    monkeypatch.setattr(speculative_router, "analyze_message", analyze)
+    assert speculative_router.speculative_route(STATE)["intent"] == "question"
+    # it cannot be stopped, it finishes in the background and is thrown away
+    assert fake.outcomes == []
+    fake.release.set()
+    assert fake.recorded.wait(TIMEOUT)
+    assert fake.classify_ended == ["finished"] and fake.outcomes == ["discarded"]
+
+
+def test_sync_generation_merges_both_answers(routing):
+    fake = routing("generation")
+    fake.release.set()
+    result = speculative_router.speculative_route(STATE)
+    assert result["intent"] == "edit_code" and result["language"] == "python"
+    assert result["token_budget"] == {"analyze_message": 1, "classify_intent": 2}
+    assert fake.outcomes == ["used"]
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from agent.__main__ import profile_imports
+from benchmarks.corpus import ROOT
+
+# cold import of the REPL entry point, about 0.5 s on a laptop, raise it with AGENT_STARTUP_BUDGET_MS on slow runners
+BUDGET_MS = float(os.environ.get("AGENT_STARTUP_BUDGET_MS", 1500))
+# imported on first use (first client build, build_graph), never at startup
+DEFERRED = ("langchain_openai", "langgraph", "httpx", "openai", "yaml", "tiktoken")
+
+
+@pytest.fixture(scope="module")
+def timings():
+    # profile_imports runs the import in a fresh interpreter under -X importtime, from the sandbox folder
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("PYTHONPATH", os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+        return profile_imports("agent.main")
+
+
+def test_cold_start_is_under_budget(timings):
+    assert timings[-1].module == "agent.main"
+    total_ms = timings[-1].cumulative_us / 1000
+    assert total_ms < BUDGET_MS, f"import agent.main took {total_ms:.0f} ms, budget {BUDGET_MS:.0f} ms"
+
+
+def test_heavy_dependencies_are_deferred(timings):
+    imported = {timing.module.split(".")[0] for timing in timings}
+    assert not imported & set(DEFERRED), f"imported at startup: {sorted(imported & set(DEFERRED))}"
@@ -0,0 +1,88 @@
+import os
+import random
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agent.utils.token_budget import PromptTooLargeError, Section, count_tokens, fit_prompt, request_section
+from benchmarks.chunking import python_file
+from benchmarks.fake_llm import FakeChatModel, fake_llm, parse_latency
+
+BUDGET = 3000
+REQUEST = "Fix the typos"
+
+
+class RecordingModel(FakeChatModel):
+    """the fake model, keeping every prompt it was sent"""
+
+    def __init__(self):
+        super().__init__(parse_latency("fixed:0"))
+        self.prompts = []
+
+    def _reply(self, messages):
+        self.prompts.append(messages[-1].content)
+        return super()._reply(messages)
+
+
+@pytest.fixture
+def small_budgets(configure):
+    from agent.utils import output_manager
+
+    output_manager.console.quiet = True
+    configure(TOKEN_BUDGETS={"TOKENIZER": "estimate", "DEFAULT": 12000, "MIN_REQUEST_TOKENS": 64,
+                             "NODES": {"edit_code": BUDGET, "edit_text": BUDGET, "question": 300}},
+              LLM_CACHE={"ENABLED": False}, EDIT_MODE="full", CHUNKING={"ENABLED": False})
+    with fake_llm(model=RecordingModel()) as model:
+        yield model
+
+
+def state_for(message: str, **fields) -> dict:
+    return {"messages": [HumanMessage(content=message)], "language": "python", **fields}
+
+
+def test_request_is_not_cut_below_its_floor(small_budgets):
+    render = lambda user_message, history: f"Answer this.\n{history}\n{user_message}"
+    fitted = fit_prompt("question", render, user_message=request_section("why " * 400),
+                        history=Section("earlier turn " * 400, priority=-1))
+    assert count_tokens(fitted.text) <= 300
+    assert fitted.report["truncated"]["history"] > 0
+    assert count_tokens(fitted.text.split("\n", 2)[2]) >= 64
+
+
+def test_uncuttable_sections_over_budget_raise(small_budgets):
+    render = lambda user_message, existing: f"Edit.\n{user_message}\n{existing}"
+    with pytest.raises(PromptTooLargeError, match="question"):
+        fit_prompt("question", render, user_message=request_section(REQUEST),
+                   existing=Section("line\n" * 1000, truncatable=False))
+
+
+@pytest.mark.parametrize("edit_mode", ["full", "patch"])
+def test_oversized_text_edit_fails_before_the_llm(small_budgets, configure, edit_mode):
+    from agent.config import Config
+    from agent.nodes.text_processor import TextEditor
+
+    configure(EDIT_MODE=edit_mode)
+    path = os.path.join(Config().SAVING_FOLDER_TEXT, "oversized.txt")
+    with open(path, "w") as f:
+        f.write("\n".join(f"Paragraph {i} of a long report about shipping." for i in range(3000)))
+    with pytest.raises(PromptTooLargeError, match="edit_text"):
+        TextEditor(state_for(REQUEST, filename="oversized.txt")).process()
+    assert small_budgets.prompts == []
+
+
+def test_oversized_code_edit_is_sent_as_chunks(small_budgets):
+    from agent.config import Config
+    from agent.nodes.code_processor import CodeEditor
+    from agent.utils.file_utils import FileUtils
+
+    content, names = python_file(300, random.Random(7))
+    path = FileUtils.get_existing_file_for_language("python")
+    with open(path, "w") as f:
+        f.write(content)
+    assert count_tokens(content) > BUDGET and not Config().CHUNKING["ENABLED"]
+
+    request = f"Rename {names[7]} to process_{names[7]} and keep its behaviour"
+    state = CodeEditor(state_for(request)).process()
+    prompt, = small_budgets.prompts
+    assert request in prompt and f"def {names[7]}(" in prompt and "### CHUNK" in prompt
+    assert state["token_budget"]["edit_code"]["tokens"] <= BUDGET